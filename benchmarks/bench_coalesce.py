@@ -0,0 +1,101 @@
+"""
+Benchmark request coalescing of identical processing requests.
+
+Runs the same remove-bg request on one image from --threads threads in
+one process, then from --processes pxforge processes at once, against
+the local stub with --latency ms per request. Reports how many requests
+reached the stub and the wall time; with coalescing each scenario
+should need a single server call and take about one latency.
+
+    python benchmarks/bench_coalesce.py --threads 16 --processes 4 --latency 2000
+"""
+
+import argparse
+import collections
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+import stub_server
+
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Request coalescing benchmark")
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--processes", type=int, default=4)
+    parser.add_argument("--latency", type=float, default=2000.0,
+                        help="Stub latency per request, ms")
+    args = parser.parse_args()
+
+    calls = collections.Counter()
+    handle_post = stub_server.StubHandler.do_POST
+
+    def _counting_post(handler):
+        calls[handler.path] += 1
+        return handle_post(handler)
+
+    stub_server.StubHandler.do_POST = _counting_post
+    server = stub_server.start_server(latency=args.latency / 1000)
+    base_url = f"http://127.0.0.1:{server.server_address[1]}"
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ.update(
+            HOME=tmp, PXFORGE_API_URL=base_url,
+            PXFORGE_REGISTRY=os.path.join(tmp, "registry.db")
+        )
+        from pxforge.api_client import PxForgeClient
+        from pxforge.operations import run_operation
+        from pxforge.utilities import add_image
+
+        client = PxForgeClient(base_url=base_url, pool_size=args.threads)
+        image = Path(tmp) / "image.bin"
+        image.write_bytes(os.urandom(4096))
+        image_id = client.upload_image(str(image))["image_id"]
+        add_image(image_id, path=image)
+
+        # Threads: the cache is off, so only in-process coalescing helps.
+        calls.clear()
+        client.use_cache = False
+        threads = [
+            threading.Thread(target=run_operation, args=("remove-bg", image_id),
+                             kwargs={"client": client})
+            for _ in range(args.threads)
+        ]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        print(f"{args.threads} threads:   {calls['/remove-background']} server call(s) "
+              f"in {time.perf_counter() - start:.2f}s")
+
+        # Processes: they share one result through the cache and a lease.
+        calls.clear()
+        env = dict(os.environ, PXFORGE_NO_DAEMON="1")
+        env["PYTHONPATH"] = os.pathsep.join(
+            filter(None, [str(ROOT / "src"), env.get("PYTHONPATH")])
+        )
+        start = time.perf_counter()
+        processes = [
+            subprocess.Popen(
+                [sys.executable, "-m", "pxforge.cli", "remove-bg", image_id],
+                env=env, stdout=subprocess.DEVNULL
+            )
+            for _ in range(args.processes)
+        ]
+        failed = sum(process.wait() != 0 for process in processes)
+        print(f"{args.processes} processes: {calls['/remove-background']} server call(s) "
+              f"in {time.perf_counter() - start:.2f}s"
+              + (f", {failed} failed" if failed else ""))
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
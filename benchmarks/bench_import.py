@@ -0,0 +1,163 @@
+"""
+Benchmark CLI startup time and guard the lazy-loading of commands.
+
+Each case runs in a fresh interpreter --runs times; the median wall
+time is reported next to that of a bare interpreter. The script fails
+(exit status 1) if a case that should stay light imports requests,
+urllib3, Pillow or aiohttp, if its median exceeds the baseline by more
+than --budget-ms, or if the static help text in cli.COMMANDS no longer
+matches the commands' docstrings. Cases that only start the CLI are
+held to the full list of modules they load: any pxforge module but cli
+and tracing, third-party package other than click or heavy standard
+library module (sqlite3, asyncio, ssl, ...) fails them, so a new eager import on the
+startup path is caught even when it is cheap today.
+
+    python benchmarks/bench_import.py --runs 20 --budget-ms 150
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+
+# Modules that only commands talking to the server (or using local
+# processing) should import.
+HEAVY_MODULES = ("requests", "urllib3", "PIL", "aiohttp")
+
+# Standard library modules too slow to import for the startup path.
+HEAVY_STDLIB = (
+    "sqlite3", "asyncio", "ssl", "http", "email", "concurrent", "multiprocessing",
+    "hashlib", "shutil", "subprocess", "socket", "tempfile"
+)
+
+# Everything of note that starting the CLI may load.
+STARTUP_MODULES = ("pxforge", "pxforge.cli", "pxforge.tracing")
+
+# Run before every case, so the report leaves out what the interpreter
+# loads by itself.
+PREFIX = """
+import sys
+_baseline = set(sys.modules)
+"""
+
+RUNNER = """
+from pxforge.cli import cli
+try:
+    cli({args!r}, prog_name="pxforge")
+except SystemExit:
+    pass
+"""
+
+# Appended to every case to report the heavy modules it imported, then
+# every notable module it loaded: pxforge modules, heavy standard
+# library modules and third-party packages other than click.
+REPORT = f"""
+import sys
+def _is_notable(name):
+    top = name.split(".")[0]
+    if top == "pxforge" or top in {HEAVY_STDLIB!r}:
+        return True
+    # The standard library's module names are only listed from Python 3.10.
+    stdlib = getattr(sys, "stdlib_module_names", None)
+    return stdlib is not None and top not in stdlib and top != "click"
+_notable = sorted(filter(_is_notable, set(sys.modules) - _baseline))
+print(",".join(m for m in {HEAVY_MODULES!r} if m in sys.modules), file=sys.stderr)
+print(",".join(_notable), file=sys.stderr)
+"""
+
+# (label, code run in a fresh interpreter, whether it must stay light,
+# notable modules it may load, or None for any)
+CASES = [
+    ("python -c pass", "pass", True, ()),
+    ("import pxforge.cli", "import pxforge.cli", True, STARTUP_MODULES),
+    ("pxforge --version", RUNNER.format(args=["--version"]), True, STARTUP_MODULES),
+    ("pxforge --help", RUNNER.format(args=["--help"]), True, STARTUP_MODULES),
+    ("pxforge list", RUNNER.format(args=["list"]), True, None),
+    ("pxforge resize --help", RUNNER.format(args=["resize", "--help"]), True, None),
+    # What every invocation paid before commands were loaded lazily.
+    ("import every command", "import pxforge.commands." + ", pxforge.commands.".join((
+        "basic", "resize", "color", "cleanup", "editing", "batch", "pipeline", "cache",
+        "jobs", "watch", "daemon"
+    )), False, None),
+]
+
+
+def run_case(code, env):
+    """
+    Run code in a fresh interpreter.
+
+    Returns:
+        tuple: (seconds, heavy modules loaded, notable modules loaded)
+    """
+    start = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, "-c", PREFIX + code + REPORT], env=env, stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE, text=True, check=True
+    )
+    elapsed = time.perf_counter() - start
+    lines = result.stderr.splitlines()
+    heavy, notable = lines[-2:] if len(lines) >= 2 else ("", "")
+    return elapsed, heavy, set(filter(None, notable.split(",")))
+
+
+def check_help():
+    """Compare cli.COMMANDS with the commands it points to."""
+    import importlib
+    from pxforge.cli import COMMANDS
+
+    problems = []
+    for commands in COMMANDS.values():
+        for name, import_path, short_help in commands:
+            module, function = import_path.split(":")
+            command = getattr(importlib.import_module(f"pxforge.commands.{module}"), function)
+            actual = command.get_short_help_str(limit=60)
+            if actual != short_help:
+                problems.append(f"{name}: help is {actual!r}, cli.COMMANDS has {short_help!r}")
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description="CLI startup time benchmark")
+    parser.add_argument("--runs", type=int, default=15, help="Runs per case")
+    parser.add_argument("--budget-ms", type=float, default=150.0,
+                        help="Largest allowed median over the bare interpreter")
+    args = parser.parse_args()
+
+    failures = check_help()
+    with tempfile.TemporaryDirectory() as tmp:
+        env = dict(os.environ, HOME=tmp, PXFORGE_REGISTRY=os.path.join(tmp, "registry.db"))
+        baseline = None
+        print(f"{'case':<24} {'median':>9} {'over base':>10}  heavy imports")
+        for label, code, light, allowed in CASES:
+            _, _, notable = run_case(code, env)  # also warms the page cache and bytecode
+            if allowed is not None and notable - set(allowed):
+                failures.append(
+                    f"{label} loaded {', '.join(sorted(notable - set(allowed)))} on startup"
+                )
+            times = []
+            loaded = ""
+            for _ in range(args.runs):
+                elapsed, loaded, _ = run_case(code, env)
+                times.append(elapsed)
+            median = statistics.median(times) * 1000
+            baseline = median if baseline is None else baseline
+            print(f"{label:<24} {median:>7.1f}ms {median - baseline:>8.1f}ms  {loaded or '-'}")
+            if light and loaded:
+                failures.append(f"{label} imported {loaded}")
+            if light and median - baseline > args.budget_ms:
+                failures.append(
+                    f"{label} took {median - baseline:.1f} ms over the bare interpreter "
+                    f"(budget {args.budget_ms:.0f} ms)"
+                )
+
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,370 @@
+"""
+Offline benchmark suite.
+
+Runs against the local stub backend (started in a child process with
+the given --latency, --jitter and --error-rate) and measures:
+
+- startup: wall time of fresh `pxforge` processes that do no API work
+- latency: wall time of single commands, each in a fresh process
+- batch: images per second through `pxforge batch`
+- transfer: upload and download throughput of one large file, in MB/s
+- registry: registry operations with 10^3 to 10^6 images recorded
+
+Results are written as JSON (--output) together with the settings,
+commit and machine they were measured on. --compare prints the change
+against an earlier results file.
+
+    python benchmarks/bench_suite.py --output results.json
+    python benchmarks/bench_suite.py --only startup,latency --compare results.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from pathlib import Path
+
+from stub_server import start_process
+
+
+ROOT = Path(__file__).resolve().parent.parent
+SECTIONS = ("startup", "latency", "batch", "transfer", "registry")
+
+# Commands timed by the latency section; {image} is an uploaded image ID
+# and {file} a new image file each run.
+LATENCY_COMMANDS = {
+    "upload": ["upload", "{file}"],
+    "info": ["info", "{image}"],
+    "resize": ["--no-cache", "resize", "{image}", "-w", "64", "-h", "64"],
+    "to-bw": ["--no-cache", "to-bw", "{image}"],
+    "watermark": ["--no-cache", "watermark", "{image}", "--text", "bench"],
+    "remove-bg": ["--no-cache", "remove-bg", "{image}"],
+}
+
+
+def summarize(samples):
+    """Median, 95th percentile and mean of durations in seconds, as ms."""
+    samples = sorted(samples)
+    return {
+        "median_ms": statistics.median(samples) * 1000,
+        "p95_ms": samples[min(int(len(samples) * 0.95), len(samples) - 1)] * 1000,
+        "mean_ms": statistics.fmean(samples) * 1000,
+        "runs": len(samples),
+    }
+
+
+def run_cli(args, env):
+    """Run pxforge in a fresh interpreter; return (seconds, exit status)."""
+    start = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, "-m", "pxforge.cli", *args], env=env,
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    return time.perf_counter() - start, result.returncode
+
+
+def write_image(path, size=1024):
+    """Write a file with unique content, standing in for an image."""
+    Path(path).write_bytes(uuid.uuid4().bytes + os.urandom(size))
+
+
+def bench_startup(env, runs):
+    cases = {
+        "python": [sys.executable, "-c", "pass"],
+        "--version": [sys.executable, "-m", "pxforge.cli", "--version"],
+        "--help": [sys.executable, "-m", "pxforge.cli", "--help"],
+        "list": [sys.executable, "-m", "pxforge.cli", "list"],
+    }
+    results = {}
+    for name, argv in cases.items():
+        subprocess.run(argv, env=env, stdout=subprocess.DEVNULL)
+        samples = []
+        for _ in range(runs):
+            start = time.perf_counter()
+            subprocess.run(argv, env=env, stdout=subprocess.DEVNULL)
+            samples.append(time.perf_counter() - start)
+        results[name] = summarize(samples)
+        print(f"  startup {name}: {results[name]['median_ms']:.1f} ms")
+    return results
+
+
+def bench_latency(env, tmp, image_id, runs):
+    results = {}
+    for name, template in LATENCY_COMMANDS.items():
+        samples, failures = [], 0
+        for run in range(runs + 1):
+            image_file = tmp / f"latency-{name}-{run}.bin"
+            write_image(image_file)
+            args = [a.format(image=image_id, file=image_file) for a in template]
+            elapsed, status = run_cli(args, env)
+            if run == 0:
+                continue  # warm-up
+            samples.append(elapsed)
+            failures += status != 0
+        results[name] = dict(summarize(samples), failures=failures)
+        print(f"  latency {name}: {results[name]['median_ms']:.1f} ms"
+              + (f" ({failures} failed)" if failures else ""))
+    return results
+
+
+def bench_batch(env, tmp, client, images, concurrency):
+    from pxforge.utilities import add_image
+
+    ids = []
+    for i in range(images):
+        image_file = tmp / f"batch-{i}.bin"
+        write_image(image_file)
+        uploaded = client.upload_image(str(image_file))
+        add_image(uploaded["image_id"], path=image_file, url=uploaded["image_url"])
+        ids.append(uploaded["image_id"])
+    ids_file = tmp / "batch-ids.txt"
+    ids_file.write_text("\n".join(ids))
+
+    results = {}
+    for level in concurrency:
+        elapsed, status = run_cli(
+            ["--no-cache", "batch", "to-bw", "--ids-from", str(ids_file), "-c", str(level)],
+            env
+        )
+        results[f"c{level}"] = {
+            "images": images, "seconds": elapsed, "images_per_s": images / elapsed,
+            "exit_status": status,
+        }
+        print(f"  batch -c {level}: {images / elapsed:.1f} images/s")
+    return results
+
+
+def bench_transfer(tmp, client, megabytes, runs):
+    source = tmp / "transfer.bin"
+    with open(source, "wb") as f:
+        for _ in range(megabytes):
+            f.write(os.urandom(1024 * 1024))
+    size = source.stat().st_size
+
+    uploads, downloads = [], []
+    for run in range(runs):
+        # Vary the first bytes so the server and client see a new file.
+        with open(source, "r+b") as f:
+            f.write(uuid.uuid4().bytes)
+        start = time.perf_counter()
+        uploaded = client.upload_image(str(source))
+        uploads.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        client.download_image(uploaded["image_url"], str(tmp / f"download-{run}.bin"))
+        downloads.append(time.perf_counter() - start)
+        os.remove(tmp / f"download-{run}.bin")
+
+    results = {
+        "bytes": size,
+        "upload_mb_s": size / 1e6 / statistics.median(uploads),
+        "download_mb_s": size / 1e6 / statistics.median(downloads),
+    }
+    print(f"  transfer {size / 1e6:.0f} MB: upload {results['upload_mb_s']:.1f} MB/s, "
+          f"download {results['download_mb_s']:.1f} MB/s")
+    return results
+
+
+def _fill_registry(path, start, end):
+    """Insert images start..end-1 directly, far faster than add_image."""
+    conn = sqlite3.connect(str(path))
+    now = time.time()
+    with conn:
+        conn.executemany(
+            "INSERT INTO images (id, path, url, size, width, height, sha256, uploaded_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (
+                (f"image-{i}", f"/data/image-{i}.png", f"http://stub/images/image-{i}",
+                 1000 + i % 5000, 100 + i % 4000, 100 + i % 3000, f"{i:064x}", now + i)
+                for i in range(start, end)
+            )
+        )
+    conn.close()
+
+
+def _per_call(function, arguments):
+    start = time.perf_counter()
+    for argument in arguments:
+        function(argument)
+    return (time.perf_counter() - start) / len(arguments) * 1e6
+
+
+def bench_registry(tmp, sizes, samples=1000):
+    from pxforge import utilities
+
+    path = tmp / "registry-bench.db"
+    os.environ["PXFORGE_REGISTRY"] = str(path)
+    utilities.connect()  # create the schema
+
+    results = {}
+    filled = 0
+    for size in sorted(sizes):
+        start = time.perf_counter()
+        _fill_registry(path, filled, size)
+        fill_seconds = time.perf_counter() - start
+        filled = size
+
+        ids = [f"image-{random.randrange(size)}" for _ in range(samples)]
+        hashes = [f"{random.randrange(size):064x}" for _ in range(samples)]
+        new_ids = [f"new-{size}-{i}" for i in range(min(samples, 200))]
+
+        row = {"bulk_insert_s": fill_seconds}
+        row["add_image_us"] = _per_call(
+            lambda image_id: utilities.add_image(image_id, path="/data/new.png"), new_ids
+        )
+        row["get_image_us"] = _per_call(utilities.get_image, ids)
+        row["validate_image_id_us"] = _per_call(utilities.validate_image_id, ids)
+        row["find_image_by_hash_us"] = _per_call(utilities.find_image_by_hash, hashes)
+
+        start = time.perf_counter()
+        utilities.query_images(sort="size", descending=True, limit=20)
+        row["query_top20_by_size_ms"] = (time.perf_counter() - start) * 1000
+        start = time.perf_counter()
+        utilities.load()
+        row["load_all_ids_ms"] = (time.perf_counter() - start) * 1000
+        start = time.perf_counter()
+        utilities.query_images()
+        row["query_all_ms"] = (time.perf_counter() - start) * 1000
+        row["file_mb"] = path.stat().st_size / 1e6
+
+        results[str(size)] = row
+        print(f"  registry {size}: get {row['get_image_us']:.1f} us, "
+              f"add {row['add_image_us']:.1f} us, hash lookup "
+              f"{row['find_image_by_hash_us']:.1f} us, list all {row['query_all_ms']:.0f} ms")
+    return results
+
+
+def metadata(args):
+    try:
+        commit = subprocess.run(
+            ["git", "-C", str(ROOT), "rev-parse", "--short", "HEAD"],
+            capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "commit": commit,
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "settings": {
+            key: value for key, value in vars(args).items() if key not in ("output", "compare")
+        },
+    }
+
+
+def flatten(results, prefix=""):
+    """Numeric leaves of nested results, keyed by dotted path."""
+    flat = {}
+    for key, value in results.items():
+        if isinstance(value, dict):
+            flat.update(flatten(value, f"{prefix}{key}."))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[f"{prefix}{key}"] = value
+    return flat
+
+
+def compare(old, new):
+    """Print metrics present in both results with their relative change."""
+    old_flat = flatten({k: v for k, v in old.items() if k != "meta"})
+    new_flat = flatten({k: v for k, v in new.items() if k != "meta"})
+    print(f"\nCompared with {old.get('meta', {}).get('commit')}:")
+    for key in sorted(set(old_flat) & set(new_flat)):
+        before, after = old_flat[key], new_flat[key]
+        change = f"{(after - before) / before:+.1%}" if before else "n/a"
+        print(f"  {key:<48} {before:>12.2f} {after:>12.2f} {change:>8}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline pxforge benchmark suite")
+    parser.add_argument("--output", "-o", default="bench-results.json",
+                        help="JSON file to write results to")
+    parser.add_argument("--compare", help="Earlier results file to compare against")
+    parser.add_argument("--only", help=f"Comma-separated sections ({', '.join(SECTIONS)})")
+    parser.add_argument("--runs", type=int, default=10, help="Runs per timed case")
+    parser.add_argument("--latency", type=float, default=10.0,
+                        help="Stub latency per request, ms")
+    parser.add_argument("--jitter", type=float, default=0.0, help="Stub jitter, ms")
+    parser.add_argument("--error-rate", type=float, default=0.0,
+                        help="Fraction of stub requests failing with 503")
+    parser.add_argument("--batch-images", type=int, default=200)
+    parser.add_argument("--batch-concurrency", default="1,4,16",
+                        help="Comma-separated batch concurrency levels")
+    parser.add_argument("--transfer-mb", type=int, default=64)
+    parser.add_argument("--registry-sizes", default="1000,10000,100000,1000000",
+                        help="Comma-separated registry sizes")
+    args = parser.parse_args()
+
+    sections = args.only.split(",") if args.only else list(SECTIONS)
+    unknown = set(sections) - set(SECTIONS)
+    if unknown:
+        parser.error(f"unknown section(s): {', '.join(sorted(unknown))}")
+
+    stub, base_url = start_process(
+        latency=args.latency / 1000, jitter=args.jitter / 1000, error_rate=args.error_rate
+    )
+    results = {"meta": metadata(args)}
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            tmp = Path(tmp)
+            os.environ.update(
+                HOME=str(tmp), PXFORGE_API_URL=base_url,
+                PXFORGE_REGISTRY=str(tmp / "registry.db")
+            )
+            env = dict(os.environ)
+            env["PYTHONPATH"] = os.pathsep.join(
+                filter(None, [str(ROOT / "src"), env.get("PYTHONPATH")])
+            )
+
+            from pxforge.api_client import PxForgeClient
+            from pxforge.utilities import add_image
+
+            client = PxForgeClient(base_url=base_url, pool_size=16, use_cache=False)
+            print(f"Stub at {base_url}: latency {args.latency:.0f} ms, "
+                  f"error rate {args.error_rate:.1%}")
+
+            if "startup" in sections:
+                results["startup"] = bench_startup(env, args.runs)
+            if "latency" in sections:
+                image_file = tmp / "latency.bin"
+                write_image(image_file)
+                uploaded = client.upload_image(str(image_file))
+                add_image(uploaded["image_id"], path=image_file, url=uploaded["image_url"])
+                results["latency"] = bench_latency(env, tmp, uploaded["image_id"], args.runs)
+            if "batch" in sections:
+                results["batch"] = bench_batch(
+                    env, tmp, client, args.batch_images,
+                    [int(n) for n in args.batch_concurrency.split(",")]
+                )
+            if "transfer" in sections:
+                results["transfer"] = bench_transfer(
+                    tmp, client, args.transfer_mb, min(args.runs, 3)
+                )
+            if "registry" in sections:
+                results["registry"] = bench_registry(
+                    tmp, [int(n) for n in args.registry_sizes.split(",")]
+                )
+            client.close()
+    finally:
+        stub.terminate()
+
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"Results written to {args.output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare(json.load(f), results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,159 @@
+"""
+Benchmark tiled processing against a single-shot request.
+
+Starts the local stub backend with simulated inference cost: each
+processing request takes --ms-per-mp milliseconds per megapixel, at
+most --server-slots requests compute at once, and --upscale scales the
+result like AI upscaling. A synthetic image is then processed once as
+a whole and once in overlapping tiles, and the wall times and the
+largest pixel difference between the two outputs are reported.
+
+    python benchmarks/bench_tiled.py --size 8000x6000 --tile-size 1024 -c 4
+
+Requires Pillow.
+"""
+
+import argparse
+import io
+import multiprocessing
+import os
+import tempfile
+import threading
+import time
+from http.server import ThreadingHTTPServer
+from pathlib import Path
+
+from PIL import Image, ImageChops, ImageFilter, ImageStat
+
+from stub_server import StubHandler
+
+
+class InferenceHandler(StubHandler):
+    """Stub handler whose AI endpoints cost time per pixel."""
+
+    ms_per_mp = 500.0
+    upscale = 1
+    slots = threading.Semaphore(4)
+
+    def do_POST(self):
+        if self.path not in ("/remove-noise", "/remove-background"):
+            return super().do_POST()
+
+        fields, _ = self._read_body()
+        content = self.state.get(fields.get("image_id"))
+        if content is None:
+            self._send_json({"success": False, "error": "Image not found"})
+            return
+        with Image.open(io.BytesIO(content)) as image:
+            image.load()
+        with self.slots:
+            time.sleep(image.width * image.height / 1e6 * self.ms_per_mp / 1000)
+        if self.upscale != 1:
+            image = image.resize(
+                (image.width * self.upscale, image.height * self.upscale), Image.BICUBIC
+            )
+        out = io.BytesIO()
+        image.save(out, "PNG", compress_level=1)
+        result_id = self.state.add(out.getvalue())
+        self._send_json({"success": True, "image_url": self._image_url(result_id)})
+
+
+def serve(port_queue, ms_per_mp, upscale, slots):
+    """Run the stub in its own process, so it does not share the GIL."""
+    InferenceHandler.ms_per_mp = ms_per_mp
+    InferenceHandler.upscale = upscale
+    InferenceHandler.slots = threading.Semaphore(slots)
+    server = ThreadingHTTPServer(("127.0.0.1", 0), InferenceHandler)
+    server.daemon_threads = True
+    port_queue.put(server.server_address[1])
+    server.serve_forever()
+
+
+def make_image(path, width, height):
+    """Write a synthetic photo-like test image."""
+    image = Image.effect_noise((width, height), 40).convert("RGB")
+    image = Image.merge("RGB", [
+        image.getchannel(0),
+        Image.linear_gradient("L").resize((width, height)),
+        Image.radial_gradient("L").resize((width, height)),
+    ]).filter(ImageFilter.GaussianBlur(2))
+    image.save(path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Tiled vs single-shot processing benchmark")
+    parser.add_argument("--size", default="6000x4000", help="Image size, WIDTHxHEIGHT")
+    parser.add_argument("--operation", default="remove-noise",
+                        choices=("remove-noise", "remove-bg"))
+    parser.add_argument("--tile-size", type=int, default=1024)
+    parser.add_argument("--overlap", type=int, default=64)
+    parser.add_argument("--concurrency", "-c", type=int, default=4,
+                        help="Tiles processed at once")
+    parser.add_argument("--ms-per-mp", type=float, default=500.0,
+                        help="Simulated inference cost per megapixel")
+    parser.add_argument("--server-slots", type=int, default=4,
+                        help="Requests the stub computes at once")
+    parser.add_argument("--upscale", type=int, default=2,
+                        help="Result scale factor, as for AI upscaling")
+    args = parser.parse_args()
+    width, height = (int(n) for n in args.size.lower().split("x"))
+
+    port_queue = multiprocessing.Queue()
+    server = multiprocessing.Process(
+        target=serve, daemon=True,
+        args=(port_queue, args.ms_per_mp, args.upscale, args.server_slots)
+    )
+    server.start()
+    port = port_queue.get()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        os.environ["HOME"] = str(tmp)
+        os.environ["PXFORGE_REGISTRY"] = str(tmp / "registry.db")
+
+        from pxforge.api_client import PxForgeClient
+        from pxforge.operations import get_operation, send_operation
+        from pxforge.regions import process_tiled
+
+        client = PxForgeClient(
+            base_url=f"http://127.0.0.1:{port}",
+            pool_size=max(args.concurrency * 2, 10), use_cache=False
+        )
+
+        source = tmp / "source.png"
+        make_image(source, width, height)
+        print(f"Image: {width}x{height} ({os.path.getsize(source) / 1e6:.1f} MB PNG), "
+              f"{args.ms_per_mp:.0f} ms/MP, {args.server_slots} server slot(s), "
+              f"x{args.upscale}")
+
+        start = time.perf_counter()
+        uploaded = client.upload_image(str(source))
+        result = send_operation(
+            get_operation(args.operation), uploaded["image_id"], {}, client
+        )
+        single = tmp / "single.png"
+        client.download_image(result["image_url"], str(single))
+        single_time = time.perf_counter() - start
+        print(f"single-shot: {single_time:.2f}s")
+
+        tiled = tmp / "tiled.png"
+        start = time.perf_counter()
+        report = process_tiled(
+            str(source), args.operation, str(tiled), tile_size=args.tile_size,
+            overlap=args.overlap, concurrency=args.concurrency, client=client
+        )
+        tiled_time = time.perf_counter() - start
+        print(f"tiled ({report.tiles} tiles of <={args.tile_size}, overlap {args.overlap}, "
+              f"concurrency {args.concurrency}): {tiled_time:.2f}s "
+              f"({single_time / tiled_time:.2f}x)")
+
+        with Image.open(single) as a, Image.open(tiled) as b:
+            diff = ImageChops.difference(a.convert("RGB"), b.convert("RGB"))
+            extrema = max(high for _, high in diff.getextrema())
+            mean = max(ImageStat.Stat(diff).mean)
+        print(f"difference from single-shot: max {extrema}, mean {mean:.3f}")
+        server.terminate()
+
+
+if __name__ == "__main__":
+    main()
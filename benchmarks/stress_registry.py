@@ -0,0 +1,80 @@
+"""
+Stress test for concurrent registry writes.
+
+Starts the local stub backend, then runs N `pxforge upload` processes
+at once against a fresh registry and checks that every upload was
+recorded and the database is intact.
+
+    python benchmarks/stress_registry.py --uploaders 32
+"""
+
+import argparse
+import os
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from stub_server import start_server
+
+
+def run_upload(image_path, env):
+    return subprocess.run(
+        [sys.executable, "-m", "pxforge.cli", "upload", str(image_path)],
+        env=env, capture_output=True, text=True
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Concurrent upload stress test")
+    parser.add_argument("--uploaders", "-n", type=int, default=32,
+                        help="Number of concurrent pxforge processes")
+    parser.add_argument("--rounds", type=int, default=1,
+                        help="Uploads per process slot")
+    args = parser.parse_args()
+
+    server = start_server()
+    base_url = f"http://127.0.0.1:{server.server_address[1]}"
+
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        registry = tmp / "registry.db"
+        total = args.uploaders * args.rounds
+        images = []
+        for i in range(total):
+            image = tmp / f"image-{i}.bin"
+            image.write_bytes(os.urandom(1024) + str(i).encode())
+            images.append(image)
+
+        env = dict(os.environ, PXFORGE_API_URL=base_url, PXFORGE_REGISTRY=str(registry))
+        src = Path(__file__).resolve().parent.parent / "src"
+        env["PYTHONPATH"] = os.pathsep.join(filter(None, [str(src), env.get("PYTHONPATH")]))
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.uploaders) as pool:
+            results = list(pool.map(lambda image: run_upload(image, env), images))
+        elapsed = time.perf_counter() - start
+
+        failures = [r for r in results if r.returncode != 0 or "Failed" in r.stderr]
+        conn = sqlite3.connect(str(registry))
+        integrity = conn.execute("PRAGMA integrity_check").fetchone()[0]
+        recorded = conn.execute("SELECT COUNT(*) FROM images").fetchone()[0]
+        conn.close()
+
+    server.shutdown()
+
+    print(f"{total} uploads from {args.uploaders} concurrent processes in {elapsed:.1f}s")
+    print(f"Recorded: {recorded}/{total}, failed commands: {len(failures)}, integrity: {integrity}")
+    for result in failures[:5]:
+        print(result.stderr.strip(), file=sys.stderr)
+
+    ok = recorded == total and not failures and integrity == "ok"
+    print("PASS" if ok else "FAIL")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
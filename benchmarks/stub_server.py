@@ -0,0 +1,436 @@
+"""
+Local stub of the pxForge backend for stress tests and benchmarks.
+
+Implements the endpoints the CLI uses with the same request and
+response shapes as the hosted API, keeping uploaded images in memory.
+Processing endpoints return a new image whose content is a copy of the
+input, so results can be downloaded and chained. With --resumable the
+chunked upload protocol (/uploads) is offered as well, and with
+--job-delay requests sent with "Prefer: respond-async" become jobs that
+finish after the given number of seconds.
+
+For benchmarks, every API request can be delayed (--latency, plus up
+to --jitter more), a fraction of uploads and processing requests can
+fail with 503 and a Retry-After of zero (--error-rate), and processing
+results can be given a fixed size (--result-size) instead of copying
+the input. Images are served with an ETag and honour Range and If-Range.
+
+Run standalone with:
+
+    python benchmarks/stub_server.py --port 8000 --latency 20 --error-rate 0.01
+"""
+
+import argparse
+import hashlib
+import json
+import multiprocessing
+import os
+import random
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl
+
+
+PROCESSING_ENDPOINTS = (
+    "/resize", "/aspect-ratio", "/rotate", "/toBW", "/toRGB", "/contrast",
+    "/brightness", "/remove-background", "/remove-object", "/remove-noise",
+    "/replace-bg", "/prompt-edit", "/watermark",
+)
+
+
+def parse_multipart(body, content_type):
+    """
+    Split a multipart/form-data body into fields and files.
+
+    Returns:
+        tuple: (fields dict of str, files dict of bytes)
+    """
+    boundary = content_type.split("boundary=", 1)[1].strip('"').encode()
+    fields, files = {}, {}
+    for part in body.split(b"--" + boundary):
+        if b"\r\n\r\n" not in part:
+            continue
+        head, _, content = part.partition(b"\r\n\r\n")
+        content = content[:-2] if content.endswith(b"\r\n") else content
+        disposition = next(
+            (line for line in head.decode("latin-1").split("\r\n")
+             if line.lower().startswith("content-disposition")),
+            ""
+        )
+        params = dict(
+            item.strip().split("=", 1) for item in disposition.split(";")[1:] if "=" in item
+        )
+        name = params.get("name", "").strip('"')
+        if "filename" in params:
+            files[name] = content
+        else:
+            fields[name] = content.decode()
+    return fields, files
+
+
+UPLOAD_CHUNK_SIZE = 4 * 1024 * 1024
+
+
+def _etag(content):
+    """Strong validator for an image, so clients can resume with If-Range."""
+    return f'"{hashlib.sha256(content).hexdigest()[:16]}"'
+
+
+class StubState:
+    """In-memory image store shared by request handlers."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.images = {}
+        self.uploads = {}
+        self.jobs = {}
+
+    def add(self, content):
+        image_id = str(uuid.uuid4())
+        with self.lock:
+            self.images[image_id] = content
+        return image_id
+
+    def get(self, image_id):
+        with self.lock:
+            return self.images.get(image_id)
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    state = StubState()
+    resumable = False
+    job_delay = None
+    latency = 0.0
+    jitter = 0.0
+    error_rate = 0.0
+    result_size = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def _simulate(self, fail=True):
+        """
+        Apply the configured latency and, if fail, the error rate.
+
+        Returns:
+            bool: True if an error response was sent instead
+        """
+        delay = self.latency + random.uniform(0, self.jitter)
+        if delay:
+            time.sleep(delay)
+        if fail and self.error_rate and random.random() < self.error_rate:
+            body = b'{"error": "Service unavailable (simulated)"}'
+            self.send_response(503)
+            self.send_header("Retry-After", "0")
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+            return True
+        return False
+
+    def _send_json(self, payload, status=200):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _image_url(self, image_id):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}/images/{image_id}"
+
+    def _read_body(self):
+        length = int(self.headers.get("Content-Length", 0))
+        body = self.rfile.read(length) if length else b""
+        content_type = self.headers.get("Content-Type", "")
+        if content_type.startswith("multipart/form-data"):
+            return parse_multipart(body, content_type)
+        if content_type.startswith("application/json"):
+            return json.loads(body or b"{}"), {}
+        if content_type.startswith("application/x-www-form-urlencoded"):
+            return dict(parse_qsl(body.decode())), {}
+        return {}, {}
+
+    def _image_range(self, content):
+        """
+        Resolve the request's Range header against content.
+
+        Returns:
+            tuple: (first, last) byte positions, or None for the whole body
+        """
+        spec = self.headers.get("Range", "")
+        if not spec.startswith("bytes="):
+            return None
+        validator = self.headers.get("If-Range")
+        if validator is not None and validator != _etag(content):
+            return None
+        first, _, last = spec[len("bytes="):].partition("-")
+        first = int(first or 0)
+        last = min(int(last), len(content) - 1) if last else len(content) - 1
+        return first, last
+
+    def do_HEAD(self):
+        self._simulate(fail=False)
+        content = None
+        if self.path.startswith("/images/"):
+            content = self.state.get(self.path[len("/images/"):])
+            if content is None:
+                self.send_response(404)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+
+        self.send_response(200)
+        if content is None:
+            self.send_header("Content-Length", "0")
+        else:
+            self.send_header("Accept-Ranges", "bytes")
+            self.send_header("Content-Length", str(len(content)))
+        self.end_headers()
+
+    def _upload_session(self):
+        upload_id = self.path[len("/uploads/"):]
+        with self.state.lock:
+            return upload_id, self.state.uploads.get(upload_id)
+
+    def do_PUT(self):
+        length = int(self.headers.get("Content-Length", 0))
+        chunk = self.rfile.read(length) if length else b""
+        if self._simulate():
+            return
+        upload_id, upload = self._upload_session()
+        if not self.resumable or upload is None:
+            self._send_json({"error": "Not found"}, status=404)
+            return
+
+        content_range = self.headers.get("Content-Range", "")
+        start = int(content_range.split(" ", 1)[-1].split("-", 1)[0] or 0)
+        if start != len(upload["data"]):
+            self._send_json({"error": "Offset mismatch", "offset": len(upload["data"])},
+                            status=409)
+            return
+        upload["data"] += chunk
+        offset = len(upload["data"])
+        if offset < upload["size"]:
+            self._send_json({"offset": offset})
+            return
+
+        with self.state.lock:
+            self.state.uploads.pop(upload_id, None)
+        image_id = self.state.add(bytes(upload["data"]))
+        self._send_json({
+            "offset": offset, "image_id": image_id, "image_url": self._image_url(image_id)
+        })
+
+    def _send_job(self):
+        with self.state.lock:
+            job = self.state.jobs.get(self.path[len("/jobs/"):])
+        if job is None:
+            self._send_json({"error": "Not found"}, status=404)
+        elif time.monotonic() < job["ready_at"]:
+            self._send_json({"status": "running"})
+        else:
+            self._send_json({"status": "succeeded", "result": job["result"]})
+
+    def do_GET(self):
+        self._simulate(fail=False)
+        if self.job_delay is not None and self.path.startswith("/jobs/"):
+            self._send_job()
+            return
+        if self.resumable and self.path.startswith("/uploads/"):
+            _, upload = self._upload_session()
+            if upload is None:
+                self._send_json({"error": "Not found"}, status=404)
+                return
+            self._send_json({"offset": len(upload["data"]), "chunk_size": UPLOAD_CHUNK_SIZE})
+            return
+        if not self.path.startswith("/images/"):
+            self._send_json({"error": "Not found"}, status=404)
+            return
+        content = self.state.get(self.path[len("/images/"):])
+        if content is None:
+            self._send_json({"error": "Not found"}, status=404)
+            return
+        etag = _etag(content)
+        byte_range = self._image_range(content)
+        if byte_range and byte_range[0] >= len(content):
+            self.send_response(416)
+            self.send_header("Content-Range", f"bytes */{len(content)}")
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+
+        if byte_range:
+            first, last = byte_range
+            self.send_response(206)
+            self.send_header("Content-Range", f"bytes {first}-{last}/{len(content)}")
+            content = content[first:last + 1]
+        else:
+            self.send_response(200)
+        self.send_header("Content-Type", "application/octet-stream")
+        self.send_header("Accept-Ranges", "bytes")
+        self.send_header("ETag", etag)
+        self.send_header("Content-Length", str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def do_POST(self):
+        fields, files = self._read_body()
+        if self._simulate():
+            return
+
+        if self.path == "/upload":
+            if "image" not in files:
+                self._send_json({"error": "No image provided"}, status=400)
+                return
+            image_id = self.state.add(files["image"])
+            self._send_json({"image_id": image_id, "image_url": self._image_url(image_id)})
+            return
+
+        if self.path == "/uploads" and self.resumable:
+            upload_id = str(uuid.uuid4())
+            with self.state.lock:
+                self.state.uploads[upload_id] = {
+                    "size": int(fields.get("size", 0)), "data": bytearray()
+                }
+            self._send_json(
+                {"upload_id": upload_id, "offset": 0, "chunk_size": UPLOAD_CHUNK_SIZE},
+                status=201
+            )
+            return
+
+        if self.path not in PROCESSING_ENDPOINTS:
+            self._send_json({"error": "Not found"}, status=404)
+            return
+
+        content = self.state.get(fields.get("image_id"))
+        if content is None:
+            self._send_json({"success": False, "error": "Image not found"})
+            return
+        if self.result_size is not None:
+            content = os.urandom(self.result_size)
+        result_id = self.state.add(content)
+        result = {"success": True, "image_url": self._image_url(result_id)}
+        if self.job_delay is not None and "respond-async" in self.headers.get("Prefer", ""):
+            job_id = str(uuid.uuid4())
+            with self.state.lock:
+                self.state.jobs[job_id] = {
+                    "ready_at": time.monotonic() + self.job_delay, "result": result
+                }
+            self._send_json({"job_id": job_id, "status": "queued"}, status=202)
+            return
+        self._send_json(result)
+
+
+def configure(resumable=False, job_delay=None, latency=0.0, jitter=0.0, error_rate=0.0,
+              result_size=None):
+    """
+    Set the stub's behaviour for every handler.
+
+    Args:
+        resumable: Offer the resumable upload protocol
+        job_delay: Seconds async jobs take (None disables async jobs)
+        latency: Seconds added to every API request
+        jitter: Up to this many more seconds, uniformly at random
+        error_rate: Fraction of uploads and processing requests that
+            fail with 503
+        result_size: Bytes in each processing result (None copies the input)
+    """
+    StubHandler.resumable = resumable
+    StubHandler.job_delay = job_delay
+    StubHandler.latency = latency
+    StubHandler.jitter = jitter
+    StubHandler.error_rate = error_rate
+    StubHandler.result_size = result_size
+
+
+def start_server(host="127.0.0.1", port=0, **settings):
+    """
+    Start the stub server on a background thread.
+
+    Args:
+        host: Interface to bind
+        port: Port to bind (0 picks a free port)
+        **settings: Passed to configure()
+
+    Returns:
+        ThreadingHTTPServer: The running server; its base URL is
+        f"http://{host}:{server.server_address[1]}"
+    """
+    configure(**settings)
+    server = ThreadingHTTPServer((host, port), StubHandler)
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server
+
+
+def _serve(port_queue, host, settings):
+    configure(**settings)
+    server = ThreadingHTTPServer((host, 0), StubHandler)
+    server.daemon_threads = True
+    port_queue.put(server.server_address[1])
+    server.serve_forever()
+
+
+def start_process(host="127.0.0.1", **settings):
+    """
+    Start the stub server in a child process.
+
+    Benchmarks that run the client in-process use this so the stub does
+    not compete with the client for the GIL.
+
+    Args:
+        host: Interface to bind
+        **settings: Passed to configure()
+
+    Returns:
+        tuple: (multiprocessing.Process, base URL); terminate the
+        process when done
+    """
+    port_queue = multiprocessing.Queue()
+    process = multiprocessing.Process(
+        target=_serve, args=(port_queue, host, settings), daemon=True
+    )
+    process.start()
+    return process, f"http://{host}:{port_queue.get()}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--resumable", action="store_true",
+                        help="Offer the resumable chunked upload protocol")
+    parser.add_argument("--job-delay", type=float,
+                        help="Accept async jobs that finish after this many seconds")
+    parser.add_argument("--latency", type=float, default=0.0,
+                        help="Milliseconds added to every API request")
+    parser.add_argument("--jitter", type=float, default=0.0,
+                        help="Up to this many more milliseconds, at random")
+    parser.add_argument("--error-rate", type=float, default=0.0,
+                        help="Fraction of uploads and processing requests failing with 503")
+    parser.add_argument("--result-size", type=int,
+                        help="Bytes in each processing result (default: copy the input)")
+    args = parser.parse_args()
+
+    configure(
+        resumable=args.resumable, job_delay=args.job_delay, latency=args.latency / 1000,
+        jitter=args.jitter / 1000, error_rate=args.error_rate, result_size=args.result_size
+    )
+
+    server = ThreadingHTTPServer((args.host, args.port), StubHandler)
+    print(f"Stub pxForge API listening on http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -1,105 +1,920 @@
 """
 API client for making requests to the pxForge backend.
 
-Provides functions for interacting with the image processing API
-with proper error handling and response validation.
+Provides a pooled, keep-alive client for interacting with the image
+processing API with proper error handling and response validation.
+Connection setup time is tracked separately from server time so slow
+handshakes can be told apart from slow operations.
 """
 
-import requests
-from typing import Optional, Dict, Any
+import contextvars
+import json
+import os
+import shutil
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING, Optional, Dict, Any, List, NamedTuple
 from pathlib import Path
+from urllib.parse import urlsplit
+from .cache import CACHEABLE_ENDPOINTS, cache_key, get_result_cache
 from .config import get_base_url
+from .singleflight import Lease, get_flights
+from .tracing import get_tracer, traced
+from .transfer import CHUNK_SIZE, FileSlice, MultipartStream, ProgressCallback
+from .utilities import (
+    find_upload_session, hash_file, remove_upload_session, save_upload_session
+)
 
+# requests, urllib3 and the scheduler (which builds on requests) are
+# imported when a client is created or used, so commands that never
+# contact the server start without loading them.
+if TYPE_CHECKING:
+    from .scheduler import Scheduler
 
-def make_request(
-    endpoint: str,
-    method: str = "POST",
-    files: Optional[Dict] = None,
-    data: Optional[Dict] = None,
-    timeout: int = 300,
-    use_form_data: bool = False
-) -> Dict[str, Any]:
+
+DEFAULT_POOL_SIZE = 10
+WARM_UP_TIMEOUT = 10
+UPLOAD_TIMEOUT = 300
+
+# Files at least this large use the server's resumable upload protocol
+# when it offers one.
+RESUMABLE_THRESHOLD = 16 * 1024 * 1024
+DEFAULT_UPLOAD_CHUNK = 8 * 1024 * 1024
+# Smallest chunk size taken from the server, so a bogus value cannot
+# turn an upload into millions of requests (or an endless loop at 0).
+MIN_UPLOAD_CHUNK = 256 * 1024
+MAX_CHUNK_RETRIES = 5
+
+DOWNLOAD_TIMEOUT = 60
+MAX_DOWNLOAD_RETRIES = 5
+# Files smaller than this are not worth splitting into byte ranges.
+PARALLEL_MIN_SIZE = 8 * 1024 * 1024
+
+
+class RequestTiming(NamedTuple):
     """
-    Make an HTTP request to the API.
+    Timing breakdown of a single API call, in seconds.
 
-    Args:
-        endpoint: API endpoint path
-        method: HTTP method (GET, POST, etc.)
-        files: Files to upload
-        data: JSON data or form data to send
-        timeout: Request timeout in seconds
-        use_form_data: Force form data encoding (application/x-www-form-urlencoded)
+    connect covers DNS, TCP and TLS setup (zero when a pooled connection
+    was reused); server is the time to the response headers minus
+    connect; total is the wall time including reading the body.
+    """
 
-    Returns:
-        dict: API response data
-
-    Raises:
-        requests.RequestException: If request fails
-    """
-    base_url = get_base_url()
-    url = f"{base_url}{endpoint}"
-
-    # When files are present or use_form_data is True, use form data
-    # Otherwise, use JSON (application/json)
-    if files or use_form_data:
-        response = requests.request(
-            method=method,
-            url=url,
-            files=files,
-            data=data,
-            timeout=timeout
+    endpoint: str
+    connect: float
+    server: float
+    total: float
+    new_connections: int
+
+
+class ClientStats:
+    """
+    Thread-safe accumulator of request timings for a client.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.timings: List[RequestTiming] = []
+
+    def add(self, timing: RequestTiming):
+        with self._lock:
+            self.timings.append(timing)
+
+    def summary(self) -> Dict[str, float]:
+        """
+        Aggregate the recorded timings.
+
+        Returns:
+            dict: Request and connection counts plus summed times
+        """
+        with self._lock:
+            timings = list(self.timings)
+        return {
+            "requests": len(timings),
+            "connections": sum(t.new_connections for t in timings),
+            "connect": sum(t.connect for t in timings),
+            "server": sum(t.server for t in timings),
+            "total": sum(t.total for t in timings),
+        }
+
+
+class PxForgeClient:
+    """
+    Pooled HTTP client for the pxForge API.
+
+    A single requests.Session is shared by every call so TCP and TLS
+    handshakes are paid once per pooled connection instead of once per
+    request. Responses of processing endpoints are served from the
+    local result cache when possible, and identical processing requests
+    made at the same time, by threads of this process or by other
+    pxforge processes, share one server call (see singleflight.py).
+    Every request goes through a
+    Scheduler, which retries transient failures, limits concurrency
+    adaptively and stops calling a backend that is down.
+    """
+
+    def __init__(
+        self,
+        base_url: Optional[str] = None,
+        pool_size: int = DEFAULT_POOL_SIZE,
+        use_cache: bool = True,
+        scheduler: Optional["Scheduler"] = None
+    ):
+        """
+        Args:
+            base_url: API base URL (defaults to the configured URL)
+            pool_size: Maximum number of connections kept alive per host
+            use_cache: Consult the result cache (unless disabled globally)
+            scheduler: Request scheduler (defaults to one with a
+                concurrency window of at most pool_size)
+        """
+        from .connections import new_session
+        from .scheduler import AdaptiveLimiter, Scheduler
+
+        self.base_url = base_url or get_base_url()
+        self.pool_size = pool_size
+        self.use_cache = use_cache
+        self.stats = ClientStats()
+        self.scheduler = scheduler or Scheduler(limiter=AdaptiveLimiter(
+            initial=min(4, pool_size), maximum=pool_size
+        ))
+        # Whether the server offers resumable uploads; None until probed.
+        self._resumable = None
+
+        self.session = new_session(pool_size)
+
+    def close(self):
+        """Close all pooled connections."""
+        self.session.close()
+
+    def reset_stats(self):
+        """
+        Start new timing and retry counts, keeping the pooled connections.
+
+        Used between commands run by one resident process.
+        """
+        self.stats = ClientStats()
+        self.scheduler.reset_counters()
+
+    def warm_up(self, connections: int = 1):
+        """
+        Open pooled connections ahead of the first real request.
+
+        Failures are ignored; the request that follows reports them.
+
+        Args:
+            connections: Number of connections to establish in parallel
+        """
+        import requests
+        from .connections import take_connect_time
+
+        def _touch():
+            try:
+                self.session.head(self.base_url, timeout=WARM_UP_TIMEOUT)
+            except requests.RequestException:
+                pass
+            finally:
+                take_connect_time()
+
+        threads = [
+            threading.Thread(target=_touch)
+            for _ in range(min(connections, self.pool_size))
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    def _send(self, method: str, url: str, **kwargs):
+        from .connections import take_connect_time, take_phase_times
+        from .scheduler import IDEMPOTENT_METHODS
+
+        tracer = get_tracer()
+
+        def _attempt():
+            # Bodies are consumed by a failed attempt; start them over.
+            body = kwargs.get("data")
+            if hasattr(body, "rewind"):
+                body.rewind()
+            for value in (kwargs.get("files") or {}).values():
+                handle = value[1] if isinstance(value, tuple) else value
+                if hasattr(handle, "seek"):
+                    handle.seek(0)
+            take_phase_times()
+            attempt_start = time.perf_counter()
+            response = self.session.request(method=method, url=url, **kwargs)
+            if tracer.active:
+                _trace_phases(
+                    tracer, take_phase_times(), response.elapsed.total_seconds(),
+                    None if kwargs.get("stream") else time.perf_counter() - attempt_start
+                )
+            return response
+
+        # Latencies are compared per endpoint, not per image URL.
+        endpoint = "/".join(urlsplit(url).path.split("/")[:2])
+        take_connect_time()
+        start = time.perf_counter()
+        with tracer.span(f"http {method} {endpoint}"):
+            response = self.scheduler.call(
+                _attempt, key=f"{method} {endpoint}", idempotent=method in IDEMPOTENT_METHODS,
+                size=_body_size(kwargs)
+            )
+        connect, new_connections = take_connect_time()
+        server = max(response.elapsed.total_seconds() - connect, 0.0)
+        return response, start, connect, server, new_connections
+
+    def request(
+        self,
+        endpoint: str,
+        method: str = "POST",
+        files: Optional[Dict] = None,
+        data: Optional[Dict] = None,
+        timeout: int = 300,
+        use_form_data: bool = False,
+        headers: Optional[Dict[str, str]] = None
+    ) -> Dict[str, Any]:
+        """
+        Make an HTTP request to the API.
+
+        Args:
+            endpoint: API endpoint path
+            method: HTTP method (GET, POST, etc.)
+            files: Files to upload
+            data: JSON data or form data to send
+            timeout: Request timeout in seconds
+            use_form_data: Force form data encoding (application/x-www-form-urlencoded)
+            headers: Extra request headers
+
+        Returns:
+            dict: API response data
+
+        Raises:
+            requests.RequestException: If request fails
+        """
+        with get_tracer().span(f"api {endpoint}"):
+            return self._request(
+                endpoint, method, files, data, timeout, use_form_data, headers
+            )
+
+    def _request(self, endpoint, method, files, data, timeout, use_form_data, headers):
+        if method != "POST" or endpoint not in CACHEABLE_ENDPOINTS:
+            return self._send_request(
+                endpoint, method, files, data, timeout, use_form_data, headers
+            )
+
+        start = time.perf_counter()
+        key = cache_key(self.base_url, endpoint, data, files)
+        cache = get_result_cache() if self.use_cache else None
+        if cache is not None:
+            cached = cache.get(key)
+            if cached is not None:
+                self.stats.add(RequestTiming(
+                    f"{endpoint} (cached)", 0.0, 0.0, time.perf_counter() - start, 0
+                ))
+                return cached
+
+        def _leader():
+            # Other processes can only share the result through the cache.
+            if cache is None or headers:
+                return self._send_request(
+                    endpoint, method, files, data, timeout, use_form_data, headers, key, cache
+                )
+            with Lease(key, timeout) as waited:
+                cached = cache.get(key) if waited else None
+                if cached is not None:
+                    self.stats.add(RequestTiming(
+                        f"{endpoint} (shared)", 0.0, 0.0, time.perf_counter() - start, 0
+                    ))
+                    return cached
+                return self._send_request(
+                    endpoint, method, files, data, timeout, use_form_data, headers, key, cache
+                )
+
+        # Identical requests in flight on other threads share one call.
+        flight = (key, tuple(sorted((headers or {}).items())))
+        result, shared = get_flights().do(flight, _leader)
+        if shared:
+            self.stats.add(RequestTiming(
+                f"{endpoint} (shared)", 0.0, 0.0, time.perf_counter() - start, 0
+            ))
+        return result
+
+    def _send_request(
+        self, endpoint, method, files, data, timeout, use_form_data, headers,
+        key=None, cache=None
+    ):
+        url = f"{self.base_url}{endpoint}"
+
+        # When files are present or use_form_data is True, use form data
+        # Otherwise, use JSON (application/json)
+        if files or use_form_data:
+            kwargs = {"files": files, "data": data}
+        else:
+            kwargs = {"json": data}
+
+        response, start, connect, server, new_connections = self._send(
+            method, url, timeout=timeout, headers=headers, **kwargs
         )
-    else:
-        response = requests.request(
-            method=method,
-            url=url,
-            json=data,
-            timeout=timeout
+        response.raise_for_status()
+        result = response.json()
+
+        self.stats.add(RequestTiming(
+            endpoint, connect, server, time.perf_counter() - start, new_connections
+        ))
+        if cache is not None and result.get("success"):
+            cache.put(key, endpoint, result)
+        return result
+
+    @traced("upload")
+    def upload_image(
+        self,
+        image_path: str,
+        progress: Optional[ProgressCallback] = None,
+        sha256: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """
+        Upload an image to the server.
+
+        The file is streamed from disk in fixed-size chunks, so memory
+        use does not grow with the file size. Large files are sent with
+        the server's resumable upload protocol when it supports one, so
+        an interrupted upload continues where it stopped, including in
+        a later run.
+
+        Args:
+            image_path: Path to the image file
+            progress: Called with (bytes sent, total) during the upload
+            sha256: Hex SHA-256 of the file, if already known
+
+        Returns:
+            dict: Response containing image ID and URL
+
+        Raises:
+            FileNotFoundError: If image file doesn't exist
+            requests.RequestException: If upload fails
+        """
+        path = Path(image_path)
+        if not path.exists():
+            raise FileNotFoundError(f"Image file not found: {image_path}")
+
+        size = path.stat().st_size
+        if size >= RESUMABLE_THRESHOLD and self._resumable is not False:
+            result = self._upload_resumable(path, size, sha256 or hash_file(path), progress)
+            if result is not None:
+                return result
+
+        stream = MultipartStream(files={"image": path}, progress=progress)
+        try:
+            response, start, connect, server, new_connections = self._send(
+                "POST", f"{self.base_url}/upload", data=stream,
+                headers={"Content-Type": stream.content_type}, timeout=UPLOAD_TIMEOUT
+            )
+        finally:
+            stream.close()
+        response.raise_for_status()
+        self.stats.add(RequestTiming(
+            "/upload", connect, server, time.perf_counter() - start, new_connections
+        ))
+        return response.json()
+
+    def _upload_resumable(
+        self,
+        path: Path,
+        size: int,
+        sha256: str,
+        progress: Optional[ProgressCallback]
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Upload a file in chunks with the resumable upload protocol.
+
+        POST /uploads opens a session, each PUT /uploads/<id> sends one
+        chunk with a Content-Range header, and GET /uploads/<id> reports
+        how many bytes the server has. The response to the last chunk
+        carries the image ID and URL.
+
+        Returns:
+            dict: Upload response, or None if the server has no
+            resumable upload endpoint or opening a session failed, in
+            which case the caller uploads the file in one request
+        """
+        import requests
+
+        upload_id = find_upload_session(sha256, self.base_url)
+        chunk_size = DEFAULT_UPLOAD_CHUNK
+        offset = 0
+        if upload_id:
+            try:
+                response = self.session.get(
+                    f"{self.base_url}/uploads/{upload_id}", timeout=WARM_UP_TIMEOUT
+                )
+                status = response.json() if response.ok else None
+            except (requests.RequestException, ValueError):
+                return None
+            if status is not None:
+                offset = status.get("offset", 0)
+                chunk_size = _chunk_size(status, chunk_size)
+            else:
+                remove_upload_session(upload_id)
+                upload_id = None
+
+        if not upload_id:
+            try:
+                response = self.session.post(
+                    f"{self.base_url}/uploads",
+                    json={"filename": path.name, "size": size, "sha256": sha256},
+                    timeout=WARM_UP_TIMEOUT
+                )
+                if response.status_code in (404, 405, 501):
+                    self._resumable = False
+                    return None
+                response.raise_for_status()
+                session = response.json()
+            except (requests.RequestException, ValueError):
+                # Possibly a passing failure: send this file in one
+                # request and ask again for the next one.
+                return None
+            upload_id = session.get("upload_id")
+            if not upload_id:
+                self._resumable = False
+                return None
+            chunk_size = _chunk_size(session, chunk_size)
+            save_upload_session(sha256, self.base_url, upload_id)
+        self._resumable = True
+
+        url = f"{self.base_url}/uploads/{upload_id}"
+        failures = 0
+        while True:
+            length = min(chunk_size, size - offset)
+            headers = {
+                "Content-Type": "application/octet-stream",
+                "Content-Range": f"bytes {offset}-{offset + length - 1}/{size}",
+            }
+            try:
+                with FileSlice(path, offset, length, progress, offset, size) as body:
+                    response, start, connect, server, new_connections = self._send(
+                        "PUT", url, data=body, headers=headers, timeout=UPLOAD_TIMEOUT
+                    )
+                response.raise_for_status()
+            except requests.RequestException:
+                failures += 1
+                if failures > MAX_CHUNK_RETRIES:
+                    raise
+                time.sleep(min(2 ** failures, 30))
+                try:
+                    status = self.session.get(url, timeout=WARM_UP_TIMEOUT)
+                    status.raise_for_status()
+                    offset = status.json().get("offset", offset)
+                except requests.RequestException:
+                    pass
+                continue
+
+            failures = 0
+            self.stats.add(RequestTiming(
+                "/uploads", connect, server, time.perf_counter() - start, new_connections
+            ))
+            result = response.json()
+            if result.get("image_id"):
+                remove_upload_session(upload_id)
+                return result
+            offset = result.get("offset", offset + length)
+            if offset >= size:
+                raise RuntimeError("Server received the whole file but returned no image ID")
+
+    @traced("fetch")
+    def fetch(self, url: str, timeout: int = 60) -> bytes:
+        """
+        Fetch the content at a URL over the pooled session.
+
+        Args:
+            url: URL to fetch
+            timeout: Request timeout in seconds
+
+        Returns:
+            bytes: Response body
+
+        Raises:
+            requests.RequestException: If the request fails
+        """
+        cache = get_result_cache() if self.use_cache else None
+        if cache is not None:
+            start = time.perf_counter()
+            content = cache.get_blob(url)
+            if content is not None:
+                self.stats.add(RequestTiming(
+                    "download (cached)", 0.0, 0.0, time.perf_counter() - start, 0
+                ))
+                return content
+
+        response, start, connect, server, new_connections = self._send(
+            "GET", url, timeout=timeout
         )
+        response.raise_for_status()
+        content = response.content
+
+        self.stats.add(RequestTiming(
+            "download", connect, server, time.perf_counter() - start, new_connections
+        ))
+        if cache is not None:
+            cache.put_blob(url, content)
+        return content
+
+    @traced("download")
+    def download_image(
+        self,
+        url: str,
+        output_path: str,
+        progress: Optional[ProgressCallback] = None,
+        segments: int = 1
+    ) -> int:
+        """
+        Download an image from a URL.
+
+        The body is streamed to a temporary file next to output_path and
+        renamed into place once complete, so output_path never holds a
+        partial file. Dropped connections are resumed with HTTP Range
+        requests, and the "<output_path>.part" file left by an
+        interrupted run is continued rather than restarted if it was
+        downloaded from the same URL and the server confirms (If-Range)
+        that the content has not changed since.
+
+        Args:
+            url: Image URL to download from
+            output_path: Path to save the downloaded image
+            progress: Called with (bytes received, total) during the download
+            segments: Fetch large files as this many parallel byte ranges
+                when the server supports range requests
+
+        Returns:
+            int: Size of the downloaded file in bytes
+
+        Raises:
+            requests.RequestException: If download fails
+        """
+        output = Path(output_path)
+        output.parent.mkdir(parents=True, exist_ok=True)
+        part = output.with_name(output.name + ".part")
+
+        cache = get_result_cache() if self.use_cache else None
+        if cache is not None:
+            start = time.perf_counter()
+            cached = cache.get_blob_file(url)
+            if cached is not None:
+                shutil.copyfile(cached, part)
+                os.replace(part, output)
+                self.stats.add(RequestTiming(
+                    "download (cached)", 0.0, 0.0, time.perf_counter() - start, 0
+                ))
+                return output.stat().st_size
+
+        size = self._range_size(url) if segments > 1 else None
+        if size is not None and size >= PARALLEL_MIN_SIZE:
+            # Ranged downloads are preallocated and filled out of order,
+            # so they use their own temporary file that is never resumed.
+            part = output.with_name(output.name + ".ranges")
+            self._download_ranges(url, part, size, segments, progress)
+        else:
+            self._download_stream(url, part, progress)
+        os.replace(part, output)
+
+        if cache is not None:
+            cache.put_blob_file(url, output)
+        return output.stat().st_size
+
+    def _range_size(self, url: str) -> Optional[int]:
+        """
+        Get a URL's size if the server accepts byte range requests.
+        """
+        import requests
+
+        try:
+            response = self.session.head(url, timeout=DOWNLOAD_TIMEOUT, allow_redirects=True)
+        except requests.RequestException:
+            return None
+        if not response.ok or response.headers.get("Accept-Ranges") != "bytes":
+            return None
+        length = response.headers.get("Content-Length")
+        return int(length) if length and length.isdigit() else None
+
+    def _download_stream(self, url: str, part: Path, progress: Optional[ProgressCallback]):
+        """
+        Stream a URL into part, resuming a part left by an earlier run.
+
+        A "<part>.json" file records the URL the part came from and the
+        validator (ETag or Last-Modified) of the response. A part is only
+        resumed for the same URL, with If-Range so the server sends the
+        whole body again if the content changed; anything else discards
+        it. Failures to connect are retried by the scheduler; this loop
+        only resumes bodies cut off mid-transfer.
+        """
+        import requests
+
+        source_path = part.with_name(part.name + ".json")
+        failures = 0
+        while True:
+            offset, validator = _resume_point(part, source_path, url)
+            headers = {}
+            if offset:
+                headers["Range"] = f"bytes={offset}-"
+                if validator:
+                    headers["If-Range"] = validator
+            response, start, connect, server, new_connections = self._send(
+                "GET", url, headers=headers, stream=True, timeout=DOWNLOAD_TIMEOUT
+            )
+            with response:
+                first, total = _content_range(response)
+                if offset and response.status_code == 416:
+                    if total == offset:
+                        # The previous run received everything but was
+                        # stopped before renaming the file.
+                        break
+                    _discard_part(part, source_path)
+                    continue
+                response.raise_for_status()
+                if response.status_code == 206 and first != offset:
+                    _discard_part(part, source_path)
+                    continue
+                if response.status_code != 206:
+                    offset = 0
+                    length = response.headers.get("Content-Length")
+                    total = int(length) if length and length.isdigit() else None
+                if not offset:
+                    _record_source(source_path, url, response)
+
+                done = offset
+                try:
+                    with get_tracer().span("receive"), open(part, "ab" if offset else "wb") as f:
+                        for chunk in response.iter_content(CHUNK_SIZE):
+                            f.write(chunk)
+                            done += len(chunk)
+                            if progress:
+                                progress(done, total or 0)
+                except (requests.ConnectionError, requests.Timeout,
+                        requests.exceptions.ChunkedEncodingError):
+                    failures += 1
+                    if failures > MAX_DOWNLOAD_RETRIES:
+                        raise
+                    time.sleep(min(2 ** failures, 30))
+                    continue
+
+            self.stats.add(RequestTiming(
+                "download", connect, server, time.perf_counter() - start, new_connections
+            ))
+            break
+        source_path.unlink(missing_ok=True)
 
-    response.raise_for_status()
-    return response.json()
+    def _download_ranges(
+        self,
+        url: str,
+        part: Path,
+        size: int,
+        segments: int,
+        progress: Optional[ProgressCallback]
+    ):
+        """
+        Download a URL as parallel byte ranges written into part.
+        """
+        import requests
 
+        with open(part, "wb") as f:
+            f.truncate(size)
 
-def upload_image(image_path: str) -> Dict[str, Any]:
+        lock = threading.Lock()
+        received = [0]
+
+        def _fetch(first, last):
+            position = first
+            failures = 0
+            while position <= last:
+                response, start, connect, server, new_connections = self._send(
+                    "GET", url, headers={"Range": f"bytes={position}-{last}"},
+                    stream=True, timeout=DOWNLOAD_TIMEOUT
+                )
+                with response:
+                    response.raise_for_status()
+                    if response.status_code != 206 or _content_range(response)[0] != position:
+                        raise RuntimeError("Server ignored the byte range request")
+                    try:
+                        with get_tracer().span("receive"), open(part, "r+b") as f:
+                            f.seek(position)
+                            for chunk in response.iter_content(CHUNK_SIZE):
+                                chunk = chunk[:last + 1 - position]
+                                f.write(chunk)
+                                position += len(chunk)
+                                with lock:
+                                    received[0] += len(chunk)
+                                    if progress:
+                                        progress(received[0], size)
+                    except (requests.ConnectionError, requests.Timeout,
+                            requests.exceptions.ChunkedEncodingError):
+                        # Connection failures are retried by the scheduler;
+                        # here only a body cut off mid-transfer is resumed.
+                        failures += 1
+                        if failures > MAX_DOWNLOAD_RETRIES:
+                            raise
+                        time.sleep(min(2 ** failures, 30))
+                        continue
+                self.stats.add(RequestTiming(
+                    "download (range)", connect, server,
+                    time.perf_counter() - start, new_connections
+                ))
+
+        step = -(-size // segments)
+        with ThreadPoolExecutor(max_workers=segments) as pool:
+            # Each range gets its own copy of the caller's context so its
+            # spans nest under the download.
+            futures = [
+                pool.submit(
+                    contextvars.copy_context().run, _fetch, first, min(first + step, size) - 1
+                )
+                for first in range(0, size, step)
+            ]
+            for future in futures:
+                future.result()
+
+
+def _body_size(kwargs: Dict[str, Any]) -> int:
+    """Bytes in a request's body, as far as they are known before sending."""
+    body = kwargs.get("data")
+    size = len(body) if isinstance(body, (bytes, FileSlice, MultipartStream)) else 0
+    for value in (kwargs.get("files") or {}).values():
+        handle = value[1] if isinstance(value, tuple) else value
+        if isinstance(handle, bytes):
+            size += len(handle)
+        elif hasattr(handle, "fileno"):
+            size += os.fstat(handle.fileno()).st_size
+    return size
+
+
+def _chunk_size(reply: Dict[str, Any], default: int) -> int:
+    """The chunk size a resumable upload reply asks for, within bounds."""
+    try:
+        return max(int(reply.get("chunk_size", default)), MIN_UPLOAD_CHUNK)
+    except (TypeError, ValueError):
+        return default
+
+
+def _resume_point(part: Path, source_path: Path, url: str):
     """
-    Upload an image to the server.
+    Where to resume part from for url.
+
+    Returns:
+        tuple: (offset, validator for If-Range or None); (0, None) after
+        discarding a part that has no record of coming from url
+    """
+    try:
+        offset = part.stat().st_size
+    except FileNotFoundError:
+        return 0, None
+    try:
+        source = json.loads(source_path.read_text())
+    except (OSError, ValueError):
+        source = None
+    if not offset or not isinstance(source, dict) or source.get("url") != url:
+        _discard_part(part, source_path)
+        return 0, None
+    return offset, source.get("validator")
+
+
+def _record_source(source_path: Path, url: str, response):
+    """
+    Record which URL and response version a new part file holds.
+    """
+    validator = response.headers.get("ETag")
+    if not validator or validator.startswith("W/"):
+        # If-Range needs a strong validator.
+        validator = response.headers.get("Last-Modified")
+    source_path.write_text(json.dumps({"url": url, "validator": validator}))
+
+
+def _discard_part(part: Path, source_path: Path):
+    part.unlink(missing_ok=True)
+    source_path.unlink(missing_ok=True)
 
-    Args:
-        image_path: Path to the image file
+
+def _content_range(response):
+    """
+    Parse the Content-Range header of a 206 or 416 response.
 
     Returns:
-        dict: Response containing image ID and URL
+        tuple: (first byte or None, total size or None)
+    """
+    value = response.headers.get("Content-Range", "")
+    unit, _, spec = value.partition(" ")
+    span, _, total = spec.partition("/")
+    if unit != "bytes":
+        return None, None
+    first = span.partition("-")[0]
+    return (
+        int(first) if first.isdigit() else None,
+        int(total) if total.isdigit() else None,
+    )
+
+
+def _trace_phases(tracer, phases, headers_at, finished_at):
+    """
+    Record the phases of one HTTP attempt inside its span.
+
+    Args:
+        tracer: Active tracer
+        phases: Phase times from connections.take_phase_times
+        headers_at: Seconds from sending to the response headers
+        finished_at: Seconds until the body was read, or None when it is
+            streamed by the caller
+    """
+    for phase in ("connect", "tls", "send"):
+        if phases.get(phase):
+            tracer.add(phase, phases[phase])
+    tracer.add("server", max(headers_at - sum(phases.values()), 0.0))
+    if finished_at is not None:
+        tracer.add("receive", max(finished_at - headers_at, 0.0))
 
-    Raises:
-        FileNotFoundError: If image file doesn't exist
-        requests.RequestException: If upload fails
+
+_client: Optional[PxForgeClient] = None
+_client_lock = threading.Lock()
+
+
+def get_client(create: bool = True) -> Optional[PxForgeClient]:
     """
-    path = Path(image_path)
-    if not path.exists():
-        raise FileNotFoundError(f"Image file not found: {image_path}")
+    Get the shared client, creating it on first use.
 
-    with open(path, "rb") as img_file:
-        files = {"image": img_file}
-        return make_request("/upload", files=files)
+    Args:
+        create: Create the client if there is none yet
+
+    Returns:
+        PxForgeClient: Process-wide pooled client, or None if create is
+        False and no client exists
+    """
+    global _client
+    with _client_lock:
+        if _client is None and create:
+            _client = PxForgeClient()
+        return _client
 
 
-def download_image(url: str, output_path: str):
+def set_client(client: PxForgeClient):
     """
-    Download an image from a URL.
+    Replace the shared client, closing the previous one.
 
     Args:
-        url: Image URL to download from
-        output_path: Path to save the downloaded image
+        client: Client to use for subsequent module-level calls
+    """
+    global _client
+    with _client_lock:
+        previous, _client = _client, client
+    if previous is not None and previous is not client:
+        previous.close()
+
 
-    Raises:
-        requests.RequestException: If download fails
+def make_request(
+    endpoint: str,
+    method: str = "POST",
+    files: Optional[Dict] = None,
+    data: Optional[Dict] = None,
+    timeout: int = 300,
+    use_form_data: bool = False,
+    headers: Optional[Dict[str, str]] = None
+) -> Dict[str, Any]:
+    """
+    Make an HTTP request to the API through the shared client.
+
+    See PxForgeClient.request for arguments and return value.
     """
-    response = requests.get(url, timeout=60)
-    response.raise_for_status()
+    return get_client().request(
+        endpoint,
+        method=method,
+        files=files,
+        data=data,
+        timeout=timeout,
+        use_form_data=use_form_data,
+        headers=headers
+    )
 
-    output = Path(output_path)
-    output.parent.mkdir(parents=True, exist_ok=True)
 
-    with open(output, "wb") as f:
-        f.write(response.content)
+def upload_image(
+    image_path: str,
+    progress: Optional[ProgressCallback] = None,
+    sha256: Optional[str] = None
+) -> Dict[str, Any]:
+    """
+    Upload an image to the server through the shared client.
+
+    See PxForgeClient.upload_image for arguments and return value.
+    """
+    return get_client().upload_image(image_path, progress=progress, sha256=sha256)
+
+
+def download_image(
+    url: str,
+    output_path: str,
+    progress: Optional[ProgressCallback] = None,
+    segments: int = 1
+) -> int:
+    """
+    Download an image from a URL through the shared client.
+
+    See PxForgeClient.download_image for arguments and return value.
+    """
+    return get_client().download_image(
+        url, output_path, progress=progress, segments=segments
+    )
@@ -0,0 +1,555 @@
+"""
+asyncio client for the pxForge API.
+
+Mirrors PxForgeClient and the processing commands for code that runs
+inside an event loop, such as an async web service embedding pxforge.
+All requests share one aiohttp connection pool and a semaphore bounds
+how many are in flight, so thousands of calls can be awaited together
+without a thread per request. Local bookkeeping (the result cache and
+the registry) runs on the loop's default executor so it never blocks
+the event loop.
+
+Requires aiohttp (pip install 'pxforge[async]').
+"""
+
+import asyncio
+import copy
+import os
+import time
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Any, Dict, Optional
+from urllib.parse import urlsplit
+from .api_client import (
+    DEFAULT_POOL_SIZE, DOWNLOAD_TIMEOUT, UPLOAD_TIMEOUT, ClientStats, RequestTiming
+)
+from .cache import CACHEABLE_ENDPOINTS, cache_key, get_result_cache
+from .config import get_base_url
+from .operations import build_params, get_operation, record_operation, request_fields
+from .scheduler import IDEMPOTENT_METHODS, AdaptiveLimiter, Scheduler
+from .singleflight import Lease
+from .tracing import get_tracer
+from .transfer import CHUNK_SIZE
+from .utilities import add_image, file_metadata
+
+
+def require_aiohttp():
+    """
+    Import aiohttp, with an actionable error if it is missing.
+
+    Returns:
+        module: The aiohttp module
+
+    Raises:
+        RuntimeError: If aiohttp is not installed
+    """
+    try:
+        import aiohttp
+    except ImportError:
+        raise RuntimeError(
+            "The async client requires aiohttp (pip install 'pxforge[async]')"
+        )
+    return aiohttp
+
+
+class AsyncPxForgeClient:
+    """
+    Pooled asyncio client for the pxForge API.
+
+    Identical processing requests awaited at the same time share one
+    server call, as do those made by other pxforge processes while the
+    result cache is on (see singleflight.py). Requests go through a
+    Scheduler, like those of PxForgeClient, for retries, an adaptive
+    concurrency window and the circuit breaker.
+
+    Use as an async context manager, or call close() when done:
+
+        async with AsyncPxForgeClient(max_concurrency=32) as client:
+            uploaded = await client.upload_image("photo.jpg")
+            result = await client.remove_bg(uploaded["image_id"])
+    """
+
+    def __init__(
+        self,
+        base_url: Optional[str] = None,
+        max_concurrency: int = DEFAULT_POOL_SIZE,
+        use_cache: bool = True,
+        record: bool = True,
+        scheduler: Optional[Scheduler] = None
+    ):
+        """
+        Args:
+            base_url: API base URL (defaults to the configured URL)
+            max_concurrency: Maximum requests in flight and pooled connections
+            use_cache: Consult the result cache (unless disabled globally)
+            record: Record uploads and results in the local registry
+            scheduler: Request scheduler (defaults to one with a
+                concurrency window of at most max_concurrency)
+        """
+        self._aiohttp = require_aiohttp()
+        self.base_url = base_url or get_base_url()
+        self.max_concurrency = max_concurrency
+        self.use_cache = use_cache
+        self.record = record
+        self.stats = ClientStats()
+        self.scheduler = scheduler or Scheduler(limiter=AdaptiveLimiter(
+            initial=min(4, max_concurrency), maximum=max_concurrency
+        ))
+        self._session = None
+        self._semaphore = None
+        # Futures of the processing requests in flight, by request key.
+        self._inflight: Dict[tuple, asyncio.Future] = {}
+
+    async def __aenter__(self):
+        self._get_session()
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    def _get_session(self):
+        # The session and semaphore bind to the running loop, so they
+        # are created on first use rather than in __init__.
+        if self._session is None or self._session.closed:
+            aiohttp = self._aiohttp
+            trace = aiohttp.TraceConfig()
+            trace.on_connection_create_start.append(self._on_connect_start)
+            trace.on_connection_create_end.append(self._on_connect_end)
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(
+                    limit=self.max_concurrency, keepalive_timeout=60
+                ),
+                trace_configs=[trace]
+            )
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self._session
+
+    @staticmethod
+    async def _on_connect_start(session, context, params):
+        context.trace_request_ctx.connect_start = time.perf_counter()
+
+    @staticmethod
+    async def _on_connect_end(session, context, params):
+        timing = context.trace_request_ctx
+        timing.connect += time.perf_counter() - timing.connect_start
+        timing.new_connections += 1
+
+    async def close(self):
+        """Close all pooled connections."""
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    async def _offload(self, func, *args):
+        return await asyncio.get_running_loop().run_in_executor(None, func, *args)
+
+    async def _schedule(self, send, method: str, key: str, size: int = 0):
+        """
+        Run one request's attempts through the scheduler.
+
+        Args:
+            size: Bytes in the request body
+        """
+        aiohttp = self._aiohttp
+        # A failed connection attempt never reached the server.
+        unsent = (aiohttp.ClientConnectorError,) + (
+            (aiohttp.ConnectionTimeoutError,) if hasattr(aiohttp, "ConnectionTimeoutError") else ()
+        )
+        return await self.scheduler.call_async(
+            send, errors=(aiohttp.ClientConnectionError, asyncio.TimeoutError),
+            unsent=unsent, key=f"{method} {key}", idempotent=method in IDEMPOTENT_METHODS,
+            size=size
+        )
+
+    async def _send(self, endpoint: str, method: str, url: str, timeout: float, form=None,
+                    size: int = 0, **kwargs):
+        """
+        Send a request, record its timing and return the parsed JSON body.
+
+        Args:
+            form: Builds the request's form data, afresh for each attempt
+            size: Bytes in the request body
+        """
+        aiohttp = self._aiohttp
+        session = self._get_session()
+        tracer = get_tracer()
+        timing = headers_at = attempt_start = None
+
+        async def _attempt():
+            nonlocal timing, headers_at, attempt_start
+            timing = _new_timing()
+            if form is not None:
+                kwargs["data"] = form()
+            async with self._semaphore:
+                attempt_start = time.perf_counter()
+                async with session.request(
+                    method, url, timeout=aiohttp.ClientTimeout(total=timeout),
+                    trace_request_ctx=timing, **kwargs
+                ) as response:
+                    headers_at = time.perf_counter()
+                    await response.read()
+            if tracer.active:
+                # aiohttp times connection setup (DNS, TCP and TLS) as one.
+                tracer.add("connect", timing.connect)
+                tracer.add("server", max(headers_at - attempt_start - timing.connect, 0.0))
+                tracer.add("receive", time.perf_counter() - headers_at)
+            return response
+
+        start = time.perf_counter()
+        with tracer.span(f"http {method} {endpoint}"):
+            response = await self._schedule(_attempt, method, endpoint, size)
+        response.raise_for_status()
+        result = await response.json(content_type=None)
+        self.stats.add(RequestTiming(
+            endpoint, timing.connect, max(headers_at - attempt_start - timing.connect, 0.0),
+            time.perf_counter() - start, timing.new_connections
+        ))
+        return result
+
+    async def request(
+        self,
+        endpoint: str,
+        method: str = "POST",
+        files: Optional[Dict[str, str]] = None,
+        data: Optional[Dict[str, Any]] = None,
+        timeout: float = 300,
+        use_form_data: bool = False,
+        headers: Optional[Dict[str, str]] = None
+    ) -> Dict[str, Any]:
+        """
+        Make an HTTP request to the API.
+
+        Args:
+            endpoint: API endpoint path
+            method: HTTP method (GET, POST, etc.)
+            files: File paths to upload, keyed by form field
+            data: JSON data or form data to send
+            timeout: Request timeout in seconds
+            use_form_data: Force form data encoding
+            headers: Extra request headers
+
+        Returns:
+            dict: API response data
+
+        Raises:
+            aiohttp.ClientError: If the request fails
+        """
+        if method != "POST" or endpoint not in CACHEABLE_ENDPOINTS:
+            return await self._send_request(
+                endpoint, method, files, data, timeout, use_form_data, headers
+            )
+
+        start = time.perf_counter()
+        key = await self._offload(_file_cache_key, self.base_url, endpoint, data, files)
+        cache = get_result_cache() if self.use_cache else None
+        if cache is not None:
+            cached = await self._offload(cache.get, key)
+            if cached is not None:
+                self.stats.add(RequestTiming(
+                    f"{endpoint} (cached)", 0.0, 0.0, time.perf_counter() - start, 0
+                ))
+                return cached
+
+        flight = (key, tuple(sorted((headers or {}).items())))
+        while flight in self._inflight:
+            future = self._inflight[flight]
+            try:
+                result = await asyncio.shield(future)
+            except asyncio.CancelledError:
+                if future.cancelled():
+                    continue  # The task running it was cancelled; take over.
+                raise
+            self.stats.add(RequestTiming(
+                f"{endpoint} (shared)", 0.0, 0.0, time.perf_counter() - start, 0
+            ))
+            return copy.deepcopy(result)
+
+        future = self._inflight[flight] = asyncio.get_running_loop().create_future()
+        try:
+            result = await self._lead(
+                endpoint, method, files, data, timeout, use_form_data, headers, key, cache,
+                start
+            )
+        except Exception as e:
+            future.set_exception(e)
+            future.exception()  # Retrieved, even if nobody else was waiting.
+            raise
+        except BaseException:
+            future.cancel()
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            del self._inflight[flight]
+
+    async def _lead(
+        self, endpoint, method, files, data, timeout, use_form_data, headers, key, cache, start
+    ):
+        # Other processes can only share the result through the cache.
+        if cache is None or headers:
+            return await self._send_request(
+                endpoint, method, files, data, timeout, use_form_data, headers, key, cache
+            )
+        lease = Lease(key, timeout)
+        acquiring = asyncio.ensure_future(self._offload(lease.acquire))
+        try:
+            waited = await asyncio.shield(acquiring)
+        except asyncio.CancelledError:
+            # The executor thread still takes the lease; give it back then.
+            acquiring.add_done_callback(lambda _: lease.release())
+            raise
+        try:
+            cached = await self._offload(cache.get, key) if waited else None
+            if cached is not None:
+                self.stats.add(RequestTiming(
+                    f"{endpoint} (shared)", 0.0, 0.0, time.perf_counter() - start, 0
+                ))
+                return cached
+            return await self._send_request(
+                endpoint, method, files, data, timeout, use_form_data, headers, key, cache
+            )
+        finally:
+            lease.release()
+
+    async def _send_request(
+        self, endpoint, method, files, data, timeout, use_form_data, headers,
+        key=None, cache=None
+    ):
+        url = f"{self.base_url}{endpoint}"
+        if files or use_form_data:
+            handles = []
+
+            def _form():
+                # aiohttp closes the files once sent, so each attempt
+                # opens them again.
+                form = self._aiohttp.FormData()
+                for name, value in (data or {}).items():
+                    form.add_field(name, str(value))
+                for field, path in (files or {}).items():
+                    handle = open(path, "rb")
+                    handles.append(handle)
+                    form.add_field(field, handle, filename=Path(path).name)
+                return form
+
+            try:
+                result = await self._send(
+                    endpoint, method, url, timeout, form=_form, headers=headers,
+                    size=sum(os.path.getsize(path) for path in (files or {}).values())
+                )
+            finally:
+                for handle in handles:
+                    handle.close()
+        else:
+            result = await self._send(endpoint, method, url, timeout, json=data, headers=headers)
+
+        if cache is not None and result.get("success"):
+            await self._offload(cache.put, key, endpoint, result)
+        return result
+
+    async def upload_image(self, image_path: str) -> Dict[str, Any]:
+        """
+        Upload an image to the server, streaming it from disk.
+
+        Args:
+            image_path: Path to the image file
+
+        Returns:
+            dict: Response containing image ID and URL
+
+        Raises:
+            FileNotFoundError: If image file doesn't exist
+            aiohttp.ClientError: If upload fails
+        """
+        path = Path(image_path)
+        if not path.exists():
+            raise FileNotFoundError(f"Image file not found: {image_path}")
+
+        result = await self.request("/upload", files={"image": str(path)}, timeout=UPLOAD_TIMEOUT)
+        if self.record and result.get("image_id"):
+            metadata = await self._offload(file_metadata, path)
+            await self._offload(
+                lambda: add_image(result["image_id"], path=str(path),
+                                  url=result.get("image_url"), metadata=metadata,
+                                  base_url=self.base_url)
+            )
+        return result
+
+    async def fetch(self, url: str, timeout: float = DOWNLOAD_TIMEOUT) -> bytes:
+        """
+        Fetch the content at a URL over the pooled session.
+
+        Args:
+            url: URL to fetch
+            timeout: Request timeout in seconds
+
+        Returns:
+            bytes: Response body
+        """
+        session = self._get_session()
+        body = None
+
+        async def _attempt():
+            nonlocal body
+            async with self._semaphore:
+                async with session.get(
+                    url, timeout=self._aiohttp.ClientTimeout(total=timeout),
+                    trace_request_ctx=_new_timing()
+                ) as response:
+                    body = await response.read()
+            return response
+
+        response = await self._schedule(_attempt, "GET", _url_key(url))
+        response.raise_for_status()
+        return body
+
+    async def download_image(self, url: str, output_path: str) -> int:
+        """
+        Download an image from a URL, streaming it to disk.
+
+        The body is written to "<output_path>.part" and renamed into
+        place once complete.
+
+        Args:
+            url: Image URL to download from
+            output_path: Path to save the downloaded image
+
+        Returns:
+            int: Size of the downloaded file in bytes
+        """
+        output = Path(output_path)
+        output.parent.mkdir(parents=True, exist_ok=True)
+        part = output.with_name(output.name + ".part")
+
+        session = self._get_session()
+        size = 0
+
+        async def _attempt():
+            # The body is streamed below; only the headers are read here.
+            return await session.get(
+                url, timeout=self._aiohttp.ClientTimeout(total=None, sock_read=DOWNLOAD_TIMEOUT),
+                trace_request_ctx=_new_timing()
+            )
+
+        async with self._semaphore:
+            async with await self._schedule(_attempt, "GET", _url_key(url)) as response:
+                response.raise_for_status()
+                with open(part, "wb") as f:
+                    async for chunk in response.content.iter_chunked(CHUNK_SIZE):
+                        await self._offload(f.write, chunk)
+                        size += len(chunk)
+        os.replace(part, output)
+        return size
+
+    async def run_operation(
+        self,
+        name: str,
+        image_id: str,
+        params: Optional[Dict[str, Any]] = None
+    ) -> Dict[str, Any]:
+        """
+        Run an operation on an image.
+
+        Args:
+            name: Operation name (see operations.OPERATIONS)
+            image_id: ID of the image to process
+            params: Operation parameters keyed by name or short alias
+
+        Returns:
+            dict: API response data
+
+        Raises:
+            ValueError: If the operation or parameters are invalid
+            aiohttp.ClientError: If the request fails
+        """
+        operation = get_operation(name)
+        params = build_params(operation, params or {})
+        data, file_paths = request_fields(operation, image_id, params)
+        result = await self.request(
+            operation.endpoint,
+            files=file_paths or None,
+            data=data,
+            timeout=operation.timeout,
+            use_form_data=operation.use_form_data
+        )
+        if self.record:
+            await self._offload(record_operation, operation, image_id, params, result)
+        return result
+
+    async def resize(self, image_id: str, width: int, height: int) -> Dict[str, Any]:
+        """Resize an image to the given dimensions."""
+        return await self.run_operation("resize", image_id, {"width": width, "height": height})
+
+    async def aspect_ratio(self, image_id: str, ratio: str) -> Dict[str, Any]:
+        """Crop an image to an aspect ratio such as "16:9"."""
+        return await self.run_operation("aspect-ratio", image_id, {"ratio": ratio})
+
+    async def rotate(self, image_id: str, angle: int) -> Dict[str, Any]:
+        """Rotate an image by an angle in degrees."""
+        return await self.run_operation("rotate", image_id, {"angle": angle})
+
+    async def to_bw(self, image_id: str) -> Dict[str, Any]:
+        """Convert an image to black and white."""
+        return await self.run_operation("to-bw", image_id)
+
+    async def to_rgb(self, image_id: str) -> Dict[str, Any]:
+        """Convert an image to RGB."""
+        return await self.run_operation("to-rgb", image_id)
+
+    async def contrast(self, image_id: str) -> Dict[str, Any]:
+        """Enhance an image's contrast."""
+        return await self.run_operation("contrast", image_id)
+
+    async def brightness(self, image_id: str) -> Dict[str, Any]:
+        """Enhance an image's brightness."""
+        return await self.run_operation("brightness", image_id)
+
+    async def remove_bg(self, image_id: str) -> Dict[str, Any]:
+        """Remove an image's background."""
+        return await self.run_operation("remove-bg", image_id)
+
+    async def remove_object(
+        self, image_id: str, x: int, y: int, width: int = 100, height: int = 100
+    ) -> Dict[str, Any]:
+        """Remove the object in a bounding box centred on (x, y)."""
+        return await self.run_operation(
+            "remove-object", image_id, {"x": x, "y": y, "width": width, "height": height}
+        )
+
+    async def remove_noise(self, image_id: str) -> Dict[str, Any]:
+        """Remove noise and enhance an image."""
+        return await self.run_operation("remove-noise", image_id)
+
+    async def replace_bg(self, image_id: str, bg_image_path: str) -> Dict[str, Any]:
+        """Replace an image's background with another image."""
+        return await self.run_operation("replace-bg", image_id, {"bg": bg_image_path})
+
+    async def prompt_edit(self, image_id: str, prompt: str) -> Dict[str, Any]:
+        """Edit an image following a text prompt."""
+        return await self.run_operation("prompt-edit", image_id, {"prompt": prompt})
+
+    async def watermark(
+        self, image_id: str, text: str, position: str = "bottom-right"
+    ) -> Dict[str, Any]:
+        """Add a text watermark to an image."""
+        return await self.run_operation(
+            "watermark", image_id, {"text": text, "position": position}
+        )
+
+
+def _url_key(url):
+    # Latencies are compared per endpoint, not per image URL.
+    return "/".join(urlsplit(url).path.split("/")[:2])
+
+
+def _new_timing():
+    return SimpleNamespace(connect=0.0, connect_start=0.0, new_connections=0)
+
+
+def _file_cache_key(base_url, endpoint, data, files):
+    handles = {field: open(path, "rb") for field, path in (files or {}).items()}
+    try:
+        return cache_key(base_url, endpoint, data, handles)
+    finally:
+        for handle in handles.values():
+            handle.close()
@@ -0,0 +1,434 @@
+"""
+Local cache of operation results.
+
+Processing endpoints are deterministic for a given image and
+parameters, so their responses are cached on disk keyed by server,
+endpoint and canonicalized request parameters. Entries expire after a TTL and
+the cache is bounded with least-recently-used eviction. Downloaded
+result bytes can optionally be cached as well, keyed by URL.
+"""
+
+import os
+import json
+import time
+import hashlib
+import shutil
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Any, Dict, Optional
+from .config import get_config_dir
+
+
+CACHEABLE_ENDPOINTS = (
+    "/resize", "/aspect-ratio", "/rotate", "/toBW", "/toRGB", "/contrast",
+    "/brightness", "/remove-background", "/remove-object", "/remove-noise",
+    "/replace-bg", "/prompt-edit", "/watermark",
+)
+
+DEFAULT_TTL = 24 * 60 * 60
+DEFAULT_MAX_ENTRIES = 10000
+DEFAULT_MAX_BLOB_BYTES = 512 * 1024 * 1024
+
+LOCK_TIMEOUT = 60
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def _default_settings():
+    return {
+        "enabled": not os.environ.get("PXFORGE_NO_CACHE"),
+        "store_blobs": bool(os.environ.get("PXFORGE_CACHE_BLOBS")),
+    }
+
+
+_settings = _default_settings()
+_shared = None
+_shared_lock = threading.Lock()
+
+
+def set_cache_enabled(enabled: bool):
+    """
+    Enable or disable the result cache for this process.
+    """
+    _settings["enabled"] = enabled
+
+
+def set_blob_caching(enabled: bool):
+    """
+    Enable or disable caching of downloaded result bytes.
+    """
+    _settings["store_blobs"] = enabled
+
+
+def reset_cache_settings():
+    """
+    Restore the settings taken from the environment at startup.
+
+    Used between commands run by one resident process, so --no-cache
+    on one command does not carry over to the next.
+    """
+    _settings.update(_default_settings())
+
+
+def get_result_cache() -> Optional["ResultCache"]:
+    """
+    Get the process-wide result cache.
+
+    Returns:
+        ResultCache: Shared cache, or None if caching is disabled
+    """
+    global _shared
+    if not _settings["enabled"]:
+        return None
+    with _shared_lock:
+        if _shared is None:
+            _shared = ResultCache()
+        return _shared
+
+
+def _hash_file_field(value, digest):
+    """
+    Feed a requests-style file field into a hash without consuming it.
+    """
+    if isinstance(value, tuple):
+        value = value[1]
+    if isinstance(value, (bytes, bytearray)):
+        digest.update(value)
+        return
+    position = value.tell()
+    for chunk in iter(lambda: value.read(HASH_CHUNK_SIZE), b""):
+        digest.update(chunk)
+    value.seek(position)
+
+
+def cache_key(
+    base_url: str,
+    endpoint: str,
+    data: Optional[Dict[str, Any]],
+    files: Optional[Dict] = None
+) -> str:
+    """
+    Build the cache key for a request.
+
+    Image IDs belong to one server, so the server is part of the key.
+
+    Args:
+        base_url: API server the request goes to
+        endpoint: API endpoint path
+        data: Request parameters
+        files: Uploaded files; their content is part of the key
+
+    Returns:
+        str: Hex digest identifying the request
+    """
+    digest = hashlib.sha256()
+    digest.update(base_url.rstrip("/").encode() + b"\0")
+    digest.update(endpoint.encode())
+    digest.update(json.dumps(data or {}, sort_keys=True, separators=(",", ":")).encode())
+    for field in sorted(files or {}):
+        digest.update(field.encode())
+        _hash_file_field(files[field], digest)
+    return digest.hexdigest()
+
+
+class ResultCache:
+    """
+    SQLite-backed response cache with TTL and LRU bounds.
+    """
+
+    def __init__(
+        self,
+        directory: Optional[Path] = None,
+        ttl: float = DEFAULT_TTL,
+        max_entries: int = DEFAULT_MAX_ENTRIES,
+        max_blob_bytes: int = DEFAULT_MAX_BLOB_BYTES
+    ):
+        """
+        Args:
+            directory: Cache directory (defaults to ~/.pxforge/cache)
+            ttl: Seconds an entry stays valid
+            max_entries: Maximum number of cached responses
+            max_blob_bytes: Maximum total size of cached result bytes
+        """
+        self.directory = Path(directory) if directory else get_config_dir() / "cache"
+        self.blob_dir = self.directory / "blobs"
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_blob_bytes = max_blob_bytes
+        self._local = threading.local()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            return conn
+
+        self.blob_dir.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(str(self.directory / "cache.db"), timeout=LOCK_TIMEOUT)
+        conn.execute("PRAGMA journal_mode = WAL")
+        conn.execute("PRAGMA synchronous = NORMAL")
+        with conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS responses (
+                    key TEXT PRIMARY KEY,
+                    endpoint TEXT NOT NULL,
+                    response TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    accessed_at REAL NOT NULL
+                )
+            """)
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS blobs (
+                    url TEXT PRIMARY KEY,
+                    file TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    created_at REAL NOT NULL,
+                    accessed_at REAL NOT NULL
+                )
+            """)
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS stats (
+                    name TEXT PRIMARY KEY,
+                    value INTEGER NOT NULL
+                )
+            """)
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed_at)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS blobs_accessed ON blobs (accessed_at)")
+        self._local.conn = conn
+        return conn
+
+    def _count(self, conn, name):
+        conn.execute(
+            "INSERT INTO stats (name, value) VALUES (?, 1) "
+            "ON CONFLICT (name) DO UPDATE SET value = value + 1",
+            (name,)
+        )
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """
+        Look up a cached response.
+
+        Args:
+            key: Key from cache_key
+
+        Returns:
+            dict: Cached response, or None on a miss or expired entry
+        """
+        conn = self._connect()
+        now = time.time()
+        with conn:
+            row = conn.execute(
+                "SELECT response, created_at FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None or row[1] + self.ttl < now:
+                if row is not None:
+                    conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self._count(conn, "misses")
+                return None
+            conn.execute("UPDATE responses SET accessed_at = ? WHERE key = ?", (now, key))
+            self._count(conn, "hits")
+        return json.loads(row[0])
+
+    def put(self, key: str, endpoint: str, response: Dict[str, Any]):
+        """
+        Store a response, evicting the least recently used entries if full.
+
+        Args:
+            key: Key from cache_key
+            endpoint: API endpoint path
+            response: Response data to cache
+        """
+        conn = self._connect()
+        now = time.time()
+        with conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO responses "
+                "(key, endpoint, response, created_at, accessed_at) VALUES (?, ?, ?, ?, ?)",
+                (key, endpoint, json.dumps(response), now, now)
+            )
+            self._evict_responses(conn, self.max_entries)
+
+    def _find_blob(self, conn, url):
+        row = conn.execute(
+            "SELECT file, created_at FROM blobs WHERE url = ?", (url,)
+        ).fetchone()
+        if row is None or row[1] + self.ttl < time.time():
+            return None
+        path = self.blob_dir / row[0]
+        if not path.exists():
+            with conn:
+                conn.execute("DELETE FROM blobs WHERE url = ?", (url,))
+            return None
+        with conn:
+            conn.execute("UPDATE blobs SET accessed_at = ? WHERE url = ?", (time.time(), url))
+        return path
+
+    def get_blob(self, url: str) -> Optional[bytes]:
+        """
+        Get cached result bytes for a URL.
+
+        Args:
+            url: Result URL
+
+        Returns:
+            bytes: Cached content, or None if not cached or expired
+        """
+        path = self.get_blob_file(url)
+        try:
+            return path.read_bytes() if path else None
+        except OSError:
+            return None
+
+    def get_blob_file(self, url: str) -> Optional[Path]:
+        """
+        Get the file holding cached result bytes for a URL.
+
+        Args:
+            url: Result URL
+
+        Returns:
+            Path: Cached file, or None if not cached or expired
+        """
+        return self._find_blob(self._connect(), url)
+
+    def put_blob(self, url: str, content: bytes):
+        """
+        Cache downloaded result bytes if blob caching is enabled.
+
+        Args:
+            url: Result URL
+            content: Downloaded bytes
+        """
+        if not _settings["store_blobs"] or len(content) > self.max_blob_bytes:
+            return
+        temp = self._temp_blob(url)
+        temp.write_bytes(content)
+        self._store_blob(url, temp, len(content))
+
+    def put_blob_file(self, url: str, path: Path):
+        """
+        Cache a downloaded result file if blob caching is enabled.
+
+        Args:
+            url: Result URL
+            path: Downloaded file; it is copied into the cache
+        """
+        size = Path(path).stat().st_size
+        if not _settings["store_blobs"] or size > self.max_blob_bytes:
+            return
+        temp = self._temp_blob(url)
+        shutil.copyfile(path, temp)
+        self._store_blob(url, temp, size)
+
+    def _temp_blob(self, url):
+        self._connect()
+        name = hashlib.sha256(url.encode()).hexdigest()
+        return self.blob_dir / f".{name}.{os.getpid()}.{threading.get_ident()}"
+
+    def _store_blob(self, url, temp, size):
+        conn = self._connect()
+        name = hashlib.sha256(url.encode()).hexdigest()
+        os.replace(temp, self.blob_dir / name)
+
+        now = time.time()
+        with conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO blobs (url, file, size, created_at, accessed_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (url, name, size, now, now)
+            )
+            self._evict_blobs(conn, self.max_blob_bytes)
+
+    def _evict_responses(self, conn, max_entries):
+        conn.execute(
+            "DELETE FROM responses WHERE key IN ("
+            "SELECT key FROM responses ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+            (max_entries,)
+        )
+
+    def _evict_blobs(self, conn, max_bytes):
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM blobs").fetchone()[0]
+        if total <= max_bytes:
+            return
+        for url, name, size in conn.execute(
+            "SELECT url, file, size FROM blobs ORDER BY accessed_at"
+        ).fetchall():
+            if total <= max_bytes:
+                break
+            conn.execute("DELETE FROM blobs WHERE url = ?", (url,))
+            (self.blob_dir / name).unlink(missing_ok=True)
+            total -= size
+
+    def prune(
+        self,
+        max_age: Optional[float] = None,
+        max_entries: Optional[int] = None,
+        max_blob_bytes: Optional[int] = None
+    ) -> Dict[str, int]:
+        """
+        Drop expired entries and enforce size bounds.
+
+        Args:
+            max_age: Drop entries older than this many seconds (default: TTL)
+            max_entries: Keep at most this many responses
+            max_blob_bytes: Keep at most this many bytes of blobs
+
+        Returns:
+            dict: Number of responses and blobs removed
+        """
+        conn = self._connect()
+        cutoff = time.time() - (self.ttl if max_age is None else max_age)
+        with conn:
+            before = self.stats()
+            conn.execute("DELETE FROM responses WHERE created_at < ?", (cutoff,))
+            for (name,) in conn.execute(
+                "SELECT file FROM blobs WHERE created_at < ?", (cutoff,)
+            ).fetchall():
+                (self.blob_dir / name).unlink(missing_ok=True)
+            conn.execute("DELETE FROM blobs WHERE created_at < ?", (cutoff,))
+            self._evict_responses(conn, self.max_entries if max_entries is None else max_entries)
+            self._evict_blobs(
+                conn, self.max_blob_bytes if max_blob_bytes is None else max_blob_bytes
+            )
+            after = self.stats()
+        return {
+            "responses": before["responses"] - after["responses"],
+            "blobs": before["blobs"] - after["blobs"],
+        }
+
+    def clear(self):
+        """
+        Remove every cached response and blob, keeping hit/miss statistics.
+        """
+        conn = self._connect()
+        with conn:
+            for (name,) in conn.execute("SELECT file FROM blobs").fetchall():
+                (self.blob_dir / name).unlink(missing_ok=True)
+            conn.execute("DELETE FROM blobs")
+            conn.execute("DELETE FROM responses")
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Summarize the cache contents and hit rate.
+
+        Returns:
+            dict: responses, blobs, blob_bytes, hits, misses and oldest
+            (creation time of the oldest response, or None)
+        """
+        conn = self._connect()
+        responses, oldest = conn.execute(
+            "SELECT COUNT(*), MIN(created_at) FROM responses"
+        ).fetchone()
+        blobs, blob_bytes = conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM blobs"
+        ).fetchone()
+        counters = dict(conn.execute("SELECT name, value FROM stats").fetchall())
+        return {
+            "responses": responses,
+            "blobs": blobs,
+            "blob_bytes": blob_bytes,
+            "hits": counters.get("hits", 0),
+            "misses": counters.get("misses", 0),
+            "oldest": oldest,
+        }
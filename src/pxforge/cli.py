@@ -5,24 +5,76 @@ A command-line interface for advanced image processing operations
 including resizing, color adjustments, AI-powered cleanup, and editing.
 """
 
+import importlib
+import time
 import click
-from .commands import basic, resize, color, cleanup, editing
+from .tracing import Profiler, breakdown, get_tracer
+
+
+# Commands by category: (name, "module:function" in pxforge.commands,
+# short help). Help output is built from this table, so listing the
+# commands does not import them; a command's module (and with it
+# requests) is only imported when that command is invoked. The short
+# help must match the first sentence of the command's docstring.
+COMMANDS = {
+    "Basic Commands": [
+        ("upload", "basic:upload", "Upload an image to the server."),
+        ("list", "basic:list_images", "List all uploaded image IDs from local registry."),
+        ("info", "basic:info", "Show metadata and operation history of an image."),
+        ("delete", "basic:delete", "Delete an image ID from local registry."),
+        ("download", "basic:download", "Download images from URLs."),
+        ("cache", "cache:cache", "Inspect and prune the local result cache."),
+        ("daemon", "daemon:daemon", "Keep a resident process that runs pxforge commands."),
+        ("shell", "daemon:shell", "Run pxforge commands interactively in one process."),
+    ],
+    "Resize & Transform": [
+        ("resize", "resize:resize", "Resize an image to specified dimensions."),
+        ("aspect-ratio", "resize:aspect_ratio",
+         "Crop image to maintain specified aspect ratio."),
+        ("rotate", "resize:rotate", "Rotate an image by specified angle."),
+    ],
+    "Color Adjustments": [
+        ("to-bw", "color:to_bw", "Convert an image to black and white (grayscale)."),
+        ("to-rgb", "color:to_rgb", "Convert an image to RGB color space."),
+        ("contrast", "color:contrast", "Adjust image contrast."),
+        ("brightness", "color:brightness", "Adjust image brightness."),
+    ],
+    "AI-Powered Cleanup": [
+        ("remove-bg", "cleanup:remove_bg", "Remove background from an image using AI."),
+        ("remove-object", "cleanup:remove_object",
+         "Remove an object from an image using inpainting."),
+        ("remove-noise", "cleanup:remove_noise",
+         "Remove noise and enhance image quality using AI upscaling."),
+    ],
+    "Advanced Editing": [
+        ("replace-bg", "editing:replace_bg",
+         "Replace image background with a new background."),
+        ("prompt-edit", "editing:prompt_edit", "Edit image using AI based on a text prompt."),
+        ("watermark", "editing:watermark", "Add a text watermark to an image."),
+    ],
+    "Batch & Pipelines": [
+        ("batch", "batch:batch", "Run one operation over many images concurrently."),
+        ("pipeline", "pipeline:pipeline", "Apply several operations to an image in one run."),
+        ("submit", "jobs:submit", "Submit an operation as a background job."),
+        ("jobs", "jobs:jobs", "Check on, wait for and fetch submitted jobs."),
+        ("watch", "watch:watch", "Upload and process images as they arrive in a directory."),
+    ],
+}
 
 
 class OrderedGroup(click.Group):
     """
     Custom Click Group that displays commands in organized categories.
+
+    Commands can be registered eagerly with add_to_category, or lazily
+    with add_lazy_command, in which case they are imported on first use.
     """
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
-        self.command_categories = {
-            "Basic Commands": [],
-            "Resize & Transform": [],
-            "Color Adjustments": [],
-            "AI-Powered Cleanup": [],
-            "Advanced Editing": []
-        }
+        self.command_categories = {category: [] for category in COMMANDS}
+        # Maps a lazily registered command name to (import path, short help).
+        self.lazy_commands = {}
 
     def add_to_category(self, category, cmd, name=None):
         """
@@ -38,6 +90,30 @@ class OrderedGroup(click.Group):
         if category in self.command_categories:
             self.command_categories[category].append(cmd_name)
 
+    def add_lazy_command(self, category, name, import_path, short_help):
+        """
+        Register a command that is imported only when it is used.
+
+        Args:
+            category: Category name
+            name: Command name
+            import_path: "module:function" within pxforge.commands
+            short_help: Text shown next to the command in help output
+        """
+        self.lazy_commands[name] = (import_path, short_help)
+        if category in self.command_categories:
+            self.command_categories[category].append(name)
+
+    def list_commands(self, ctx):
+        return sorted({*self.commands, *self.lazy_commands})
+
+    def get_command(self, ctx, cmd_name):
+        if cmd_name not in self.commands and cmd_name in self.lazy_commands:
+            module, function = self.lazy_commands[cmd_name][0].split(":")
+            module = importlib.import_module(f".commands.{module}", __package__)
+            self.add_command(getattr(module, function), name=cmd_name)
+        return self.commands.get(cmd_name)
+
     def format_commands(self, ctx, formatter):
         """
         Format commands grouped by category.
@@ -50,18 +126,88 @@ class OrderedGroup(click.Group):
                 rows = []
                 for cmd_name in sorted(commands):
                     cmd = self.commands.get(cmd_name)
-                    if cmd is None:
-                        continue
-                    help_text = cmd.get_short_help_str(limit=60)
-                    rows.append((cmd_name, help_text))
+                    if cmd is not None:
+                        rows.append((cmd_name, cmd.get_short_help_str(limit=60)))
+                    elif cmd_name in self.lazy_commands:
+                        rows.append((cmd_name, self.lazy_commands[cmd_name][1]))
 
                 if rows:
                     formatter.write_dl(rows)
 
 
+def report_timings():
+    """
+    Print connection setup vs server time for the API calls made.
+    """
+    from .api_client import get_client
+
+    # A command that made no API calls never created a client.
+    client = get_client(create=False)
+    if client is None or not client.stats.timings:
+        return
+    stats = client.stats
+
+    click.echo("\nTimings:", err=True)
+    for timing in stats.timings:
+        click.echo(
+            f"  {timing.endpoint}: connect {timing.connect * 1000:.1f} ms, "
+            f"server {timing.server * 1000:.1f} ms, "
+            f"total {timing.total * 1000:.1f} ms",
+            err=True
+        )
+
+    summary = stats.summary()
+    click.echo(
+        f"  {summary['requests']} request(s) over {summary['connections']} "
+        f"new connection(s): connect {summary['connect'] * 1000:.1f} ms, "
+        f"server {summary['server'] * 1000:.1f} ms, "
+        f"total {summary['total'] * 1000:.1f} ms",
+        err=True
+    )
+    scheduled = client.scheduler.summary()
+    if scheduled["retries"]:
+        click.echo(
+            f"  {scheduled['retries']} retried attempt(s), "
+            f"{scheduled['throttled']} throttled by the server",
+            err=True
+        )
+
+
+def report_trace():
+    """
+    Print where the command's time went, span by span.
+    """
+    tracer = get_tracer()
+    wall = time.perf_counter() - tracer.started
+    spans = tracer.stop_recording()
+    click.echo("\nTrace:", err=True)
+    for line in breakdown(spans, wall):
+        click.echo(f"  {line}", err=True)
+
+
+def report_profile(profiler):
+    """
+    Write the command's CPU profile and memory snapshot and summarize them.
+    """
+    click.echo("\nProfile:", err=True)
+    for line in profiler.stop():
+        click.echo(f"  {line}", err=True)
+
+
 @click.command(cls=OrderedGroup)
 @click.version_option(version="0.1.0")
-def cli():
+@click.option("--timings", is_flag=True,
+              help="Report connection setup and server time for API calls")
+@click.option("--trace", is_flag=True,
+              help="Report time per phase: HTTP connect/send/server/receive, registry")
+@click.option("--profile", is_flag=True,
+              help="Write a cProfile and tracemalloc snapshot of the command")
+@click.option("--no-cache", is_flag=True,
+              help="Do not use or update the local result cache")
+@click.option("--cache-bytes", is_flag=True,
+              help="Also cache downloaded result images")
+@click.pass_context
+def cli(ctx, timings, trace, profile, no_cache, cache_bytes):
     """
     pxForge - AI-powered image editing CLI tool.
 
@@ -73,35 +219,34 @@ def cli():
 
     Use 'pxforge COMMAND --help' for more information on a command.
     """
-    pass
-
-
-# Register basic commands
-cli.add_to_category("Basic Commands", basic.upload)
-cli.add_to_category("Basic Commands", basic.list_images, name="list")
-cli.add_to_category("Basic Commands", basic.delete)
-cli.add_to_category("Basic Commands", basic.download)
-
-# Register resize commands
-cli.add_to_category("Resize & Transform", resize.resize)
-cli.add_to_category("Resize & Transform", resize.aspect_ratio)
-cli.add_to_category("Resize & Transform", resize.rotate)
-
-# Register color adjustment commands
-cli.add_to_category("Color Adjustments", color.to_bw)
-cli.add_to_category("Color Adjustments", color.to_rgb)
-cli.add_to_category("Color Adjustments", color.contrast)
-cli.add_to_category("Color Adjustments", color.brightness)
-
-# Register cleanup commands
-cli.add_to_category("AI-Powered Cleanup", cleanup.remove_bg)
-cli.add_to_category("AI-Powered Cleanup", cleanup.remove_object)
-cli.add_to_category("AI-Powered Cleanup", cleanup.remove_noise)
-
-# Register editing commands
-cli.add_to_category("Advanced Editing", editing.replace_bg)
-cli.add_to_category("Advanced Editing", editing.prompt_edit)
-cli.add_to_category("Advanced Editing", editing.watermark)
+    if no_cache or cache_bytes:
+        # The cache module (and sqlite3 with it) is only needed here.
+        from .cache import set_blob_caching, set_cache_enabled
+
+        if no_cache:
+            set_cache_enabled(False)
+        if cache_bytes:
+            set_blob_caching(True)
+    if timings:
+        ctx.call_on_close(report_timings)
+    if trace:
+        get_tracer().start_recording()
+        ctx.call_on_close(report_trace)
+    if profile:
+        # Files are named after the command and written to the working directory.
+        profiler = Profiler(
+            f"pxforge-{ctx.invoked_subcommand or 'cli'}-{time.strftime('%Y%m%d-%H%M%S')}"
+        )
+        profiler.start()
+        ctx.call_on_close(lambda: report_profile(profiler))
+    if ctx.invoked_subcommand:
+        # Closed before the reports above run, which happens in reverse order.
+        ctx.with_resource(get_tracer().span(f"command {ctx.invoked_subcommand}"))
+
+
+for category, commands in COMMANDS.items():
+    for name, import_path, short_help in commands:
+        cli.add_lazy_command(category, name, import_path, short_help)
 
 
 if __name__ == "__main__":
@@ -1,40 +1,148 @@
 """
 Basic commands for pxForge CLI.
 
-Includes upload, list, delete, and download functionality.
+Includes upload, list, info, delete, and download functionality.
 """
 
+import os
+import time
 import click
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
-from ..api_client import upload_image, download_image, make_request
-from ..utilities import load, save, validate_image_id
+from urllib.parse import urlparse
+from ..api_client import (
+    DEFAULT_POOL_SIZE, PxForgeClient, download_image, get_client, make_request, set_client,
+    upload_image
+)
+from ..config import get_config_dir
+from ..preprocess import DEFAULT_QUALITY, UPLOAD_FORMATS, prepare_image
+from ..utilities import (
+    SORT_COLUMNS, add_image, file_metadata, find_image_by_hash, get_image,
+    get_lineage, increment_counter, query_images, remove_image
+)
+from .common import TransferProgress, format_size, format_time
+
+
+def upload_file(image_path, force=False, max_edge=None, fmt=None, quality=DEFAULT_QUALITY):
+    """
+    Upload a file, optionally shrinking it first, and record it.
+
+    Reports progress and savings as it goes. With max_edge or fmt, the
+    image is downscaled and/or transcoded before upload; the prepared
+    file is kept in the source cache and recorded as the image's source,
+    so local operations see the same pixels as the server.
+
+    Args:
+        image_path (str): Image file to upload
+        force (bool): Upload even if the same content was uploaded before
+        max_edge (int): Downscale so the longer edge is at most this
+        fmt (str): Transcode to "webp" or "jpeg"
+        quality (int): Encoder quality for fmt
+
+    Returns:
+        tuple: (image ID, image URL)
+    """
+    prepared = None
+    source = image_path
+    if max_edge or fmt:
+        prepared = prepare_image(image_path, max_edge=max_edge, fmt=fmt, quality=quality)
+        if prepared.changed:
+            source = str(prepared.path)
+            width, height = prepared.original_dimensions
+            new_width, new_height = prepared.dimensions
+            click.echo(
+                f"Prepared {width}x{height} -> {new_width}x{new_height} "
+                f"{prepared.format.upper()}: {format_size(prepared.original_size)} -> "
+                f"{format_size(prepared.size)} in {prepared.elapsed:.2f}s",
+                err=True
+            )
+
+    metadata = file_metadata(source)
+    base_url = get_client().base_url
+    existing = None if force else find_image_by_hash(metadata["sha256"], base_url)
+    if existing:
+        if prepared and prepared.changed:
+            prepared.path.unlink()
+        saved = increment_counter("dedup_bytes_saved", metadata["size"])
+        increment_counter("dedup_uploads_skipped")
+        click.echo(f"Already uploaded, skipping {image_path}")
+        click.echo(f"Image ID: {existing['id']}")
+        click.echo(f"URL: {existing['url']}")
+        click.echo(
+            f"Saved {format_size(metadata['size'])} "
+            f"({format_size(saved)} total)",
+            err=True
+        )
+        return existing["id"], existing["url"]
+
+    click.echo(f"Uploading image from {image_path}...")
+    progress = TransferProgress("Uploaded")
+    start = time.perf_counter()
+    try:
+        result = upload_image(source, progress=progress, sha256=metadata["sha256"])
+    except BaseException:
+        if prepared and prepared.changed:
+            prepared.path.unlink()
+        raise
+    elapsed = time.perf_counter() - start
+    progress.finish()
+
+    image_id = result.get("image_id")
+    image_url = result.get("image_url")
+
+    click.echo("Image uploaded successfully!")
+    click.echo(f"Image ID: {image_id}")
+    click.echo(f"URL: {image_url}")
+
+    if prepared and prepared.changed:
+        cached = get_config_dir() / "sources" / image_id
+        os.replace(prepared.path, cached)
+        source = str(cached)
+        if prepared.bytes_saved:
+            # Time saved is estimated from the throughput of this upload.
+            rate = metadata["size"] / elapsed if elapsed > 0 else 0
+            saved_time = prepared.bytes_saved / rate if rate else 0.0
+            total = increment_counter("preprocess_bytes_saved", prepared.bytes_saved)
+            click.echo(
+                f"Sent {format_size(prepared.bytes_saved)} less "
+                f"({prepared.bytes_saved / prepared.original_size:.0%}), "
+                f"about {saved_time:.1f}s of upload time saved "
+                f"({format_size(total)} total)",
+                err=True
+            )
+
+    # Save to local registry
+    add_image(image_id, path=source, url=image_url, metadata=metadata, base_url=base_url)
+    return image_id, image_url
 
 
 @click.command()
 @click.argument("image_path", type=click.Path(exists=True))
-def upload(image_path):
+@click.option("--force", "-f", is_flag=True,
+              help="Upload even if the same file content was uploaded before")
+@click.option("--max-edge", type=click.IntRange(min=1),
+              help="Downscale so the longer edge is at most this many pixels")
+@click.option("--format", "fmt", type=click.Choice(UPLOAD_FORMATS),
+              help="Transcode before uploading")
+@click.option("--quality", type=click.IntRange(1, 100), default=DEFAULT_QUALITY,
+              show_default=True, help="Encoder quality for --format and JPEG originals")
+def upload(image_path, force, max_edge, fmt, quality):
     """
     Upload an image to the server.
 
     IMAGE_PATH: Path to the image file to upload
-    """
-    try:
-        click.echo(f"Uploading image from {image_path}...")
-        result = upload_image(image_path)
 
-        image_id = result.get("image_id")
-        image_url = result.get("image_url")
+    Files whose content was already uploaded are not sent again; the
+    existing image ID is returned instead. With --max-edge and/or
+    --format, the image is shrunk on this machine before it is sent,
+    which reports the bytes and upload time saved.
 
-        click.echo("Image uploaded successfully!")
-        click.echo(f"Image ID: {image_id}")
-        click.echo(f"URL: {image_url}")
-
-        # Save to local registry
-        data = load()
-        if image_id not in data:
-            data.append(image_id)
-            save(data)
+    Example:
 
+        pxforge upload photo.jpg --max-edge 2048 --format webp --quality 85
+    """
+    try:
+        upload_file(image_path, force, max_edge, fmt, quality)
     except FileNotFoundError as e:
         click.echo(f"Error: {e}", err=True)
     except Exception as e:
@@ -42,12 +150,23 @@ def upload(image_path):
 
 
 @click.command()
-def list_images():
+@click.option("--long", "-l", "long_format", is_flag=True,
+              help="Show size, dimensions and upload time")
+@click.option("--sort", type=click.Choice(sorted(SORT_COLUMNS)), default="uploaded",
+              show_default=True, help="Sort key")
+@click.option("--desc", is_flag=True, help="Sort in descending order")
+@click.option("--min-width", type=int, help="Only images at least this wide")
+@click.option("--min-height", type=int, help="Only images at least this tall")
+@click.option("--limit", "-n", type=click.IntRange(min=1), help="Show at most N images")
+def list_images(long_format, sort, desc, min_width, min_height, limit):
     """
     List all uploaded image IDs from local registry.
     """
     click.echo("Fetching list of uploaded images...")
-    imgs = load()
+    imgs = query_images(
+        sort=sort, descending=desc, min_width=min_width,
+        min_height=min_height, limit=limit
+    )
 
     if not imgs:
         click.echo("No images found in local registry.")
@@ -55,7 +174,53 @@ def list_images():
 
     click.echo(f"\nFound {len(imgs)} image(s):")
     for idx, img in enumerate(imgs, 1):
-        click.echo(f"{idx}. {img}")
+        if not long_format:
+            click.echo(f"{idx}. {img['id']}")
+            continue
+        dimensions = f"{img['width']}x{img['height']}" if img["width"] else "?"
+        click.echo(
+            f"{idx}. {img['id']}  {dimensions:>11}  {format_size(img['size']):>9}  "
+            f"{format_time(img['uploaded_at'])}"
+        )
+
+
+@click.command()
+@click.argument("image_id")
+def info(image_id):
+    """
+    Show metadata and operation history of an image.
+
+    IMAGE_ID: ID of the image to inspect
+    """
+    img = get_image(image_id)
+    if img is None:
+        click.echo(f"Error: Image ID {image_id} not found in registry", err=True)
+        return
+
+    click.echo(f"Image ID:   {img['id']}")
+    if img["width"]:
+        click.echo(f"Dimensions: {img['width']}x{img['height']}")
+    click.echo(f"Size:       {format_size(img['size'])}")
+    click.echo(f"SHA-256:    {img['sha256'] or '?'}")
+    click.echo(f"Uploaded:   {format_time(img['uploaded_at'])}")
+    click.echo(f"Source:     {img['path'] or '?'}")
+    click.echo(f"URL:        {img['url'] or '?'}")
+
+    def _show(parent_id, depth, seen):
+        for entry in get_lineage(parent_id):
+            args = ",".join(f"{key}={value}" for key, value in entry["params"].items())
+            label = entry["operation"] + (f":{args}" if args else "")
+            indent = "  " * depth
+            click.echo(f"{indent}- {label} ({format_time(entry['created_at'])})")
+            click.echo(f"{indent}  URL: {entry['url']}")
+            child = entry["result_image_id"]
+            if child and child not in seen:
+                click.echo(f"{indent}  Image ID: {child}")
+                _show(child, depth + 1, seen | {child})
+
+    if get_lineage(image_id):
+        click.echo("\nOperations:")
+        _show(image_id, 0, {image_id})
 
 
 @click.command()
@@ -66,31 +231,140 @@ def delete(image_id):
 
     IMAGE_ID: ID of the image to delete from registry
     """
-    data = load()
-
-    if image_id not in data:
+    if not remove_image(image_id):
         click.echo(f"Error: {image_id} not found in registry", err=True)
         return
 
-    data.remove(image_id)
-    save(data)
     click.echo(f"Deleted {image_id} from local registry")
 
 
+def read_urls(urls_file):
+    """
+    Read URLs from a file, one per line, skipping blank and '#' lines.
+
+    Args:
+        urls_file: Open text file
+
+    Returns:
+        list: URLs in file order
+    """
+    return [
+        line.strip() for line in urls_file
+        if line.strip() and not line.lstrip().startswith("#")
+    ]
+
+
+def download_targets(urls, dest):
+    """
+    Map URLs to output files the way cp maps sources to a destination.
+
+    A single URL may be saved to a file path; several URLs are saved
+    into the destination directory under their URL file names, with a
+    numeric suffix when names collide.
+
+    Args:
+        urls (list): URLs to download
+        dest (str): Output file or directory
+
+    Returns:
+        list: (url, output path) pairs
+
+    Raises:
+        click.UsageError: If several URLs are given and dest is a file
+    """
+    dest_path = Path(dest)
+    if len(urls) == 1 and not dest_path.is_dir() and not dest.endswith(("/", "\\")):
+        return [(urls[0], dest_path)]
+    if dest_path.exists() and not dest_path.is_dir():
+        raise click.UsageError(f"Target '{dest}' is not a directory")
+
+    targets = []
+    used = set()
+    for url in urls:
+        name = Path(urlparse(url).path).name or "image"
+        stem, suffix = Path(name).stem, Path(name).suffix
+        candidate, counter = name, 1
+        while candidate in used:
+            candidate = f"{stem}-{counter}{suffix}"
+            counter += 1
+        used.add(candidate)
+        targets.append((url, dest_path / candidate))
+    return targets
+
+
 @click.command()
-@click.argument("url")
-@click.argument("output_path", type=click.Path())
-def download(url, output_path):
+@click.argument("args", nargs=-1, required=True, metavar="URL... DEST")
+@click.option("--urls-from", type=click.File("r"),
+              help="File with one URL per line ('-' for stdin)")
+@click.option("--concurrency", "-c", type=click.IntRange(1, 64), default=4,
+              show_default=True, help="Number of files downloaded at once")
+@click.option("--segments", type=click.IntRange(1, 32), default=1, show_default=True,
+              help="Fetch large files as this many parallel byte ranges")
+@click.pass_context
+def download(ctx, args, urls_from, concurrency, segments):
     """
-    Download an image from a URL.
+    Download images from URLs.
 
-    URL: Image URL to download from
+    URL: Image URL(s) to download from
 
-    OUTPUT_PATH: Path to save the downloaded image
+    DEST: Path to save a single image, or a directory for several
+
+    Downloads stream to disk, resume after dropped connections and only
+    appear at DEST once complete. Several URLs are downloaded
+    concurrently, printing one tab-separated line per URL.
     """
-    try:
-        click.echo(f"Downloading image from {url}...")
-        download_image(url, output_path)
-        click.echo(f"Image saved to {output_path}")
-    except Exception as e:
-        click.echo(f"Failed to download image: {e}", err=True)
+    *urls, dest = args
+    if urls_from:
+        urls += read_urls(urls_from)
+    urls = list(dict.fromkeys(urls))
+    if not urls:
+        raise click.UsageError("Give at least one URL and a destination")
+
+    targets = download_targets(urls, dest)
+
+    if len(targets) == 1:
+        url, output_path = targets[0]
+        try:
+            click.echo(f"Downloading image from {url}...")
+            progress = TransferProgress("Downloaded")
+            download_image(url, str(output_path), progress=progress, segments=segments)
+            progress.finish()
+            click.echo(f"Image saved to {output_path}")
+        except Exception as e:
+            click.echo(f"Failed to download image: {e}", err=True)
+            ctx.exit(1)
+        return
+
+    client = PxForgeClient(pool_size=max(concurrency * segments, DEFAULT_POOL_SIZE))
+    set_client(client)
+
+    click.echo(
+        f"Downloading {len(targets)} image(s) with concurrency {concurrency}...", err=True
+    )
+    start = time.perf_counter()
+    failed = 0
+    total_bytes = 0
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        futures = {
+            pool.submit(client.download_image, url, str(output_path), segments=segments):
+                (url, output_path)
+            for url, output_path in targets
+        }
+        for future in as_completed(futures):
+            url, output_path = futures[future]
+            try:
+                total_bytes += future.result()
+                click.echo(f"{url}\tOK\t{output_path}")
+            except Exception as e:
+                failed += 1
+                click.echo(f"{url}\tFAILED\t{e}")
+
+    elapsed = time.perf_counter() - start
+    click.echo(
+        f"Downloaded {len(targets) - failed} of {len(targets)} image(s), "
+        f"{format_size(total_bytes)} in {elapsed:.1f}s",
+        err=True
+    )
+    if failed:
+        ctx.exit(1)
@@ -0,0 +1,164 @@
+"""
+Batch processing commands.
+
+Provides a command that runs one operation over many image IDs
+concurrently on a bounded worker pool.
+"""
+
+import time
+import click
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from pathlib import Path
+from ..api_client import PxForgeClient, DEFAULT_POOL_SIZE, set_client
+from ..operations import parse_step, run_operation
+from ..scheduler import AdaptiveLimiter, Scheduler
+from ..utilities import load
+from .common import resolve_output
+
+
+# How long workers wait for a backend that keeps failing to come back
+# before giving up on their images.
+CIRCUIT_WAIT = 120
+
+
+def read_image_ids(ids_file):
+    """
+    Read image IDs from a file, one per line.
+
+    Blank lines, '#' comments and repeated IDs are skipped.
+
+    Args:
+        ids_file: Open text file
+
+    Returns:
+        list: Image IDs in file order
+    """
+    seen = set()
+    image_ids = []
+    for line in ids_file:
+        image_id = line.split("#", 1)[0].strip()
+        if image_id and image_id not in seen:
+            seen.add(image_id)
+            image_ids.append(image_id)
+    return image_ids
+
+
+@click.command()
+@click.argument("operation")
+@click.option("--ids-from", type=click.File("r"),
+              help="File with one image ID per line ('-' for stdin)")
+@click.option("--all", "all_images", is_flag=True,
+              help="Process every image in the local registry")
+@click.option("--concurrency", "-c", type=click.IntRange(1, 256), default=4,
+              show_default=True, help="Maximum number of requests in flight")
+@click.option("--output", "-o", type=click.Path(file_okay=False),
+              help="Download every result into this directory")
+@click.pass_context
+def batch(ctx, operation, ids_from, all_images, concurrency, output):
+    """
+    Run one operation over many images concurrently.
+
+    OPERATION: Operation name with optional parameters, e.g. to-bw,
+    resize:w=800,h=600 or watermark:text=Acme,position=top-left
+
+    Results are printed as they finish, one tab-separated line per image.
+    A failed image does not stop the others. With --output, each result
+    is downloaded as soon as it is ready, while the remaining images are
+    still being processed.
+
+    The number of requests in flight adapts to the backend: it grows
+    while responses stay fast and shrinks when the server throttles,
+    times out or slows down, never exceeding --concurrency. Throttled
+    requests are retried after the delay the server asks for, and if
+    the backend keeps failing, workers pause instead of failing every
+    remaining image.
+    """
+    if bool(ids_from) == all_images:
+        raise click.UsageError("Pass exactly one of --ids-from or --all")
+
+    try:
+        op, params = parse_step(operation)
+    except ValueError as e:
+        raise click.BadParameter(str(e), param_hint="OPERATION")
+
+    registry = load()
+    image_ids = registry if all_images else read_image_ids(ids_from)
+    if not image_ids:
+        click.echo("No image IDs to process.")
+        return
+
+    registered = set(registry)
+    if output:
+        Path(output).mkdir(parents=True, exist_ok=True)
+    pool_size = concurrency * 2 if output else concurrency
+    scheduler = Scheduler(
+        limiter=AdaptiveLimiter(initial=min(4, pool_size), maximum=pool_size),
+        wait_when_open=CIRCUIT_WAIT
+    )
+    client = PxForgeClient(
+        pool_size=max(pool_size, DEFAULT_POOL_SIZE), scheduler=scheduler
+    )
+    set_client(client)
+    client.warm_up(min(concurrency, len(image_ids)))
+
+    def _process(image_id):
+        if image_id not in registered:
+            raise LookupError("not found in registry")
+        result = run_operation(op.name, image_id, params, client=client)
+        if not result.get("success"):
+            raise RuntimeError(result.get("error", "Unknown error"))
+        return result.get("image_url")
+
+    def _download(image_id, url):
+        path = resolve_output(output, image_id, op.name, url)
+        client.download_image(url, path)
+        return path
+
+    click.echo(
+        f"Running {op.name} on {len(image_ids)} image(s) "
+        f"with concurrency {concurrency}...",
+        err=True
+    )
+    start = time.perf_counter()
+    failed = 0
+
+    # Downloads run on their own pool so a worker moves on to the next
+    # operation while its previous result is still being fetched.
+    with ThreadPoolExecutor(max_workers=concurrency) as pool, \
+            ThreadPoolExecutor(max_workers=concurrency) as downloads:
+        # Maps each future to (image ID, result URL once it is downloading).
+        pending = {pool.submit(_process, image_id): (image_id, None) for image_id in image_ids}
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                image_id, url = pending.pop(future)
+                try:
+                    value = future.result()
+                except Exception as e:
+                    failed += 1
+                    click.echo(f"{image_id}\tFAILED\t{e}")
+                    continue
+                if url is not None:
+                    click.echo(f"{image_id}\tOK\t{url}\t{value}")
+                elif output:
+                    pending[downloads.submit(_download, image_id, value)] = (image_id, value)
+                else:
+                    click.echo(f"{image_id}\tOK\t{value}")
+
+    elapsed = time.perf_counter() - start
+    click.echo(
+        f"Processed {len(image_ids)} image(s) in {elapsed:.1f}s: "
+        f"{len(image_ids) - failed} succeeded, {failed} failed",
+        err=True
+    )
+    summary = scheduler.summary()
+    if summary["retries"] or summary["rejected"]:
+        click.echo(
+            f"{summary['retries']} request(s) retried "
+            f"({summary['throttled']} throttled by the backend), "
+            f"{summary['rejected']} not sent while it was down; "
+            f"concurrency settled at {int(summary['window'])}",
+            err=True
+        )
+    if failed:
+        ctx.exit(1)
@@ -0,0 +1,63 @@
+"""
+Result cache commands.
+
+Provides commands to inspect and prune the local cache of operation
+results.
+"""
+
+import click
+from ..cache import ResultCache
+from .common import format_size, format_time
+
+
+@click.group()
+def cache():
+    """
+    Inspect and prune the local result cache.
+    """
+
+
+@cache.command()
+def stats():
+    """
+    Show cache size and hit rate.
+    """
+    summary = ResultCache().stats()
+    lookups = summary["hits"] + summary["misses"]
+    hit_rate = f"{summary['hits'] / lookups:.0%}" if lookups else "n/a"
+
+    click.echo(f"Cached results: {summary['responses']}")
+    click.echo(f"Cached files:   {summary['blobs']} ({format_size(summary['blob_bytes'])})")
+    click.echo(f"Hits / misses:  {summary['hits']} / {summary['misses']} ({hit_rate})")
+    click.echo(f"Oldest entry:   {format_time(summary['oldest'])}")
+
+
+@cache.command()
+@click.option("--max-age", type=click.FloatRange(min=0),
+              help="Drop entries older than this many hours (default: the TTL)")
+@click.option("--max-entries", type=click.IntRange(min=0),
+              help="Keep at most this many cached results")
+@click.option("--max-size", type=click.FloatRange(min=0),
+              help="Keep at most this many MB of cached files")
+def prune(max_age, max_entries, max_size):
+    """
+    Remove expired entries and enforce size limits.
+    """
+    removed = ResultCache().prune(
+        max_age=max_age * 3600 if max_age is not None else None,
+        max_entries=max_entries,
+        max_blob_bytes=int(max_size * 1024 * 1024) if max_size is not None else None
+    )
+    click.echo(
+        f"Removed {removed['responses']} cached result(s) "
+        f"and {removed['blobs']} cached file(s)"
+    )
+
+
+@cache.command()
+def clear():
+    """
+    Remove every cached result and file.
+    """
+    ResultCache().clear()
+    click.echo("Cache cleared")
@@ -6,36 +6,47 @@ and noise reduction using AI models.
 """
 
 import click
-from ..api_client import make_request
+from pathlib import Path
+from ..operations import run_operation
+from ..regions import ROI_MARGIN, remove_object_region
 from ..utilities import validate_image_id
+from .common import (
+    default_output_path, format_size, output_option, resolve_output, run_tiled_command,
+    save_output, tile_options
+)
 
 
 @click.command()
 @click.argument("image_id")
-def remove_bg(image_id):
+@tile_options
+@output_option
+def remove_bg(image_id, tile_size, overlap, concurrency, output):
     """
     Remove background from an image using AI.
 
-    IMAGE_ID: ID of the image to process
+    IMAGE_ID: ID of the image to process (or an image file with --tile-size)
 
-    Note: This operation may take a few minutes to complete.
+    Note: This operation may take a few minutes to complete. For very
+    large images, --tile-size processes overlapping tiles concurrently
+    and blends them back together locally (requires Pillow).
     """
+    if tile_size:
+        run_tiled_command("remove-bg", image_id, output, tile_size, overlap, concurrency)
+        return
+
     if not validate_image_id(image_id):
         click.echo(f"Error: Image ID {image_id} not found in registry", err=True)
         return
 
     try:
         click.echo("Removing background (this may take a while)...")
-        result = make_request(
-            "/remove-background",
-            data={"image_id": image_id},
-            timeout=600
-        )
+        result = run_operation("remove-bg", image_id)
 
         if result.get("success"):
             url = result.get("image_url")
             click.echo("Background removed successfully!")
             click.echo(f"URL: {url}")
+            save_output(url, output, image_id, "remove-bg")
         else:
             click.echo(f"Error: {result.get('error', 'Unknown error')}", err=True)
 
@@ -49,34 +60,44 @@ def remove_bg(image_id):
 @click.option("--y", type=int, required=True, help="Y coordinate of object center")
 @click.option("--width", "-w", type=int, default=100, help="Bounding box width in pixels")
 @click.option("--height", "-h", type=int, default=100, help="Bounding box height in pixels")
-def remove_object(image_id, x, y, width, height):
+@click.option("--roi", is_flag=True,
+              help="Send only the region around the object and composite it back locally")
+@click.option("--margin", type=click.IntRange(min=0), default=ROI_MARGIN, show_default=True,
+              help="Context around the bounding box sent with --roi, in pixels")
+@output_option
+def remove_object(image_id, x, y, width, height, roi, margin, output):
     """
     Remove an object from an image using inpainting.
 
-    IMAGE_ID: ID of the image to process
+    IMAGE_ID: ID of the image to process (or an image file with --roi)
+
+    With --roi, only the bounding box plus --margin pixels of context is
+    cropped and uploaded, and the inpainted tile is blended back into
+    the original on this machine. For large images this cuts the upload
+    and server time in proportion to the area; the result is saved
+    locally rather than returned as a URL. Requires Pillow.
     """
+    if roi:
+        remove_object_roi(image_id, x, y, width, height, margin, output)
+        return
+
     if not validate_image_id(image_id):
         click.echo(f"Error: Image ID {image_id} not found in registry", err=True)
         return
 
     try:
         click.echo(f"Removing object at ({x}, {y}) with size {width}x{height}...")
-        result = make_request(
-            "/remove-object",
-            data={
-                "image_id": image_id,
-                "x": x,
-                "y": y,
-                "width": width,
-                "height": height
-            },
-            timeout=600
+        result = run_operation(
+            "remove-object",
+            image_id,
+            {"x": x, "y": y, "width": width, "height": height}
         )
 
         if result.get("success"):
             url = result.get("image_url")
             click.echo("Object removed successfully!")
             click.echo(f"URL: {url}")
+            save_output(url, output, image_id, "remove-object")
         else:
             click.echo(f"Error: {result.get('error', 'Unknown error')}", err=True)
 
@@ -84,32 +105,64 @@ def remove_object(image_id, x, y, width, height):
         click.echo(f"Failed to remove object: {e}", err=True)
 
 
+def remove_object_roi(image, x, y, width, height, margin, output):
+    """
+    Remove an object by processing only the region around it.
+    """
+    if not Path(image).is_file() and not validate_image_id(image):
+        click.echo(f"Error: Image ID {image} not found in registry", err=True)
+        return
+    if output:
+        output = resolve_output(output, image, "remove-object")
+    else:
+        output = default_output_path(image, "remove-object")
+
+    try:
+        click.echo(f"Removing object at ({x}, {y}) with size {width}x{height}...")
+        report = remove_object_region(image, x, y, width, height, output, margin=margin)
+        left, top, right, bottom = report.box
+        click.echo("Object removed successfully!")
+        click.echo(
+            f"Sent a {right - left}x{bottom - top} tile "
+            f"({report.area_fraction:.1%} of the image, {format_size(report.tile_bytes)})",
+            err=True
+        )
+        click.echo(f"Saved to {output}")
+    except Exception as e:
+        click.echo(f"Failed to remove object: {e}", err=True)
+
+
 @click.command()
 @click.argument("image_id")
-def remove_noise(image_id):
+@tile_options
+@output_option
+def remove_noise(image_id, tile_size, overlap, concurrency, output):
     """
     Remove noise and enhance image quality using AI upscaling.
 
-    IMAGE_ID: ID of the image to process
+    IMAGE_ID: ID of the image to process (or an image file with --tile-size)
 
-    Note: This operation may take several minutes to complete.
+    Note: This operation may take several minutes to complete. For very
+    large images, --tile-size processes overlapping tiles concurrently
+    and blends them back together locally (requires Pillow).
     """
+    if tile_size:
+        run_tiled_command("remove-noise", image_id, output, tile_size, overlap, concurrency)
+        return
+
     if not validate_image_id(image_id):
         click.echo(f"Error: Image ID {image_id} not found in registry", err=True)
         return
 
     try:
         click.echo("Removing noise and enhancing quality (this may take a while)...")
-        result = make_request(
-            "/remove-noise",
-            data={"image_id": image_id},
-            timeout=600
-        )
+        result = run_operation("remove-noise", image_id)
 
         if result.get("success"):
             url = result.get("image_url")
             click.echo("Noise removed and image enhanced successfully!")
             click.echo(f"URL: {url}")
+            save_output(url, output, image_id, "remove-noise")
         else:
             click.echo(f"Error: {result.get('error', 'Unknown error')}", err=True)
 
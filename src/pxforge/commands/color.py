@@ -6,30 +6,37 @@ brightness/contrast adjustments.
 """
 
 import click
-from ..api_client import make_request
+from ..operations import run_operation
 from ..utilities import validate_image_id
+from .common import local_options, run_local_command, save_output
 
 
 @click.command()
 @click.argument("image_id")
-def to_bw(image_id):
+@local_options
+def to_bw(image_id, local, output):
     """
     Convert an image to black and white (grayscale).
 
-    IMAGE_ID: ID of the image to convert
+    IMAGE_ID: ID of the image to convert (or an image file with --local)
     """
+    if local:
+        run_local_command("to-bw", image_id, {}, output)
+        return
+
     if not validate_image_id(image_id):
         click.echo(f"Error: Image ID {image_id} not found in registry", err=True)
         return
 
     try:
         click.echo("Converting image to black and white...")
-        result = make_request("/toBW", data={"image_id": image_id})
+        result = run_operation("to-bw", image_id)
 
         if result.get("success"):
             url = result.get("image_url")
             click.echo("Image converted to B&W successfully!")
             click.echo(f"URL: {url}")
+            save_output(url, output, image_id, "to-bw")
         else:
             click.echo(f"Error: {result.get('error', 'Unknown error')}", err=True)
 
@@ -39,24 +46,30 @@ def to_bw(image_id):
 
 @click.command()
 @click.argument("image_id")
-def to_rgb(image_id):
+@local_options
+def to_rgb(image_id, local, output):
     """
     Convert an image to RGB color space.
 
-    IMAGE_ID: ID of the image to convert
+    IMAGE_ID: ID of the image to convert (or an image file with --local)
     """
+    if local:
+        run_local_command("to-rgb", image_id, {}, output)
+        return
+
     if not validate_image_id(image_id):
         click.echo(f"Error: Image ID {image_id} not found in registry", err=True)
         return
 
     try:
         click.echo("Converting image to RGB...")
-        result = make_request("/toRGB", data={"image_id": image_id})
+        result = run_operation("to-rgb", image_id)
 
         if result.get("success"):
             url = result.get("image_url")
             click.echo("Image converted to RGB successfully!")
             click.echo(f"URL: {url}")
+            save_output(url, output, image_id, "to-rgb")
         else:
             click.echo(f"Error: {result.get('error', 'Unknown error')}", err=True)
 
@@ -66,24 +79,30 @@ def to_rgb(image_id):
 
 @click.command()
 @click.argument("image_id")
-def contrast(image_id):
+@local_options
+def contrast(image_id, local, output):
     """
     Adjust image contrast.
 
-    IMAGE_ID: ID of the image to adjust
+    IMAGE_ID: ID of the image to adjust (or an image file with --local)
     """
+    if local:
+        run_local_command("contrast", image_id, {}, output)
+        return
+
     if not validate_image_id(image_id):
         click.echo(f"Error: Image ID {image_id} not found in registry", err=True)
         return
 
     try:
         click.echo("Adjusting image contrast...")
-        result = make_request("/contrast", data={"image_id": image_id})
+        result = run_operation("contrast", image_id)
 
         if result.get("success"):
             url = result.get("image_url")
             click.echo("Contrast adjusted successfully!")
             click.echo(f"URL: {url}")
+            save_output(url, output, image_id, "contrast")
         else:
             click.echo(f"Error: {result.get('error', 'Unknown error')}", err=True)
 
@@ -93,24 +112,30 @@ def contrast(image_id):
 
 @click.command()
 @click.argument("image_id")
-def brightness(image_id):
+@local_options
+def brightness(image_id, local, output):
     """
     Adjust image brightness.
 
-    IMAGE_ID: ID of the image to adjust
+    IMAGE_ID: ID of the image to adjust (or an image file with --local)
     """
+    if local:
+        run_local_command("brightness", image_id, {}, output)
+        return
+
     if not validate_image_id(image_id):
         click.echo(f"Error: Image ID {image_id} not found in registry", err=True)
         return
 
     try:
         click.echo("Adjusting image brightness...")
-        result = make_request("/brightness", data={"image_id": image_id})
+        result = run_operation("brightness", image_id)
 
         if result.get("success"):
             url = result.get("image_url")
             click.echo("Brightness adjusted successfully!")
             click.echo(f"URL: {url}")
+            save_output(url, output, image_id, "brightness")
         else:
             click.echo(f"Error: {result.get('error', 'Unknown error')}", err=True)
 
@@ -0,0 +1,271 @@
+"""
+Shared options and helpers for processing commands.
+"""
+
+import os
+import sys
+import time
+import click
+from datetime import datetime
+from pathlib import Path
+from urllib.parse import urlparse
+from ..api_client import download_image
+from ..local_ops import run_local
+from ..regions import TILE_OVERLAP, TILE_WORKERS, process_tiled
+from ..utilities import validate_image_id
+
+
+def format_size(size):
+    """
+    Format a byte count for display, e.g. 1.5 MB.
+    """
+    if size is None:
+        return "?"
+    for unit in ("B", "KB", "MB", "GB"):
+        if size < 1024 or unit == "GB":
+            return f"{size:.0f} {unit}" if unit == "B" else f"{size:.1f} {unit}"
+        size /= 1024
+
+
+def format_time(timestamp):
+    """
+    Format a Unix timestamp for display, or '?' if unknown.
+    """
+    if timestamp is None:
+        return "?"
+    return datetime.fromtimestamp(timestamp).strftime("%Y-%m-%d %H:%M:%S")
+
+
+class TransferProgress:
+    """
+    Progress callback that reports bytes, throughput and ETA on stderr.
+
+    On a terminal the line is redrawn in place a few times a second;
+    otherwise a line is written every few seconds so logs stay short.
+    """
+
+    TTY_INTERVAL = 0.2
+    LOG_INTERVAL = 5.0
+
+    def __init__(self, label):
+        """
+        Args:
+            label (str): Verb shown before the counts, e.g. "Uploading"
+        """
+        self.label = label
+        self.start = time.perf_counter()
+        self.done = 0
+        self.total = 0
+        self._tty = sys.stderr.isatty()
+        self._interval = self.TTY_INTERVAL if self._tty else self.LOG_INTERVAL
+        self._last = self.start
+        self._shown = False
+
+    def _line(self, elapsed):
+        rate = self.done / elapsed if elapsed > 0 else 0
+        line = f"{self.label} {format_size(self.done)}"
+        if self.total:
+            line += f" / {format_size(self.total)} ({self.done / self.total:.0%})"
+        line += f"  {format_size(rate)}/s"
+        if self.total and rate and self.done < self.total:
+            line += f"  ETA {(self.total - self.done) / rate:.0f}s"
+        return line
+
+    def __call__(self, done, total):
+        self.done, self.total = done, total
+        now = time.perf_counter()
+        if now - self._last < self._interval:
+            return
+        self._last = now
+        self._shown = True
+        line = self._line(now - self.start)
+        if self._tty:
+            click.echo(f"\r{line:<72}", nl=False, err=True)
+        else:
+            click.echo(line, err=True)
+
+    def finish(self):
+        """
+        Print the final transfer summary if progress was shown.
+        """
+        if not self._shown:
+            return
+        line = self._line(time.perf_counter() - self.start)
+        click.echo(f"\r{line:<72}" if self._tty else line, err=True)
+
+
+def output_option(func):
+    """
+    Add the --output option to a processing command.
+    """
+    return click.option(
+        "--output", "-o", type=click.Path(),
+        help="Save the result to this file or directory"
+    )(func)
+
+
+def local_options(func):
+    """
+    Add --local and --output options to a processing command.
+    """
+    func = output_option(func)
+    func = click.option(
+        "--local", "local", is_flag=True,
+        help="Run on this machine with Pillow instead of the server"
+    )(func)
+    return func
+
+
+def tile_options(func):
+    """
+    Add --tile-size, --overlap and --concurrency to a processing command.
+    """
+    func = click.option(
+        "--concurrency", "-c", type=click.IntRange(1, 64), default=TILE_WORKERS,
+        show_default=True, help="Tiles processed at once with --tile-size"
+    )(func)
+    func = click.option(
+        "--overlap", type=click.IntRange(min=0), default=TILE_OVERLAP, show_default=True,
+        help="Overlap between neighbouring tiles, in pixels"
+    )(func)
+    func = click.option(
+        "--tile-size", type=click.IntRange(min=64),
+        help="Process the image in overlapping tiles of at most this many pixels"
+    )(func)
+    return func
+
+
+def run_tiled_command(operation, image, output, tile_size, overlap, concurrency):
+    """
+    Run an operation over an image in tiles and report the result.
+
+    Args:
+        operation (str): Operation name
+        image (str): Image file path or registered image ID
+        output (str): Output file, or None for the default
+        tile_size (int): Maximum tile edge in pixels
+        overlap (int): Overlap between neighbouring tiles
+        concurrency (int): Tiles processed at once
+    """
+    if not Path(image).is_file() and not validate_image_id(image):
+        click.echo(f"Error: Image ID {image} not found in registry", err=True)
+        return
+    if output:
+        output = resolve_output(output, image, operation)
+    else:
+        output = default_output_path(image, operation)
+
+    def _progress(done, total):
+        click.echo(f"\rTiles {done}/{total}", nl=done == total, err=True)
+
+    try:
+        start = time.perf_counter()
+        report = process_tiled(
+            image, operation, output, tile_size=tile_size, overlap=overlap,
+            concurrency=concurrency, on_tile=_progress
+        )
+        elapsed = time.perf_counter() - start
+        width, height = report.output_size
+        click.echo(f"Processed {report.tiles} tile(s) in {elapsed:.1f}s ({width}x{height})")
+        click.echo(f"Saved to {output}")
+    except Exception as e:
+        click.echo(f"Failed to run {operation} in tiles: {e}", err=True)
+
+
+def default_output_path(image, operation):
+    """
+    Build the default output file name for a local operation.
+
+    Args:
+        image (str): Image file path or image ID
+        operation (str): Operation name
+
+    Returns:
+        str: File name such as "photo-resize.png"
+    """
+    path = Path(image)
+    stem = path.stem if path.is_file() else image
+    return f"{stem}-{operation}.png"
+
+
+def resolve_output(output, image, operation, url=None):
+    """
+    Turn an --output value into the file to write.
+
+    A directory (existing, or given with a trailing slash) gets the
+    default file name for the image and operation, using the result
+    URL's extension when it has one.
+
+    Args:
+        output (str): --output value
+        image (str): Image file path or image ID
+        operation (str): Operation name
+        url (str): Result URL, if the result comes from the server
+
+    Returns:
+        str: Output file path
+    """
+    path = Path(output)
+    if not (path.is_dir() or output.endswith(("/", os.sep))):
+        return output
+    name = default_output_path(image, operation)
+    suffix = Path(urlparse(url).path).suffix if url else ""
+    if suffix:
+        name = Path(name).with_suffix(suffix).name
+    return str(path / name)
+
+
+def save_output(url, output, image, operation):
+    """
+    Download a result to --output, if one was given.
+
+    The download streams over the shared client's pooled connections.
+    A failed download is reported here, so callers' own error messages
+    only ever describe the operation.
+
+    Args:
+        url (str): Result URL
+        output (str): --output value, or None to skip
+        image (str): Input image ID
+        operation (str): Operation name
+
+    Returns:
+        str: Path the result was saved to, or None if no output was
+        given or the download failed
+    """
+    if not output:
+        return None
+    try:
+        path = resolve_output(output, image, operation, url)
+        progress = TransferProgress("Downloaded")
+        download_image(url, path, progress=progress)
+        progress.finish()
+    except Exception as e:
+        click.echo(f"Failed to save result: {e}", err=True)
+        return None
+    click.echo(f"Saved to {path}")
+    return path
+
+
+def run_local_command(operation, image, params, output):
+    """
+    Run an operation locally and report the result.
+
+    Args:
+        operation (str): Operation name
+        image (str): Image file path or registered image ID
+        params (dict): Operation parameters keyed by full name
+        output (str): Output file, or None for the default
+    """
+    if output:
+        output = resolve_output(output, image, operation)
+    else:
+        output = default_output_path(image, operation)
+    try:
+        start = time.perf_counter()
+        run_local(operation, image, params, output)
+        elapsed = time.perf_counter() - start
+        click.echo(f"Done locally in {elapsed * 1000:.0f} ms")
+        click.echo(f"Saved to {output}")
+    except Exception as e:
+        click.echo(f"Failed to run {operation} locally: {e}", err=True)
@@ -0,0 +1,173 @@
+"""
+Daemon and shell commands.
+
+Both keep one process resident so the CLI is imported, the registry
+opened and server connections established once for many commands.
+"""
+
+import os
+import shlex
+import signal
+import threading
+import time
+import click
+from ..config import get_config_dir
+from ..daemon import DaemonError, control, open_server, run_command
+from ..tracing import MetricsExporter
+
+
+@click.command()
+@click.option("--socket", "socket_path", type=click.Path(dir_okay=False),
+              help="Socket to listen on (default: ~/.pxforge/daemon.sock)")
+@click.option("--status", is_flag=True, help="Report on the running daemon and exit")
+@click.option("--stop", is_flag=True, help="Stop the running daemon and exit")
+@click.option("--metrics", "metrics_file", type=click.Path(dir_okay=False),
+              help="Export timing metrics to this file (.prom: Prometheus, else JSON lines)")
+@click.option("--metrics-interval", type=click.FloatRange(1), default=15, show_default=True,
+              help="Seconds between metrics exports")
+@click.pass_context
+def daemon(ctx, socket_path, status, stop, metrics_file, metrics_interval):
+    """
+    Keep a resident process that runs pxforge commands.
+
+    While the daemon runs, pxforge commands are forwarded to it over a
+    Unix socket instead of starting from scratch: the CLI is already
+    imported, the registry and result cache are open and connections to
+    the server are kept alive, so a command costs about one socket round
+    trip plus its own work. Commands run one at a time, in the caller's
+    working directory; a command started while another runs, watch,
+    shell and commands reading stdin ('-') run in the calling process,
+    as does any command whose PXFORGE_* or HOME environment differs
+    from the daemon's. Ctrl-C in the caller interrupts its command in
+    the daemon.
+
+    The daemon runs in the foreground until Ctrl-C, SIGTERM or
+    'pxforge daemon --stop'. Set PXFORGE_NO_DAEMON=1 to run a command
+    without it.
+
+    With --metrics, time spent per command and in each API call, HTTP
+    phase and registry query is exported every --metrics-interval
+    seconds: a .prom file is rewritten for Prometheus' textfile
+    collector, any other file gets a JSON line appended.
+
+    Example:
+
+        pxforge daemon &
+    """
+    if status or stop:
+        try:
+            reply = control("stop" if stop else "status", socket_path)
+        except DaemonError as e:
+            click.echo(f"Error: {e}", err=True)
+            ctx.exit(1)
+            return
+        if stop:
+            click.echo("Daemon stopping")
+        else:
+            click.echo(
+                f"Daemon {reply['pid']} on {reply['socket']}: up {reply['uptime']:.0f}s, "
+                f"{reply['commands']} command(s) run"
+            )
+        return
+
+    try:
+        server = open_server(socket_path)
+    except (DaemonError, OSError) as e:
+        click.echo(f"Error: {e}", err=True)
+        ctx.exit(1)
+        return
+
+    start = time.perf_counter()
+    try:
+        server.warm_up()
+    except Exception as e:
+        # Commands report connection problems themselves.
+        click.echo(f"Warning: could not reach the server: {e}", err=True)
+    click.echo(
+        f"Daemon {os.getpid()} listening on {server.path} "
+        f"(ready in {time.perf_counter() - start:.2f}s)",
+        err=True
+    )
+
+    exporter = None
+    if metrics_file:
+        exporter = MetricsExporter(metrics_file, interval=metrics_interval)
+        exporter.start()
+
+    signal.signal(
+        signal.SIGTERM, lambda signum, frame: threading.Thread(target=server.shutdown).start()
+    )
+    try:
+        server.serve()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if exporter is not None:
+            exporter.stop()
+    click.echo(f"Daemon stopped after {server.commands} command(s)", err=True)
+
+
+@click.command()
+def shell():
+    """
+    Run pxforge commands interactively in one process.
+
+    Each line is a pxforge command line without the leading 'pxforge',
+    e.g. 'resize <image-id> -w 800 -h 600'. The CLI, registry and server
+    connections stay loaded between commands. Line editing and history
+    (kept in ~/.pxforge/shell_history) are available where Python has
+    readline. Type 'help' for the command list and 'exit' or Ctrl-D to
+    leave.
+    """
+    try:
+        import readline
+    except ImportError:
+        readline = None
+
+    history = get_config_dir() / "shell_history"
+    if readline is not None:
+        try:
+            readline.read_history_file(history)
+        except OSError:
+            pass
+
+    click.echo("pxforge shell. Type 'help' for commands, 'exit' to leave.")
+    status = 0
+    try:
+        while True:
+            try:
+                line = input("pxforge> " if status == 0 else f"pxforge [{status}]> ")
+            except KeyboardInterrupt:
+                click.echo()
+                continue
+            except EOFError:
+                click.echo()
+                break
+
+            try:
+                args = shlex.split(line)
+            except ValueError as e:
+                click.echo(f"Error: {e}", err=True)
+                continue
+            if not args:
+                continue
+            if args[0] in ("exit", "quit"):
+                break
+            if args[0] == "help":
+                args = args[1:2] + ["--help"]
+            if args[0] in ("shell", "daemon"):
+                click.echo(f"Error: {args[0]} cannot run inside the shell", err=True)
+                continue
+            try:
+                status = run_command(args)
+            except KeyboardInterrupt:
+                click.echo("\nInterrupted", err=True)
+                status = 130
+    finally:
+        if readline is not None:
+            readline.set_history_length(1000)
+            try:
+                readline.write_history_file(history)
+            except OSError:
+                pass
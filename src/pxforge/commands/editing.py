@@ -7,14 +7,16 @@ background replacement, prompt-based editing, and watermarking.
 
 import click
 from pathlib import Path
-from ..api_client import make_request
+from ..operations import run_operation
 from ..utilities import validate_image_id
+from .common import local_options, output_option, run_local_command, save_output
 
 
 @click.command()
 @click.argument("image_id")
 @click.argument("bg_image_path", type=click.Path(exists=True))
-def replace_bg(image_id, bg_image_path):
+@output_option
+def replace_bg(image_id, bg_image_path, output):
     """
     Replace image background with a new background.
 
@@ -30,20 +32,13 @@ def replace_bg(image_id, bg_image_path):
 
     try:
         click.echo("Replacing background (this may take a while)...")
-
-        with open(bg_image_path, "rb") as bg_file:
-            files = {"bg": bg_file}
-            result = make_request(
-                "/replace-bg",
-                files=files,
-                data={"image_id": image_id},
-                timeout=600
-            )
+        result = run_operation("replace-bg", image_id, {"bg": bg_image_path})
 
         if result.get("success"):
             url = result.get("image_url")
             click.echo("Background replaced successfully!")
             click.echo(f"URL: {url}")
+            save_output(url, output, image_id, "replace-bg")
         else:
             click.echo(f"Error: {result.get('error', 'Unknown error')}", err=True)
 
@@ -54,7 +49,8 @@ def replace_bg(image_id, bg_image_path):
 @click.command()
 @click.argument("image_id")
 @click.option("--prompt", "-p", required=True, help="Edit instruction prompt")
-def prompt_edit(image_id, prompt):
+@output_option
+def prompt_edit(image_id, prompt, output):
     """
     Edit image using AI based on a text prompt.
 
@@ -75,16 +71,13 @@ def prompt_edit(image_id, prompt):
         click.echo(f"Editing image with prompt: '{prompt}'")
         click.echo("(this may take a while)...")
 
-        result = make_request(
-            "/prompt-edit",
-            data={"image_id": image_id, "prompt": prompt},
-            timeout=600
-        )
+        result = run_operation("prompt-edit", image_id, {"prompt": prompt})
 
         if result.get("success"):
             url = result.get("image_url")
             click.echo("Image edited successfully!")
             click.echo(f"URL: {url}")
+            save_output(url, output, image_id, "prompt-edit")
         else:
             click.echo(f"Error: {result.get('error', 'Unknown error')}", err=True)
 
@@ -99,32 +92,32 @@ def prompt_edit(image_id, prompt):
     ["top-left", "top-right", "bottom-left", "bottom-right"],
     case_sensitive=False
 ), default="bottom-right", help="Watermark position")
-def watermark(image_id, text, position):
+@local_options
+def watermark(image_id, text, position, local, output):
     """
     Add a text watermark to an image.
 
-    IMAGE_ID: ID of the image to watermark
+    IMAGE_ID: ID of the image to watermark (or an image file with --local)
     """
+    if local:
+        run_local_command("watermark", image_id, {"text": text, "position": position}, output)
+        return
+
     if not validate_image_id(image_id):
         click.echo(f"Error: Image ID {image_id} not found in registry", err=True)
         return
 
     try:
         click.echo(f"Adding watermark '{text}' at {position}...")
-        result = make_request(
-            "/watermark",
-            data={
-                "image_id": image_id,
-                "watermark": text,
-                "position": position
-            },
-            use_form_data=True
+        result = run_operation(
+            "watermark", image_id, {"text": text, "position": position}
         )
 
         if result.get("success"):
             url = result.get("image_url")
             click.echo("Watermark added successfully!")
             click.echo(f"URL: {url}")
+            save_output(url, output, image_id, "watermark")
         else:
             click.echo(f"Error: {result.get('error', 'Unknown error')}", err=True)
 
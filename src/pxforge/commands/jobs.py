@@ -0,0 +1,238 @@
+"""
+Job commands.
+
+Submit long-running operations without holding a connection open,
+then check on, wait for and fetch their results later.
+"""
+
+import os
+import click
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from ..api_client import PxForgeClient, DEFAULT_POOL_SIZE, download_image, set_client
+from ..jobs import FINISHED, poll_job, submit_job, wait_jobs
+from ..operations import parse_step
+from ..utilities import JOB_STATUSES, get_job, query_jobs, remove_jobs, validate_image_id
+from .batch import read_image_ids
+from .common import format_time, resolve_output
+
+
+def resolve_jobs(job_ids, all_jobs, statuses=None):
+    """
+    Look up the jobs named on the command line.
+
+    Args:
+        job_ids (tuple): Job IDs or unique prefixes
+        all_jobs (bool): Use every job in the given states instead
+        statuses (tuple): States selected by all_jobs (default: any)
+
+    Returns:
+        list: Job dicts
+
+    Raises:
+        click.UsageError: If no jobs are named or one is unknown
+    """
+    if all_jobs:
+        return query_jobs(statuses=statuses)
+    if not job_ids:
+        raise click.UsageError("Give one or more job IDs, or --all")
+
+    jobs = []
+    for job_id in job_ids:
+        job = get_job(job_id)
+        if job is None:
+            raise click.UsageError(f"Unknown or ambiguous job ID '{job_id}'")
+        jobs.append(job)
+    return jobs
+
+
+def format_job(job):
+    """
+    Render a job as a tab-separated status line.
+    """
+    detail = job["url"] if job["status"] == "succeeded" else job["error"] or ""
+    return f"{job['id']}\t{job['status'].upper()}\t{detail}"
+
+
+@click.command()
+@click.argument("operation")
+@click.argument("image_ids", nargs=-1)
+@click.option("--ids-from", type=click.File("r"),
+              help="File with one image ID per line ('-' for stdin)")
+@click.option("--concurrency", "-c", type=click.IntRange(1, 256), default=4,
+              show_default=True, help="Maximum number of submissions in flight")
+@click.pass_context
+def submit(ctx, operation, image_ids, ids_from, concurrency):
+    """
+    Submit an operation as a background job.
+
+    OPERATION: Operation name with optional parameters, e.g. remove-bg
+    or prompt-edit:prompt="make it snow"
+
+    IMAGE_IDS: Images to process (or use --ids-from)
+
+    Prints one job ID per image and returns without waiting; use
+    'pxforge jobs wait' and 'pxforge jobs fetch' to collect the results.
+    """
+    try:
+        op, params = parse_step(operation)
+    except ValueError as e:
+        raise click.BadParameter(str(e), param_hint="OPERATION")
+
+    image_ids = list(image_ids) + (read_image_ids(ids_from) if ids_from else [])
+    if not image_ids:
+        raise click.UsageError("Give one or more image IDs, or --ids-from")
+
+    client = PxForgeClient(pool_size=max(concurrency, DEFAULT_POOL_SIZE))
+    set_client(client)
+
+    def _submit(image_id):
+        if not validate_image_id(image_id):
+            raise LookupError("not found in registry")
+        return submit_job(op.name, image_id, params, client=client)
+
+    failed = 0
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        futures = {pool.submit(_submit, image_id): image_id for image_id in image_ids}
+        for future in as_completed(futures):
+            image_id = futures[future]
+            try:
+                job = future.result()
+                line = f"{job['id']}\t{image_id}\t{job['status'].upper()}"
+                click.echo(line + (f"\t{job['error']}" if job["error"] else ""))
+            except Exception as e:
+                failed += 1
+                click.echo(f"-\t{image_id}\tFAILED\t{e}")
+
+    click.echo(
+        f"Submitted {len(image_ids) - failed} job(s), {failed} failed to submit", err=True
+    )
+    if failed:
+        ctx.exit(1)
+
+
+@click.group()
+def jobs():
+    """
+    Check on, wait for and fetch submitted jobs.
+    """
+
+
+@jobs.command(name="list")
+@click.option("--status", "statuses", type=click.Choice(JOB_STATUSES), multiple=True,
+              help="Only jobs in this state (repeatable)")
+@click.option("--limit", "-n", type=click.IntRange(min=1), help="Show at most N jobs")
+def list_jobs(statuses, limit):
+    """
+    List recorded jobs without contacting the server.
+    """
+    found = query_jobs(statuses=statuses or None, limit=limit)
+    if not found:
+        click.echo("No jobs found.")
+        return
+    for job in found:
+        click.echo(
+            f"{job['id']}  {job['status']:<9}  {job['operation']:<13}  "
+            f"{job['image_id']}  {format_time(job['submitted_at'])}"
+        )
+
+
+@jobs.command()
+@click.argument("job_ids", nargs=-1)
+@click.option("--all", "all_jobs", is_flag=True, help="Every recorded job")
+def status(job_ids, all_jobs):
+    """
+    Poll jobs once and show their state.
+
+    JOB_IDS: Jobs to check (unique prefixes are accepted)
+    """
+    for job in resolve_jobs(job_ids, all_jobs):
+        click.echo(format_job(poll_job(job)))
+
+
+@jobs.command()
+@click.argument("job_ids", nargs=-1)
+@click.option("--all", "all_jobs", is_flag=True, help="Every unfinished job")
+@click.option("--timeout", type=click.FloatRange(min=0),
+              help="Give up after this many seconds")
+@click.pass_context
+def wait(ctx, job_ids, all_jobs, timeout):
+    """
+    Wait for jobs to finish.
+
+    JOB_IDS: Jobs to wait for (unique prefixes are accepted)
+
+    Polls with exponential backoff and prints one line per job as it
+    finishes. Exits non-zero if any job failed or did not finish in time.
+    """
+    selected = resolve_jobs(job_ids, all_jobs, statuses=("queued", "running"))
+    if not selected:
+        click.echo("No jobs to wait for.")
+        return
+
+    click.echo(f"Waiting for {len(selected)} job(s)...", err=True)
+    results = wait_jobs(
+        [job["id"] for job in selected], timeout=timeout,
+        on_finish=lambda job: click.echo(format_job(job))
+    )
+
+    failed = sum(1 for job in results if job["status"] == "failed")
+    unfinished = sum(1 for job in results if job["status"] not in FINISHED)
+    click.echo(
+        f"{len(results) - failed - unfinished} succeeded, {failed} failed, "
+        f"{unfinished} still running",
+        err=True
+    )
+    if failed or unfinished:
+        ctx.exit(1)
+
+
+@jobs.command()
+@click.argument("job_ids", nargs=-1)
+@click.option("--all", "all_jobs", is_flag=True, help="Every job that has not failed")
+@click.option("--output", "-o", type=click.Path(), default=".", show_default=True,
+              help="File (for one job) or directory to save results to")
+@click.option("--timeout", type=click.FloatRange(min=0),
+              help="Give up waiting after this many seconds")
+@click.pass_context
+def fetch(ctx, job_ids, all_jobs, output, timeout):
+    """
+    Wait for jobs and download their results.
+
+    JOB_IDS: Jobs to fetch (unique prefixes are accepted)
+    """
+    selected = resolve_jobs(
+        job_ids, all_jobs, statuses=("queued", "running", "succeeded")
+    )
+    if not selected:
+        click.echo("No jobs to fetch.")
+        return
+
+    failed = 0
+    for job in wait_jobs([job["id"] for job in selected], timeout=timeout):
+        if job["status"] != "succeeded":
+            failed += 1
+            click.echo(f"{job['id']}\tFAILED\t{job['error'] or 'not finished'}")
+            continue
+        # Several results always go into a directory.
+        target = os.path.join(output, "") if len(selected) > 1 else output
+        path = resolve_output(target, job["image_id"], job["operation"], job["url"])
+        try:
+            download_image(job["url"], path)
+            click.echo(f"{job['id']}\tOK\t{path}")
+        except Exception as e:
+            failed += 1
+            click.echo(f"{job['id']}\tFAILED\t{e}")
+
+    if failed:
+        ctx.exit(1)
+
+
+@jobs.command()
+@click.option("--failed", "include_failed", is_flag=True,
+              help="Also forget failed jobs")
+def prune(include_failed):
+    """
+    Forget finished jobs.
+    """
+    statuses = ("succeeded", "failed") if include_failed else ("succeeded",)
+    click.echo(f"Removed {remove_jobs(statuses)} job(s)")
@@ -0,0 +1,145 @@
+"""
+Pipeline command.
+
+Chains several operations on one image in a single process, reusing
+one connection pool for every step.
+"""
+
+import click
+from pathlib import Path
+from ..fused import run_fused
+from ..operations import parse_step
+from ..pipeline import PipelineError, format_step, load_recipe, run_pipeline
+from ..preprocess import cover_edge
+from ..utilities import image_dimensions, validate_image_id
+from .basic import upload_file
+from .common import default_output_path, local_options, resolve_output, save_output
+
+
+def shrink_edge(path, steps):
+    """
+    Max edge to downscale an image file to before a pipeline uploads it.
+
+    Only a pipeline that starts with a resize is shrunk, to the smallest
+    size that still covers the resize target.
+
+    Returns:
+        int: Max edge in pixels, or None to upload the file as it is
+    """
+    if not steps or steps[0][0].name != "resize":
+        return None
+    dimensions = image_dimensions(path)
+    if dimensions[0] is None:
+        return None
+    params = steps[0][1]
+    edge = cover_edge(dimensions, (params["width"], params["height"]))
+    return edge if edge < max(dimensions) else None
+
+
+@click.command()
+@click.argument("image_id")
+@click.option("--step", "-s", "step_specs", multiple=True,
+              help="Operation spec, e.g. resize:w=800,h=600 (repeatable)")
+@click.option("--recipe", type=click.Path(exists=True, dir_okay=False),
+              help="JSON or YAML file listing the steps")
+@click.option("--reuse", is_flag=True,
+              help="Reuse results of identical earlier steps from the lineage")
+@click.option("--no-shrink", is_flag=True,
+              help="Upload an image file as it is, even if the first step is a resize")
+@local_options
+@click.pass_context
+def pipeline(ctx, image_id, step_specs, recipe, reuse, no_shrink, local, output):
+    """
+    Apply several operations to an image in one run.
+
+    IMAGE_ID: ID of the image to process, or an image file
+
+    An image file is uploaded first. If the first step is a resize, the
+    file is downscaled on this machine to the smallest size that still
+    covers the resize target, so far fewer bytes are sent.
+
+    Each step's output image becomes the next step's input. Steps from
+    --recipe run first, followed by any --step options.
+
+    With --local, all steps run on this machine in one fused pass: the
+    image is decoded once, foldable steps are combined and the result is
+    encoded once.
+
+    Example:
+
+        pxforge pipeline <image-id> -s resize:w=800,h=600 -s to-bw -s "watermark:text=Acme"
+    """
+    try:
+        steps = load_recipe(recipe) if recipe else []
+        steps += [parse_step(spec) for spec in step_specs]
+    except ValueError as e:
+        raise click.UsageError(str(e))
+
+    if not steps:
+        raise click.UsageError("Pass at least one --step or a --recipe")
+
+    if local:
+        run_local_pipeline(ctx, image_id, steps, output)
+        return
+
+    if Path(image_id).is_file():
+        max_edge = None if no_shrink else shrink_edge(image_id, steps)
+        try:
+            image_id, _ = upload_file(image_id, max_edge=max_edge)
+        except Exception as e:
+            click.echo(f"Failed to upload image: {e}", err=True)
+            ctx.exit(1)
+            return
+
+    if not validate_image_id(image_id):
+        click.echo(f"Error: Image ID {image_id} not found in registry", err=True)
+        return
+
+    def _report(index, step):
+        label = f"[{index + 1}/{len(steps)}] {format_step(step.operation, step.params)}"
+        if step.reused:
+            click.echo(f"{label}: reused earlier result")
+            return
+        click.echo(
+            f"{label}: {step.elapsed:.2f}s"
+            + (f" (+{step.handoff:.2f}s handoff)" if step.handoff else "")
+        )
+
+    click.echo(f"Running {len(steps)}-step pipeline on {image_id}...")
+    try:
+        results = run_pipeline(image_id, steps, on_step=_report, reuse=reuse)
+    except PipelineError as e:
+        click.echo(f"Pipeline failed at step {len(e.completed) + 1}: {e}", err=True)
+        ctx.exit(1)
+        return
+
+    total = sum(step.elapsed + step.handoff for step in results)
+    click.echo(f"Pipeline finished in {total:.2f}s")
+    click.echo(f"URL: {results[-1].image_url}")
+    if output and save_output(results[-1].image_url, output, image_id, "pipeline") is None:
+        ctx.exit(1)
+
+
+def run_local_pipeline(ctx, image, steps, output):
+    """
+    Run a pipeline locally in one fused pass and report stage timings.
+    """
+    if output:
+        output = resolve_output(output, image, "pipeline")
+    else:
+        output = default_output_path(image, "pipeline")
+    click.echo(f"Running {len(steps)}-step pipeline locally on {image}...")
+    try:
+        report = run_fused(image, steps, output)
+    except Exception as e:
+        click.echo(f"Local pipeline failed: {e}", err=True)
+        ctx.exit(1)
+        return
+
+    for stage in report.stages:
+        click.echo(f"  {stage.label}: {stage.elapsed * 1000:.1f} ms")
+    total = sum(stage.elapsed for stage in report.stages)
+    click.echo(f"Pipeline finished in {total * 1000:.1f} ms")
+    if report.peak_rss is not None:
+        click.echo(f"Peak memory: {report.peak_rss / (1024 * 1024):.1f} MB")
+    click.echo(f"Saved to {output}")
@@ -5,35 +5,41 @@ Provides commands for resizing, cropping, and rotating images.
 """
 
 import click
-from ..api_client import make_request
+from ..operations import run_operation
 from ..utilities import validate_image_id
+from .common import local_options, run_local_command, save_output
 
 
 @click.command()
 @click.argument("image_id")
 @click.option("--width", "-w", type=int, required=True, help="Target width in pixels")
 @click.option("--height", "-h", type=int, required=True, help="Target height in pixels")
-def resize(image_id, width, height):
+@local_options
+def resize(image_id, width, height, local, output):
     """
     Resize an image to specified dimensions.
 
-    IMAGE_ID: ID of the image to resize
+    IMAGE_ID: ID of the image to resize (or an image file with --local)
     """
+    if local:
+        run_local_command("resize", image_id, {"width": width, "height": height}, output)
+        return
+
     if not validate_image_id(image_id):
         click.echo(f"Error: Image ID {image_id} not found in registry", err=True)
         return
 
     try:
         click.echo(f"Resizing image to {width}x{height}...")
-        result = make_request(
-            "/resize",
-            data={"image_id": image_id, "width": width, "height": height}
+        result = run_operation(
+            "resize", image_id, {"width": width, "height": height}
         )
 
         if result.get("success"):
             url = result.get("image_url")
             click.echo("Image resized successfully!")
             click.echo(f"URL: {url}")
+            save_output(url, output, image_id, "resize")
         else:
             click.echo(f"Error: {result.get('error', 'Unknown error')}", err=True)
 
@@ -44,27 +50,30 @@ def resize(image_id, width, height):
 @click.command()
 @click.argument("image_id")
 @click.option("--ratio", "-r", required=True, help="Aspect ratio (e.g., 16:9, 4:3)")
-def aspect_ratio(image_id, ratio):
+@local_options
+def aspect_ratio(image_id, ratio, local, output):
     """
     Crop image to maintain specified aspect ratio.
 
-    IMAGE_ID: ID of the image to crop
+    IMAGE_ID: ID of the image to crop (or an image file with --local)
     """
+    if local:
+        run_local_command("aspect-ratio", image_id, {"ratio": ratio}, output)
+        return
+
     if not validate_image_id(image_id):
         click.echo(f"Error: Image ID {image_id} not found in registry", err=True)
         return
 
     try:
         click.echo(f"Applying aspect ratio {ratio}...")
-        result = make_request(
-            "/aspect-ratio",
-            data={"image_id": image_id, "aspect_ratio": ratio}
-        )
+        result = run_operation("aspect-ratio", image_id, {"ratio": ratio})
 
         if result.get("success"):
             url = result.get("image_url")
             click.echo("Aspect ratio applied successfully!")
             click.echo(f"URL: {url}")
+            save_output(url, output, image_id, "aspect-ratio")
         else:
             click.echo(f"Error: {result.get('error', 'Unknown error')}", err=True)
 
@@ -75,27 +84,30 @@ def aspect_ratio(image_id, ratio):
 @click.command()
 @click.argument("image_id")
 @click.option("--angle", "-a", type=int, required=True, help="Rotation angle in degrees")
-def rotate(image_id, angle):
+@local_options
+def rotate(image_id, angle, local, output):
     """
     Rotate an image by specified angle.
 
-    IMAGE_ID: ID of the image to rotate
+    IMAGE_ID: ID of the image to rotate (or an image file with --local)
     """
+    if local:
+        run_local_command("rotate", image_id, {"angle": angle}, output)
+        return
+
     if not validate_image_id(image_id):
         click.echo(f"Error: Image ID {image_id} not found in registry", err=True)
         return
 
     try:
         click.echo(f"Rotating image by {angle} degrees...")
-        result = make_request(
-            "/rotate",
-            data={"image_id": image_id, "angle": angle}
-        )
+        result = run_operation("rotate", image_id, {"angle": angle})
 
         if result.get("success"):
             url = result.get("image_url")
             click.echo("Image rotated successfully!")
             click.echo(f"URL: {url}")
+            save_output(url, output, image_id, "rotate")
         else:
             click.echo(f"Error: {result.get('error', 'Unknown error')}", err=True)
 
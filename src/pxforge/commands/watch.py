@@ -0,0 +1,204 @@
+"""
+Watch command.
+
+Ingests images dropped into a directory: each finished file is
+uploaded and run through a pipeline as soon as it appears.
+"""
+
+import os
+import signal
+import threading
+import time
+import click
+from pathlib import Path
+from ..api_client import DEFAULT_POOL_SIZE, PxForgeClient, set_client
+from ..config import get_config_dir
+from ..operations import parse_step
+from ..pipeline import load_recipe, run_pipeline
+from ..preprocess import prepare_image
+from ..tracing import MetricsExporter, get_tracer
+from ..utilities import add_image, count_watch_files, file_metadata, find_image_by_hash
+from ..watch import POLL_INTERVAL, SETTLE_SECONDS, watch_directory
+from .common import resolve_output
+from .pipeline import shrink_edge
+
+
+def ingest_file(path, steps, client, shrink=True):
+    """
+    Upload a file unless its content is already registered, then run steps.
+
+    Unlike the upload command this reports nothing, so it can run on
+    worker threads. Completed pipeline steps are reused from the lineage,
+    so a file interrupted part way through resumes where it stopped.
+
+    Args:
+        path (str): Image file
+        steps (list): (Operation, params) pairs, possibly empty
+        client (PxForgeClient): Client to use
+        shrink (bool): Downscale first if the first step is a resize
+
+    Returns:
+        tuple: (image ID, URL of the final result)
+    """
+    max_edge = shrink_edge(path, steps) if shrink else None
+    prepared = prepare_image(path, max_edge=max_edge) if max_edge else None
+    temp = str(prepared.path) if prepared and prepared.changed else None
+    source = temp or path
+
+    try:
+        metadata = file_metadata(source)
+        existing = find_image_by_hash(metadata["sha256"], client.base_url)
+        if existing:
+            image_id, url = existing["id"], existing["url"]
+        else:
+            result = client.upload_image(source, sha256=metadata["sha256"])
+            image_id, url = result.get("image_id"), result.get("image_url")
+            if temp:
+                source = str(get_config_dir() / "sources" / image_id)
+                os.replace(temp, source)
+                temp = None
+            add_image(image_id, path=source, url=url, metadata=metadata,
+                      base_url=client.base_url)
+    finally:
+        if temp:
+            os.remove(temp)
+
+    if steps:
+        url = run_pipeline(image_id, steps, client=client, reuse=True)[-1].image_url
+    return image_id, url
+
+
+@click.command()
+@click.argument("directory", type=click.Path(exists=True, file_okay=False))
+@click.option("--pipeline", "recipe", type=click.Path(exists=True, dir_okay=False),
+              help="JSON or YAML recipe to run on each new image")
+@click.option("--step", "-s", "step_specs", multiple=True,
+              help="Operation spec, e.g. resize:w=800,h=600 (repeatable)")
+@click.option("--output", "-o", type=click.Path(file_okay=False),
+              help="Download every result into this directory")
+@click.option("--workers", "-w", type=click.IntRange(1, 64), default=4, show_default=True,
+              help="Files processed at once")
+@click.option("--settle", type=click.FloatRange(0), default=SETTLE_SECONDS,
+              show_default=True,
+              help="Seconds a file must stay unchanged before it is taken")
+@click.option("--poll", "polling", is_flag=True,
+              help="Rescan the directory instead of using inotify")
+@click.option("--interval", type=click.FloatRange(0.1), default=POLL_INTERVAL,
+              show_default=True, help="Seconds between rescans when polling")
+@click.option("--once", is_flag=True,
+              help="Process what is in the directory now, then exit")
+@click.option("--no-shrink", is_flag=True,
+              help="Upload files as they are, even if the first step is a resize")
+@click.option("--metrics", "metrics_file", type=click.Path(dir_okay=False),
+              help="Export timing metrics to this file (.prom: Prometheus, else JSON lines)")
+@click.option("--metrics-interval", type=click.FloatRange(1), default=15, show_default=True,
+              help="Seconds between metrics exports")
+@click.pass_context
+def watch(ctx, directory, recipe, step_specs, output, workers, settle, polling, interval,
+          once, no_shrink, metrics_file, metrics_interval):
+    """
+    Upload and process images as they arrive in a directory.
+
+    DIRECTORY: Directory to watch (files directly inside it only)
+
+    New files are noticed with inotify where available, or by rescanning
+    every --interval seconds. A file is only taken once it has not
+    changed for --settle seconds, so copies still in progress are left
+    alone; hidden files and names ending in .part, .tmp, .crdownload and
+    similar are ignored. Each file is uploaded (or matched to an
+    identical earlier upload) and run through the --pipeline recipe and
+    any --step options, on a pool of --workers.
+
+    Progress is kept in a queue in the local registry. Stopping the
+    watcher (Ctrl-C or SIGTERM) lets files in flight finish; after a
+    crash or restart, interrupted files resume, files already processed
+    are skipped and files that arrived in the meantime are picked up. A
+    file that is modified later is processed again. Failed files are
+    retried with growing delays, up to 5 attempts.
+
+    Results are printed one tab-separated line per file.
+
+    With --metrics, time spent per file and in each upload, API call,
+    HTTP phase and registry query is exported every --metrics-interval
+    seconds: a .prom file is rewritten for Prometheus' textfile
+    collector, any other file gets a JSON line appended.
+
+    Example:
+
+        pxforge watch ~/Drops --pipeline thumbnails.yaml -o ~/Processed
+    """
+    try:
+        steps = load_recipe(recipe) if recipe else []
+        steps += [parse_step(spec) for spec in step_specs]
+    except ValueError as e:
+        raise click.UsageError(str(e))
+
+    directory = os.path.abspath(directory)
+    if output and os.path.abspath(output) == directory:
+        raise click.UsageError("--output must not be the watched directory")
+    if output:
+        Path(output).mkdir(parents=True, exist_ok=True)
+
+    client = PxForgeClient(pool_size=max(workers * 2, DEFAULT_POOL_SIZE))
+    set_client(client)
+
+    def _handle(entry):
+        path = entry["path"]
+        with get_tracer().span("watch file"):
+            image_id, url = ingest_file(path, steps, client, shrink=not no_shrink)
+            if output:
+                client.download_image(url, resolve_output(output, path, "pipeline", url))
+        return image_id, url
+
+    counts = {"done": 0, "failed": 0}
+
+    def _done(entry, error):
+        name = os.path.relpath(entry["path"], directory)
+        if error is None:
+            counts["done"] += 1
+            click.echo(f"{name}\tOK\t{entry['image_id']}\t{entry['url']}")
+        elif entry["status"] == "queued":
+            delay = entry["next_attempt_at"] - time.time()
+            click.echo(f"{name}\tRETRY\t{error} (in {delay:.0f}s)", err=True)
+        else:
+            counts["failed"] += 1
+            click.echo(f"{name}\tFAILED\t{error}")
+
+    stop = threading.Event()
+    previous = {}
+
+    def _stop(signum, frame):
+        if stop.is_set():
+            raise KeyboardInterrupt
+        click.echo("Stopping after files in progress finish...", err=True)
+        stop.set()
+
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        previous[signum] = signal.signal(signum, _stop)
+
+    exporter = None
+    if metrics_file:
+        exporter = MetricsExporter(metrics_file, interval=metrics_interval)
+        exporter.start()
+
+    described = f" through {len(steps)}-step pipeline" if steps else ""
+    click.echo(f"Watching {directory}{described} with {workers} worker(s)...", err=True)
+    try:
+        watch_directory(
+            directory, _handle, workers=workers, settle=settle, polling=polling,
+            interval=interval, once=once, stop=stop, on_done=_done
+        )
+    finally:
+        for signum, handler in previous.items():
+            signal.signal(signum, handler)
+        if exporter is not None:
+            exporter.stop()
+
+    queue = count_watch_files(directory)
+    click.echo(
+        f"Processed {counts['done']} file(s), {counts['failed']} failed; "
+        f"{queue['queued']} waiting to retry, {queue['done']} done in total",
+        err=True
+    )
+    if counts["failed"]:
+        ctx.exit(1)
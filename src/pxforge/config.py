@@ -31,3 +31,14 @@ def get_config_dir():
     config_dir = Path.home() / ".pxforge"
     config_dir.mkdir(parents=True, exist_ok=True)
     return config_dir
+
+
+def get_socket_path():
+    """
+    Get the Unix socket path of the resident daemon.
+
+    Returns:
+        str: Socket path (PXFORGE_SOCKET, or daemon.sock in the
+        configuration directory)
+    """
+    return os.environ.get("PXFORGE_SOCKET") or str(Path.home() / ".pxforge" / "daemon.sock")
@@ -0,0 +1,143 @@
+"""
+Pooled, instrumented HTTP connections for the API client.
+
+Kept apart from api_client because requests and urllib3 take longer to
+import than the rest of the CLI put together; they are loaded only when
+a client is created, not by commands that never talk to the server.
+"""
+
+import socket
+import threading
+import time
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+
+# Connect time is measured inside urllib3 on the thread that sends the
+# request, so it is accumulated per thread and collected after the call.
+_connect_state = threading.local()
+
+
+def _record_connect(duration: float):
+    _connect_state.seconds = getattr(_connect_state, "seconds", 0.0) + duration
+    _connect_state.count = getattr(_connect_state, "count", 0) + 1
+
+
+def _record_phase(phase: str, duration: float):
+    phases = getattr(_connect_state, "phases", None)
+    if phases is None:
+        phases = _connect_state.phases = {}
+    phases[phase] = phases.get(phase, 0.0) + duration
+
+
+def take_connect_time():
+    """
+    Collect the connect time recorded on this thread since the last call.
+
+    Returns:
+        tuple: (seconds spent connecting, number of new connections)
+    """
+    seconds = getattr(_connect_state, "seconds", 0.0)
+    count = getattr(_connect_state, "count", 0)
+    _connect_state.seconds = 0.0
+    _connect_state.count = 0
+    return seconds, count
+
+
+def take_phase_times():
+    """
+    Collect the request phases timed on this thread since the last call.
+
+    Returns:
+        dict: Seconds spent per phase: "connect" (DNS lookup and TCP
+        handshake; urllib3 resolves inside the same call), "tls" and
+        "send" (writing the request line, headers and body)
+    """
+    phases = getattr(_connect_state, "phases", None) or {}
+    _connect_state.phases = {}
+    return phases
+
+
+class _TimedConnection:
+    """Mixin timing connection setup and request sending."""
+
+    def connect(self):
+        start = time.perf_counter()
+        self._socket_seconds = 0.0
+        try:
+            super().connect()
+        finally:
+            elapsed = time.perf_counter() - start
+            self._connect_seconds = getattr(self, "_connect_seconds", 0.0) + elapsed
+            _record_connect(elapsed)
+            _record_phase("connect", self._socket_seconds)
+            if isinstance(self, HTTPSConnection):
+                _record_phase("tls", max(elapsed - self._socket_seconds, 0.0))
+
+    def _new_conn(self):
+        start = time.perf_counter()
+        try:
+            return super()._new_conn()
+        finally:
+            self._socket_seconds = time.perf_counter() - start
+
+    def request(self, *args, **kwargs):
+        # Plain HTTP connections are opened by the first request.
+        connecting = getattr(self, "_connect_seconds", 0.0)
+        start = time.perf_counter()
+        try:
+            return super().request(*args, **kwargs)
+        finally:
+            connecting = getattr(self, "_connect_seconds", 0.0) - connecting
+            _record_phase("send", max(time.perf_counter() - start - connecting, 0.0))
+
+
+class _TimedHTTPConnection(_TimedConnection, HTTPConnection):
+    pass
+
+
+class _TimedHTTPSConnection(_TimedConnection, HTTPSConnection):
+    pass
+
+
+class _TimedHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = _TimedHTTPConnection
+
+
+class _TimedHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = _TimedHTTPSConnection
+
+
+class PooledAdapter(HTTPAdapter):
+    """
+    HTTP adapter with TCP keep-alive and connect-time instrumentation.
+
+    Idle pooled sockets get SO_KEEPALIVE so intermediaries do not drop
+    them silently between commands of a long-running batch.
+    """
+
+    def init_poolmanager(self, connections, maxsize, block=False, **pool_kwargs):
+        pool_kwargs.setdefault(
+            "socket_options",
+            HTTPConnection.default_socket_options + [
+                (socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+            ]
+        )
+        super().init_poolmanager(connections, maxsize, block=block, **pool_kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            "http": _TimedHTTPConnectionPool,
+            "https": _TimedHTTPSConnectionPool,
+        }
+
+
+def new_session(pool_size: int) -> requests.Session:
+    """
+    Create a session that keeps up to pool_size connections per host.
+    """
+    session = requests.Session()
+    adapter = PooledAdapter(pool_connections=1, pool_maxsize=pool_size)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
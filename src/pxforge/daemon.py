@@ -0,0 +1,349 @@
+"""
+Resident process that runs CLI commands sent over a Unix socket.
+
+Starting a pxforge process imports the CLI, opens the registry and
+connects to the server before any work is done. The daemon pays that
+once and keeps the pooled connections, registry and result cache
+connections open; the pxforge front end (see frontend.py) forwards
+each command to it, so a command costs about one socket round trip
+plus its own work.
+
+Protocol: the front end sends one JSON line, either a command
+({"args": [...], "cwd": ..., "env": {...}, "tty": [stdout, stderr],
+"columns": n}) or a control request ({"control": "status" | "stop"}).
+The daemon answers with JSON lines: {"out": text} and {"err": text}
+while the command runs, then {"exit": code}. If the front end's
+environment differs from the daemon's, or the daemon is busy with
+another command, it answers {"error": ...} without running anything
+and the front end runs the command itself. A front end that hangs up
+before the exit status cancels its command.
+"""
+
+import io
+import json
+import os
+import queue
+import signal
+import socket
+import socketserver
+import sys
+import threading
+import time
+from typing import Dict, List, Optional
+from .config import get_socket_path
+from .frontend import command_environment
+
+
+class DaemonError(Exception):
+    """Raised when the daemon cannot be reached or refuses a request."""
+
+
+def run_command(args: List[str]) -> int:
+    """
+    Run a pxforge command line in this process.
+
+    Settings that global options change (--no-cache, --cache-bytes) and
+    the shared client's timing counters are reset first, so commands
+    run one after another behave as if each had its own process.
+
+    Args:
+        args: Arguments after "pxforge"
+
+    Returns:
+        int: Exit status
+    """
+    from .api_client import get_client
+    from .cache import reset_cache_settings
+    from .cli import cli
+
+    reset_cache_settings()
+    client = get_client(create=False)
+    if client is not None:
+        client.reset_stats()
+    try:
+        cli.main(args=args, prog_name="pxforge")
+    except SystemExit as e:
+        if e.code is None or isinstance(e.code, int):
+            return e.code or 0
+        print(e.code, file=sys.stderr)
+        return 1
+    return 0
+
+
+class _Relay(io.TextIOBase):
+    """Text stream that sends what is written to the front end."""
+
+    def __init__(self, send, key: str, tty: bool):
+        self._send = send
+        self._key = key
+        self._tty = tty
+
+    @property
+    def encoding(self):
+        return "utf-8"
+
+    def writable(self):
+        return True
+
+    def isatty(self):
+        return self._tty
+
+    def write(self, text):
+        # click writes bytes when it wraps a stream it takes for binary.
+        if isinstance(text, (bytes, bytearray)):
+            text = bytes(text).decode("utf-8", "replace")
+        if text:
+            self._send({self._key: text})
+        return len(text)
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    def handle(self):
+        try:
+            request = json.loads(self.rfile.readline())
+        except ValueError:
+            return
+        lock = threading.Lock()
+        closed = False
+
+        def _send(message):
+            with lock:
+                if closed:
+                    raise BrokenPipeError("the front end has hung up")
+                self.wfile.write(json.dumps(message).encode() + b"\n")
+                self.wfile.flush()
+
+        control = request.get("control")
+        if control == "status":
+            _send(self.server.status())
+        elif control == "stop":
+            _send({"stopping": True})
+            threading.Thread(target=self.server.shutdown).start()
+        elif request.get("env") != self.server.env:
+            _send({"error": "environment differs from the daemon's"})
+        else:
+            command = self.server.submit(request, _send)
+            if command is None:
+                _send({"error": "the daemon is busy"})
+                return
+            # The front end sends nothing more and hangs up once it has
+            # the exit status; hanging up earlier (Ctrl-C, or its output
+            # closed) cancels the command.
+            try:
+                self.connection.recv(1)
+            except OSError:
+                pass
+            self.server.cancel(command)
+            # The command may still be running; its output goes nowhere
+            # once the connection is closed.
+            with lock:
+                closed = True
+
+
+class _Command:
+    """A forwarded command line, queued for or running on the main thread."""
+
+    def __init__(self, request, send):
+        self.request = request
+        self.send = send
+        self.cancelled = False
+        self.finished = False
+
+
+class DaemonServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """
+    Unix socket server that runs forwarded commands.
+
+    Connections are accepted on a background thread; serve() runs the
+    commands on the main thread, one at a time, since the working
+    directory and standard streams every command uses are process-wide.
+    A command sent while another is queued or running is refused, so
+    its front end runs it in its own process instead of waiting. A
+    command whose front end hangs up is interrupted with SIGINT, as
+    Ctrl-C would interrupt it in a process of its own.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, path: str):
+        self.path = path
+        self.env = command_environment()
+        self.started = time.time()
+        self.commands = 0
+        # Reentrant: the SIGINT handler takes it on the main thread.
+        self._lock = threading.RLock()
+        self._queue: "queue.Queue[Optional[_Command]]" = queue.Queue()
+        self._pending: Optional[_Command] = None
+        self._current: Optional[_Command] = None
+        self._interrupts = 0
+        super().__init__(path, _Handler)
+        os.chmod(path, 0o600)
+
+    def warm_up(self):
+        """Import every command and open connections ahead of the first command."""
+        from .api_client import get_client
+        from .cache import get_result_cache
+        from .cli import cli
+        from .utilities import connect
+
+        for name in cli.list_commands(None):
+            cli.get_command(None, name)
+        connect()
+        get_result_cache()
+        get_client().warm_up()
+
+    def status(self) -> Dict[str, object]:
+        return {
+            "pid": os.getpid(), "socket": self.path, "commands": self.commands,
+            "uptime": time.time() - self.started,
+        }
+
+    def submit(self, request, send) -> Optional[_Command]:
+        """
+        Queue a command for the main thread.
+
+        Returns:
+            _Command: The queued command, or None if the daemon is busy
+        """
+        with self._lock:
+            if self._pending is not None:
+                return None
+            command = self._pending = _Command(request, send)
+        self._queue.put(command)
+        return command
+
+    def cancel(self, command: _Command):
+        """Interrupt command if it has not finished yet."""
+        with self._lock:
+            if command.finished or command.cancelled:
+                return
+            command.cancelled = True
+            self._interrupts += 1
+        signal.pthread_kill(threading.main_thread().ident, signal.SIGINT)
+
+    def _on_sigint(self, signum, frame):
+        with self._lock:
+            if not self._interrupts:
+                # Ctrl-C on the daemon itself.
+                raise KeyboardInterrupt
+            self._interrupts -= 1
+            command = self._current
+        # A cancellation that arrives after its command finished is dropped.
+        if command is not None and command.cancelled:
+            raise KeyboardInterrupt
+
+    def serve(self):
+        """
+        Accept connections and run the commands they send until shutdown().
+
+        Must be called from the main thread.
+        """
+        thread = threading.Thread(target=self.serve_forever, name="daemon-accept", daemon=True)
+        thread.start()
+        previous = signal.signal(signal.SIGINT, self._on_sigint)
+        try:
+            while True:
+                command = self._queue.get()
+                if command is None:
+                    break
+                self._execute(command)
+        finally:
+            signal.signal(signal.SIGINT, previous)
+            super().shutdown()
+
+    def shutdown(self):
+        super().shutdown()
+        self._queue.put(None)
+
+    def _execute(self, command: _Command):
+        with self._lock:
+            self._current = command
+        try:
+            code = 130 if command.cancelled else self.run(command.request, command.send)
+        except KeyboardInterrupt:
+            if not command.cancelled:
+                raise
+            code = 130
+        finally:
+            with self._lock:
+                command.finished = True
+                self._current = self._pending = None
+        try:
+            command.send({"exit": code})
+        except OSError:
+            pass
+
+    def run(self, request, send) -> int:
+        self.commands += 1
+        tty = request.get("tty") or [False, False]
+        streams = sys.stdout, sys.stderr, sys.stdin
+        columns = os.environ.get("COLUMNS")
+        sys.stdout = _Relay(send, "out", tty[0])
+        sys.stderr = _Relay(send, "err", tty[1])
+        sys.stdin = io.StringIO()
+        if request.get("columns"):
+            os.environ["COLUMNS"] = str(request["columns"])
+        try:
+            os.chdir(request["cwd"])
+            return run_command(request["args"])
+        except Exception as e:
+            try:
+                send({"err": f"pxforge daemon: {e}\n"})
+            except OSError:
+                pass
+            return 1
+        finally:
+            sys.stdout, sys.stderr, sys.stdin = streams
+            if columns is None:
+                os.environ.pop("COLUMNS", None)
+            else:
+                os.environ["COLUMNS"] = columns
+
+    def server_close(self):
+        super().server_close()
+        try:
+            os.unlink(self.path)
+        except FileNotFoundError:
+            pass
+
+
+def open_server(path: Optional[str] = None) -> DaemonServer:
+    """
+    Bind the daemon socket, replacing a stale one.
+
+    Raises:
+        DaemonError: If a daemon is already listening on the socket
+    """
+    path = path or get_socket_path()
+    if os.path.exists(path):
+        probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            probe.connect(path)
+        except OSError:
+            os.unlink(path)
+        else:
+            raise DaemonError(f"A daemon is already listening on {path}")
+        finally:
+            probe.close()
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    return DaemonServer(path)
+
+
+def control(request: str, path: Optional[str] = None) -> Dict[str, object]:
+    """
+    Send a control request ("status" or "stop") to a running daemon.
+
+    Returns:
+        dict: The daemon's reply
+
+    Raises:
+        DaemonError: If no daemon is listening
+    """
+    path = path or get_socket_path()
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.connect(path)
+            sock.sendall(json.dumps({"control": request}).encode() + b"\n")
+            return json.loads(sock.makefile("rb").readline())
+    except (OSError, ValueError):
+        raise DaemonError(f"No daemon is listening on {path}")
@@ -0,0 +1,118 @@
+"""
+Entry point of the pxforge command.
+
+When a daemon is running (pxforge daemon), the command line is sent to
+it over its Unix socket and its output relayed, which skips importing
+the CLI and connecting to the server. Otherwise, or for commands that
+must run here, the CLI runs in this process. Only the standard library
+modules needed to talk to the socket are imported before that choice.
+"""
+
+import json
+import os
+import socket
+import sys
+from .config import get_socket_path
+
+
+# Commands that are never forwarded: they manage the daemon, are
+# interactive, or run indefinitely.
+LOCAL_COMMANDS = ("daemon", "shell", "watch")
+
+# Environment variables that change what a command does. A command is
+# only forwarded to a daemon started with the same values.
+_ENV_PREFIX = "PXFORGE_"
+_ENV_KEYS = ("HOME",)
+_ENV_IGNORED = ("PXFORGE_SOCKET", "PXFORGE_NO_DAEMON")
+
+
+def command_environment():
+    """The environment variables a daemon and its front end must agree on."""
+    return {
+        key: value for key, value in os.environ.items()
+        if (key.startswith(_ENV_PREFIX) or key in _ENV_KEYS) and key not in _ENV_IGNORED
+    }
+
+
+def _should_forward(args):
+    if os.environ.get("PXFORGE_NO_DAEMON"):
+        return False
+    # Global options are flags, so the first other argument is the command.
+    command = next((arg for arg in args if not arg.startswith("-")), None)
+    # "-" (also as --option=-) reads a file from stdin, which the daemon
+    # does not see; --profile should profile this process rather than
+    # the daemon.
+    return (
+        command is not None and command not in LOCAL_COMMANDS
+        and not any(arg == "-" or arg.endswith("=-") for arg in args)
+        and "--profile" not in args
+    )
+
+
+def forward(args, path=None):
+    """
+    Run a command line on the daemon, relaying its output.
+
+    Args:
+        args: Arguments after "pxforge"
+        path: Socket path (defaults to get_socket_path())
+
+    Returns:
+        int: The command's exit status, or None if no daemon took the
+        command and it should run locally
+    """
+    path = path or get_socket_path()
+    if not os.path.exists(path):
+        return None
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(path)
+    except OSError:
+        sock.close()
+        return None
+
+    try:
+        columns = os.get_terminal_size(sys.stdout.fileno()).columns
+    except (OSError, ValueError):
+        columns = None
+    request = {
+        "args": args,
+        "cwd": os.getcwd(),
+        "env": command_environment(),
+        "tty": [sys.stdout.isatty(), sys.stderr.isatty()],
+        "columns": columns,
+    }
+    with sock, sock.makefile("rb") as replies:
+        sock.sendall(json.dumps(request).encode() + b"\n")
+        for line in replies:
+            message = json.loads(line)
+            if "out" in message:
+                sys.stdout.write(message["out"])
+                sys.stdout.flush()
+            elif "err" in message:
+                sys.stderr.write(message["err"])
+                sys.stderr.flush()
+            elif "exit" in message:
+                return message["exit"]
+            elif "error" in message:
+                return None
+    sys.stderr.write("pxforge: lost connection to the daemon\n")
+    return 1
+
+
+def main():
+    args = sys.argv[1:]
+    if _should_forward(args):
+        try:
+            code = forward(args)
+        except KeyboardInterrupt:
+            sys.exit(130)
+        except BrokenPipeError:
+            # The reader went away (e.g. "| head"); silence the final flush.
+            os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+            sys.exit(1)
+        if code is not None:
+            sys.exit(code)
+
+    from .cli import cli
+    cli(prog_name="pxforge")
@@ -0,0 +1,246 @@
+"""
+Fused local pipeline execution.
+
+Runs a chain of local operations with a single decode and a single
+encode. Adjacent steps are folded together: aspect-ratio crops and
+resizes collapse into one resample of the source region, and runs of
+contrast/brightness collapse into one lookup table that reproduces the
+step-by-step result exactly; on color images each contrast step costs
+one extra pass to measure the mean luma it blends towards.
+"""
+
+import sys
+import time
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+from .local_ops import (
+    BRIGHTNESS_FACTOR, CONTRAST_FACTOR, LOCAL_OPERATIONS,
+    apply_operation, crop_box_for_ratio, require_pillow, resolve_source, save_image
+)
+from .operations import Operation
+
+try:
+    import resource
+except ImportError:  # pragma: no cover - not available on Windows
+    resource = None
+
+
+GEOMETRY_OPERATIONS = ("resize", "aspect-ratio")
+POINT_OPERATIONS = ("contrast", "brightness")
+
+# Modes whose bands are plain 8-bit channels that a lookup table can map.
+LUT_MODES = ("L", "LA", "RGB", "RGBA")
+
+
+class Stage(NamedTuple):
+    """
+    A unit of fused work: one or more folded steps of the same kind.
+    """
+
+    kind: str
+    steps: Tuple[Tuple[str, Dict[str, Any]], ...]
+
+    @property
+    def label(self) -> str:
+        return "+".join(name for name, _ in self.steps)
+
+
+class StageTiming(NamedTuple):
+    """Wall time of a fused stage, in seconds."""
+
+    label: str
+    elapsed: float
+
+
+class FusedReport(NamedTuple):
+    """
+    Timings and memory of a fused run.
+
+    peak_rss is the process's resident set high-water mark in bytes, or
+    None where the platform does not report it.
+    """
+
+    stages: List[StageTiming]
+    peak_rss: Optional[int]
+
+
+def plan_stages(steps: List[Tuple[Operation, Dict[str, Any]]]) -> List[Stage]:
+    """
+    Group consecutive foldable steps into stages.
+
+    Args:
+        steps: (Operation, params) pairs, all runnable locally
+
+    Returns:
+        list: Stages in execution order
+
+    Raises:
+        ValueError: If a step cannot run locally
+    """
+    stages = []
+    for operation, params in steps:
+        if operation.name not in LOCAL_OPERATIONS:
+            raise ValueError(f"Operation '{operation.name}' cannot run locally")
+
+        if operation.name in GEOMETRY_OPERATIONS:
+            kind = "geometry"
+        elif operation.name in POINT_OPERATIONS:
+            kind = "lut"
+        else:
+            kind = operation.name
+
+        step = (operation.name, params)
+        if stages and kind in ("geometry", "lut") and stages[-1].kind == kind:
+            stages[-1] = Stage(kind, stages[-1].steps + (step,))
+        else:
+            stages.append(Stage(kind, (step,)))
+    return stages
+
+
+def _apply_geometry(image, steps):
+    """
+    Apply crops and resizes as a single resample of the source region.
+    """
+    Image = require_pillow()
+
+    # Track the region of the source image still in play and the size it
+    # will finally be rendered at.
+    left, top, right, bottom = 0.0, 0.0, float(image.width), float(image.height)
+    width, height = image.size
+
+    for name, params in steps:
+        if name == "resize":
+            width, height = params["width"], params["height"]
+        else:
+            box = crop_box_for_ratio((width, height), params["ratio"])
+            scale_x = (right - left) / width
+            scale_y = (bottom - top) / height
+            left, top, right, bottom = (
+                left + box[0] * scale_x,
+                top + box[1] * scale_y,
+                left + box[2] * scale_x,
+                top + box[3] * scale_y,
+            )
+            width, height = box[2] - box[0], box[3] - box[1]
+
+    box = (left, top, right, bottom)
+    exact = all(float(v).is_integer() for v in box)
+    if exact and (right - left, bottom - top) == (width, height):
+        return image.crop(tuple(int(v) for v in box))
+    return image.resize((width, height), Image.LANCZOS, box=box)
+
+
+def _channel_mean(histogram, lut):
+    total = sum(histogram)
+    if not total:
+        return 0.0
+    return sum(lut[value] * count for value, count in enumerate(histogram)) / total
+
+
+def _luma_mean(image, luts, color_bands, histograms):
+    """
+    Mean of the L conversion of image mapped through luts, as
+    ImageEnhance.Contrast measures it.
+    """
+    if len(color_bands) == 1:
+        # A single gray band is its own L conversion.
+        return _channel_mean(histograms[color_bands[0]], luts[color_bands[0]])
+    # Luma is rounded per pixel, so the mean of L is not the luma of the
+    # channel means; it takes a pass over the mapped pixels.
+    if any(lut != list(range(256)) for lut in luts):
+        image = image.point([v for lut in luts for v in lut])
+    return _channel_mean(image.convert("L").histogram(), range(256))
+
+
+def _apply_luts(image, steps):
+    """
+    Apply contrast/brightness steps as one composed lookup table.
+
+    Each step is evaluated exactly as Pillow's ImageEnhance blend would
+    on the output of the previous step. Contrast needs the mean luma of
+    its input: for a gray image it is derived from the source histogram
+    pushed through the tables composed so far, while a color image
+    takes one extra pass per contrast step to measure it.
+    """
+    if image.mode not in LUT_MODES:
+        for name, params in steps:
+            image = apply_operation(image, name, params)
+        return image
+
+    bands = image.getbands()
+    color_bands = [i for i, band in enumerate(bands) if band != "A"]
+    histogram = image.histogram()
+    histograms = [histogram[i * 256:(i + 1) * 256] for i in range(len(bands))]
+    luts = [list(range(256)) for _ in bands]
+
+    for name, _ in steps:
+        if name == "contrast":
+            factor = CONTRAST_FACTOR
+            degenerate = int(_luma_mean(image, luts, color_bands, histograms) + 0.5)
+        else:
+            factor = BRIGHTNESS_FACTOR
+            degenerate = 0
+
+        table = []
+        for value in range(256):
+            blended = degenerate + factor * (value - degenerate)
+            table.append(0 if blended <= 0 else 255 if blended >= 255 else int(blended))
+        for i in color_bands:
+            luts[i] = [table[v] for v in luts[i]]
+
+    return image.point([v for lut in luts for v in lut])
+
+
+def run_fused(
+    image: str,
+    steps: List[Tuple[Operation, Dict[str, Any]]],
+    output_path: str
+) -> FusedReport:
+    """
+    Run local steps with one decode and one encode.
+
+    Args:
+        image: Image file path or registered image ID
+        steps: (Operation, params) pairs, all runnable locally
+        output_path: Where to write the result
+
+    Returns:
+        FusedReport: Per-stage timings and peak memory
+
+    Raises:
+        ValueError: If a step cannot run locally
+    """
+    Image = require_pillow()
+    stages = plan_stages(steps)
+    timings = []
+
+    start = time.perf_counter()
+    # A stage may return the source itself, so it stays open until the
+    # result is encoded.
+    with Image.open(resolve_source(image)) as source:
+        source.load()
+        current = source
+        timings.append(StageTiming("decode", time.perf_counter() - start))
+
+        for stage in stages:
+            start = time.perf_counter()
+            if stage.kind == "geometry":
+                current = _apply_geometry(current, stage.steps)
+            elif stage.kind == "lut":
+                current = _apply_luts(current, stage.steps)
+            else:
+                name, params = stage.steps[0]
+                current = apply_operation(current, name, params)
+            timings.append(StageTiming(stage.label, time.perf_counter() - start))
+
+        start = time.perf_counter()
+        save_image(current, output_path)
+        timings.append(StageTiming("encode", time.perf_counter() - start))
+
+    peak_rss = None
+    if resource is not None:
+        # ru_maxrss is reported in kilobytes on Linux and bytes on macOS
+        peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        if sys.platform != "darwin":
+            peak_rss *= 1024
+
+    return FusedReport(timings, peak_rss)
@@ -0,0 +1,353 @@
+"""
+Asynchronous jobs for long-running operations.
+
+Operations are submitted with "Prefer: respond-async". A server that
+supports it answers with a job ID, and the job is polled at
+/jobs/<id> with exponential backoff until it finishes, so no
+connection is held open while the model runs. A server without job
+support answers synchronously, after the operation has run. Until a
+server has answered with a job ID once, which the registry remembers,
+submissions to it are therefore queued locally and sent by a detached
+worker process (python -m pxforge.jobs) instead of blocking the
+caller; the worker records each job ID or finished result. Jobs are
+kept in the registry, so thousands of them can be tracked and waited
+on from one lightweight process.
+"""
+
+import random
+import subprocess
+import sys
+import time
+import uuid
+import requests
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
+from .api_client import PxForgeClient, get_client
+from .operations import build_params, get_operation, record_operation, send_operation
+from .singleflight import Lease
+from .utilities import add_job, get_counter, get_job, query_jobs, set_counter, update_job
+
+
+POLL_INITIAL = 1.0
+POLL_MAX = 30.0
+POLL_JITTER = 0.1
+POLL_TIMEOUT = 30
+POLL_WORKERS = 8
+
+FINISHED = ("succeeded", "failed")
+
+# Lease held by the one running local worker.
+WORKER_LEASE = "job-worker"
+
+Job = Dict[str, Any]
+
+
+def poll_delay(polls: int) -> float:
+    """
+    Seconds to wait before the next poll of a job polled `polls` times.
+
+    The delay doubles with each poll up to POLL_MAX, with a little
+    jitter so jobs submitted together do not poll in lockstep.
+    """
+    delay = min(POLL_INITIAL * 2 ** polls, POLL_MAX)
+    return delay * random.uniform(1 - POLL_JITTER, 1 + POLL_JITTER)
+
+
+def _apply_result(job: Job, result: Dict[str, Any]):
+    if result.get("success") and result.get("image_url"):
+        operation = get_operation(job["operation"])
+        record_operation(operation, job["image_id"], job["params"], result)
+        job.update(
+            status="succeeded", url=result["image_url"],
+            result_image_id=result.get("image_id")
+        )
+    else:
+        job.update(status="failed", error=result.get("error", "Unknown error"))
+
+
+def _job_support(base_url: str) -> Optional[bool]:
+    """Whether a server accepts async jobs, or None if not yet known."""
+    value = get_counter(f"job-support {base_url}")
+    return None if value == 0 else value > 0
+
+
+def _send_job(job: Job, client: PxForgeClient):
+    """
+    Send a job's operation and record the server's answer in job.
+    """
+    result = send_operation(
+        get_operation(job["operation"]), job["image_id"], job["params"], client,
+        headers={"Prefer": "respond-async"}
+    )
+    job["remote_id"] = result.get("job_id")
+    supported = bool(job["remote_id"])
+    if _job_support(client.base_url) is not supported:
+        set_counter(f"job-support {client.base_url}", 1 if supported else -1)
+    if supported:
+        job["status"] = result["status"] if result.get("status") in ("queued", "running") \
+            else "queued"
+    else:
+        _apply_result(job, result)
+
+
+def submit_job(
+    name: str,
+    image_id: str,
+    params: Optional[Dict[str, Any]] = None,
+    client: Optional[PxForgeClient] = None
+) -> Job:
+    """
+    Submit an operation as a job and record it locally.
+
+    Returns at once: a server not known to accept jobs might run the
+    operation before answering, so the job is queued for the local
+    worker (see start_worker) instead.
+
+    Args:
+        name: Operation name
+        image_id: ID of the image to process
+        params: Operation parameters keyed by name or short alias
+        client: Client to use (defaults to the shared client)
+
+    Returns:
+        dict: The recorded job
+
+    Raises:
+        ValueError: If the operation or parameters are invalid
+        requests.RequestException: If the submission fails
+    """
+    operation = get_operation(name)
+    params = build_params(operation, params or {})
+    client = client or get_client()
+
+    now = time.time()
+    job = {
+        "id": uuid.uuid4().hex[:12],
+        "remote_id": None,
+        "base_url": client.base_url,
+        "operation": operation.name,
+        "image_id": image_id,
+        "params": params,
+        "status": "queued",
+        "error": None,
+        "polls": 0,
+        "next_poll_at": now + poll_delay(0),
+        "submitted_at": now,
+        "updated_at": now,
+    }
+    if _job_support(client.base_url):
+        _send_job(job, client)
+        add_job(job)
+    else:
+        add_job(job)
+        start_worker()
+    return job
+
+
+def start_worker():
+    """
+    Start a detached worker for locally queued jobs, unless one is running.
+    """
+    lease = Lease(WORKER_LEASE, 0)
+    lease.acquire()
+    running = not lease.held
+    lease.release()
+    if not running:
+        subprocess.Popen(
+            [sys.executable, "-m", "pxforge.jobs"],
+            stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+            start_new_session=True
+        )
+
+
+def _run_local(job: Job, client: PxForgeClient):
+    update_job(job["id"], status="running")
+    try:
+        _send_job(job, client)
+    except Exception as e:
+        job.update(status="failed", error=f"Submission failed: {e}")
+    update_job(
+        job["id"],
+        **{key: job.get(key) for key in ("remote_id", "status", "url", "result_image_id", "error")}
+    )
+
+
+def run_worker():
+    """
+    Send locally queued jobs until none are left.
+
+    Only one worker runs at a time; another one exits at once. Jobs a
+    worker had taken when it died are sent again by the next one.
+    """
+    lease = Lease(WORKER_LEASE, 0)
+    lease.acquire()
+    if not lease.held:
+        return
+    clients: Dict[str, PxForgeClient] = {}
+    try:
+        with ThreadPoolExecutor(max_workers=POLL_WORKERS) as pool:
+            while True:
+                jobs = query_jobs(statuses=("queued", "running"), local=True)
+                if not jobs:
+                    lease.release()
+                    # A job queued while the lease was held started no
+                    # worker; take the lease back for it.
+                    if not query_jobs(statuses=("queued",), local=True, limit=1):
+                        break
+                    lease.acquire()
+                    if not lease.held:
+                        break
+                    continue
+                for job in jobs:
+                    if job["base_url"] not in clients:
+                        clients[job["base_url"]] = PxForgeClient(base_url=job["base_url"])
+                list(pool.map(lambda job: _run_local(job, clients[job["base_url"]]), jobs))
+    finally:
+        lease.release()
+        for client in clients.values():
+            client.close()
+
+
+def _save_poll(job: Job):
+    update_job(
+        job["id"],
+        **{key: job.get(key) for key in (
+            "status", "url", "result_image_id", "error", "polls", "next_poll_at"
+        )}
+    )
+
+
+def poll_job(job: Job, client: Optional[PxForgeClient] = None) -> Job:
+    """
+    Check a job's status on the server once and record it.
+
+    Network errors do not fail the job; it is polled again later. A job
+    the server no longer knows about is marked failed. The job is always
+    polled on the server it was sent to, with a client of its own if the
+    given one is for another server.
+
+    Args:
+        job: Job to poll
+        client: Client to use (defaults to the shared client)
+
+    Returns:
+        dict: The updated job
+    """
+    if job["status"] in FINISHED:
+        return job
+    if not job["remote_id"]:
+        # Not sent yet: the local worker records its progress.
+        job.update(get_job(job["id"]) or {})
+        if job["status"] in FINISHED:
+            return job
+        if not job["remote_id"]:
+            start_worker()
+            job["polls"] += 1
+            job["next_poll_at"] = time.time() + poll_delay(job["polls"])
+            update_job(job["id"], polls=job["polls"], next_poll_at=job["next_poll_at"])
+            return job
+    client = client or get_client()
+    if client.base_url != job["base_url"]:
+        own = PxForgeClient(base_url=job["base_url"])
+        try:
+            return poll_job(job, own)
+        finally:
+            own.close()
+
+    try:
+        status = client.request(
+            f"/jobs/{job['remote_id']}", method="GET", timeout=POLL_TIMEOUT
+        )
+    except requests.HTTPError as e:
+        if e.response is not None and e.response.status_code == 404:
+            job.update(status="failed", error="Job no longer exists on the server")
+        status = {}
+    except requests.RequestException:
+        status = {}
+
+    state = status.get("status")
+    if state == "succeeded":
+        _apply_result(job, status.get("result") or status)
+    elif state == "failed":
+        job.update(status="failed", error=status.get("error", "Unknown error"))
+    elif state in ("queued", "running"):
+        job["status"] = state
+
+    job["polls"] += 1
+    job["next_poll_at"] = time.time() + poll_delay(job["polls"])
+    _save_poll(job)
+    return job
+
+
+def wait_jobs(
+    job_ids: List[str],
+    client: Optional[PxForgeClient] = None,
+    timeout: Optional[float] = None,
+    on_finish: Optional[Callable[[Job], None]] = None
+) -> List[Job]:
+    """
+    Poll jobs until they finish or the timeout passes.
+
+    Only jobs whose next poll is due are polled, on a small worker pool,
+    and the loop sleeps until the next one is due, so waiting on many
+    jobs costs little more than waiting on one. Each job is polled on the
+    server it was sent to.
+
+    Args:
+        job_ids: Local IDs of the jobs to wait for
+        client: Client for jobs sent to its server (defaults to the
+            shared client)
+        timeout: Give up after this many seconds (None waits forever)
+        on_finish: Called with each job as it finishes
+
+    Returns:
+        list: The jobs in their latest state, in the order given
+    """
+    client = client or get_client()
+    deadline = time.time() + timeout if timeout is not None else None
+
+    jobs = [get_job(job_id) for job_id in job_ids]
+    pending = {}
+    for job in jobs:
+        if job is None:
+            continue
+        if job["status"] in FINISHED:
+            if on_finish:
+                on_finish(job)
+        else:
+            pending[job["id"]] = job
+
+    clients: Dict[str, PxForgeClient] = {client.base_url: client}
+    for job in pending.values():
+        if job["base_url"] not in clients:
+            clients[job["base_url"]] = PxForgeClient(base_url=job["base_url"])
+    try:
+        with ThreadPoolExecutor(max_workers=POLL_WORKERS) as pool:
+            while pending:
+                now = time.time()
+                due = [job for job in pending.values() if job["next_poll_at"] <= now]
+                polled = pool.map(lambda job: poll_job(job, clients[job["base_url"]]), due)
+                for job in polled:
+                    if job["status"] in FINISHED:
+                        del pending[job["id"]]
+                        if on_finish:
+                            on_finish(job)
+                if not pending:
+                    break
+
+                wake = min(job["next_poll_at"] for job in pending.values())
+                if deadline is not None:
+                    if time.time() >= deadline:
+                        break
+                    wake = min(wake, deadline)
+                time.sleep(max(wake - time.time(), 0))
+    finally:
+        for other in clients.values():
+            if other is not client:
+                other.close()
+
+    return [get_job(job["id"]) if job else None for job in jobs]
+
+
+if __name__ == "__main__":
+    run_worker()
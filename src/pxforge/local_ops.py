@@ -0,0 +1,221 @@
+"""
+Local execution of deterministic image operations.
+
+Implements the pixel transforms that do not need the AI backend
+(resize, aspect-ratio, rotate, to-bw, to-rgb, contrast, brightness and
+watermark) with Pillow, so they can run on the client without a
+network round trip. Pillow is an optional dependency (pxforge[local]).
+"""
+
+from pathlib import Path
+from typing import Any, Dict
+from .api_client import get_client
+from .config import get_config_dir
+from .utilities import get_image_source
+
+
+LOCAL_OPERATIONS = (
+    "resize", "aspect-ratio", "rotate", "to-bw", "to-rgb",
+    "contrast", "brightness", "watermark",
+)
+
+# The server applies fixed enhancement factors for these operations.
+CONTRAST_FACTOR = 1.5
+BRIGHTNESS_FACTOR = 1.5
+
+WATERMARK_MARGIN = 10
+WATERMARK_OPACITY = 128
+
+
+def require_pillow():
+    """
+    Import Pillow, with an actionable error if it is missing.
+
+    Returns:
+        module: The PIL.Image module
+
+    Raises:
+        RuntimeError: If Pillow is not installed
+    """
+    try:
+        from PIL import Image
+    except ImportError:
+        raise RuntimeError(
+            "Local mode requires Pillow (pip install 'pxforge[local]')"
+        )
+    return Image
+
+
+def parse_ratio(ratio: str):
+    """
+    Parse an aspect ratio such as "16:9".
+
+    Returns:
+        tuple: (width, height) as floats
+
+    Raises:
+        ValueError: If the ratio is malformed
+    """
+    try:
+        width, height = (float(part) for part in ratio.split(":"))
+    except ValueError:
+        raise ValueError(f"Invalid aspect ratio '{ratio}' (expected W:H, e.g. 16:9)")
+    if width <= 0 or height <= 0:
+        raise ValueError(f"Invalid aspect ratio '{ratio}'")
+    return width, height
+
+
+def crop_box_for_ratio(size, ratio: str):
+    """
+    Compute the largest centered crop box with the given aspect ratio.
+
+    Args:
+        size: (width, height) of the image
+        ratio: Aspect ratio such as "16:9"
+
+    Returns:
+        tuple: (left, top, right, bottom) crop box
+    """
+    width, height = size
+    ratio_w, ratio_h = parse_ratio(ratio)
+    target = ratio_w / ratio_h
+
+    if width / height > target:
+        new_width = round(height * target)
+        left = (width - new_width) // 2
+        return left, 0, left + new_width, height
+
+    new_height = round(width / target)
+    top = (height - new_height) // 2
+    return 0, top, width, top + new_height
+
+
+def watermark_position(image_size, text_size, position: str):
+    """
+    Compute the top-left corner of a watermark inside the image.
+    """
+    width, height = image_size
+    text_width, text_height = text_size
+    position = position.lower()
+
+    x = WATERMARK_MARGIN if position.endswith("left") else width - text_width - WATERMARK_MARGIN
+    y = WATERMARK_MARGIN if position.startswith("top") else height - text_height - WATERMARK_MARGIN
+    return max(x, 0), max(y, 0)
+
+
+def apply_operation(image, name: str, params: Dict[str, Any]):
+    """
+    Apply one operation to a Pillow image.
+
+    Args:
+        image: PIL.Image.Image to transform
+        name: Operation name (one of LOCAL_OPERATIONS)
+        params: Operation parameters keyed by full name
+
+    Returns:
+        PIL.Image.Image: Transformed image
+
+    Raises:
+        ValueError: If the operation cannot run locally
+    """
+    Image = require_pillow()
+    from PIL import ImageDraw, ImageEnhance
+
+    if name == "resize":
+        return image.resize((params["width"], params["height"]), Image.LANCZOS)
+    if name == "aspect-ratio":
+        return image.crop(crop_box_for_ratio(image.size, params["ratio"]))
+    if name == "rotate":
+        return image.rotate(params["angle"], expand=True)
+    if name == "to-bw":
+        return image.convert("L")
+    if name == "to-rgb":
+        return image.convert("RGB")
+    if name == "contrast":
+        return ImageEnhance.Contrast(image).enhance(CONTRAST_FACTOR)
+    if name == "brightness":
+        return ImageEnhance.Brightness(image).enhance(BRIGHTNESS_FACTOR)
+    if name == "watermark":
+        base = image.convert("RGBA")
+        overlay = Image.new("RGBA", base.size, (255, 255, 255, 0))
+        draw = ImageDraw.Draw(overlay)
+        left, top, right, bottom = draw.textbbox((0, 0), params["text"])
+        x, y = watermark_position(
+            base.size, (right - left, bottom - top), params.get("position", "bottom-right")
+        )
+        draw.text((x - left, y - top), params["text"], fill=(255, 255, 255, WATERMARK_OPACITY))
+        result = Image.alpha_composite(base, overlay)
+        return result.convert(image.mode) if image.mode in ("RGB", "L") else result
+
+    raise ValueError(f"Operation '{name}' cannot run locally")
+
+
+def save_image(image, output_path: str):
+    """
+    Encode an image to disk, converting modes the format cannot store.
+
+    Args:
+        image: PIL.Image.Image to save
+        output_path: Destination path; the suffix selects the format
+    """
+    output = Path(output_path)
+    output.parent.mkdir(parents=True, exist_ok=True)
+
+    if output.suffix.lower() in (".jpg", ".jpeg") and image.mode not in ("RGB", "L"):
+        image = image.convert("RGB")
+    image.save(output)
+
+
+def resolve_source(image: str) -> Path:
+    """
+    Find a local file holding an image's pixels.
+
+    Accepts a path to an image file or a registered image ID. For IDs,
+    the file uploaded from is used while it still exists; otherwise the
+    original is downloaded once into the local source cache.
+
+    Args:
+        image: Image file path or image ID
+
+    Returns:
+        Path: Local file with the image data
+
+    Raises:
+        LookupError: If no local file or URL is known for the image ID
+    """
+    path = Path(image)
+    if path.is_file():
+        return path
+
+    source = get_image_source(image)
+    if source.get("path") and Path(source["path"]).is_file():
+        return Path(source["path"])
+
+    cached = get_config_dir() / "sources" / image
+    if cached.is_file():
+        return cached
+
+    if not source.get("url"):
+        raise LookupError(
+            f"No local copy or URL recorded for {image}; "
+            "pass the image file path or re-upload it"
+        )
+    get_client().download_image(source["url"], str(cached))
+    return cached
+
+
+def run_local(name: str, image: str, params: Dict[str, Any], output_path: str):
+    """
+    Run one operation locally and write the result to a file.
+
+    Args:
+        name: Operation name (one of LOCAL_OPERATIONS)
+        image: Image file path or registered image ID
+        params: Operation parameters keyed by full name
+        output_path: Where to write the result
+    """
+    Image = require_pillow()
+    with Image.open(resolve_source(image)) as source:
+        source.load()
+        result = apply_operation(source, name, params)
+    save_image(result, output_path)
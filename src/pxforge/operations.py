@@ -0,0 +1,297 @@
+"""
+Operation table for image processing endpoints.
+
+Describes every processing command as data (endpoint, parameters,
+timeout) so that single commands, batch runs and pipelines share one
+definition of how each operation is sent to the API.
+"""
+
+import re
+from typing import Any, Dict, NamedTuple, Optional, Tuple
+from .api_client import PxForgeClient, get_client
+from .utilities import add_image, record_result
+
+
+class Param(NamedTuple):
+    """
+    A parameter accepted by an operation.
+
+    name is the CLI/step key, field the request field it is sent as and
+    short an optional one-letter alias (matching the command's short
+    option, e.g. w for --width).
+    """
+
+    name: str
+    type: type = str
+    field: Optional[str] = None
+    short: Optional[str] = None
+    required: bool = False
+    default: Any = None
+    is_file: bool = False
+
+
+class Operation(NamedTuple):
+    """
+    An image processing operation exposed by the API.
+    """
+
+    name: str
+    endpoint: str
+    params: Tuple[Param, ...] = ()
+    timeout: int = 300
+    use_form_data: bool = False
+
+
+OPERATIONS = {op.name: op for op in (
+    Operation("resize", "/resize", (
+        Param("width", int, short="w", required=True),
+        Param("height", int, short="h", required=True),
+    )),
+    Operation("aspect-ratio", "/aspect-ratio", (
+        Param("ratio", str, field="aspect_ratio", short="r", required=True),
+    )),
+    Operation("rotate", "/rotate", (
+        Param("angle", int, short="a", required=True),
+    )),
+    Operation("to-bw", "/toBW"),
+    Operation("to-rgb", "/toRGB"),
+    Operation("contrast", "/contrast"),
+    Operation("brightness", "/brightness"),
+    Operation("remove-bg", "/remove-background", timeout=600),
+    Operation("remove-object", "/remove-object", (
+        Param("x", int, required=True),
+        Param("y", int, required=True),
+        Param("width", int, short="w", default=100),
+        Param("height", int, short="h", default=100),
+    ), timeout=600),
+    Operation("remove-noise", "/remove-noise", timeout=600),
+    Operation("replace-bg", "/replace-bg", (
+        Param("bg", str, required=True, is_file=True),
+    ), timeout=600),
+    Operation("prompt-edit", "/prompt-edit", (
+        Param("prompt", str, short="p", required=True),
+    ), timeout=600),
+    Operation("watermark", "/watermark", (
+        Param("text", str, field="watermark", short="t", required=True),
+        Param("position", str, short="p", default="bottom-right"),
+    ), use_form_data=True),
+)}
+
+# Split "a=1,b=2" on commas that start a new key, so values such as
+# "text=Hello, world" keep their commas.
+_STEP_SEPARATOR = re.compile(r",(?=\s*[\w-]+\s*=)")
+
+
+def get_operation(name: str) -> Operation:
+    """
+    Look up an operation by command name.
+
+    Args:
+        name: Operation name (e.g. "resize", "to-bw")
+
+    Returns:
+        Operation: The matching operation
+
+    Raises:
+        ValueError: If the operation is unknown
+    """
+    operation = OPERATIONS.get(name.strip().lower().replace("_", "-"))
+    if operation is None:
+        known = ", ".join(sorted(OPERATIONS))
+        raise ValueError(f"Unknown operation '{name}' (expected one of: {known})")
+    return operation
+
+
+def build_params(operation: Operation, raw: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Resolve aliases, convert types and apply defaults for an operation.
+
+    Args:
+        operation: Operation the parameters belong to
+        raw: Parameters keyed by name or short alias
+
+    Returns:
+        dict: Parameters keyed by full name
+
+    Raises:
+        ValueError: If a parameter is unknown, missing or malformed
+    """
+    by_key = {}
+    for param in operation.params:
+        by_key[param.name] = param
+        if param.short:
+            by_key[param.short] = param
+
+    params = {}
+    for key, value in raw.items():
+        param = by_key.get(key)
+        if param is None:
+            raise ValueError(f"Unknown parameter '{key}' for {operation.name}")
+        if value is None:
+            continue
+        try:
+            params[param.name] = param.type(value)
+        except (TypeError, ValueError):
+            raise ValueError(
+                f"Invalid value '{value}' for {operation.name} parameter "
+                f"'{param.name}' (expected {param.type.__name__})"
+            )
+
+    for param in operation.params:
+        if param.name in params:
+            continue
+        if param.required:
+            raise ValueError(f"Missing parameter '{param.name}' for {operation.name}")
+        if param.default is not None:
+            params[param.name] = param.default
+
+    return params
+
+
+def parse_step(spec: str) -> Tuple[Operation, Dict[str, Any]]:
+    """
+    Parse an operation spec such as "resize:w=800,h=600" or "to-bw".
+
+    Args:
+        spec: Operation name, optionally followed by ':' and key=value pairs
+
+    Returns:
+        tuple: (Operation, parameters keyed by full name)
+
+    Raises:
+        ValueError: If the spec is malformed
+    """
+    name, _, body = spec.partition(":")
+    operation = get_operation(name)
+
+    raw = {}
+    if body.strip():
+        for item in _STEP_SEPARATOR.split(body):
+            key, sep, value = item.partition("=")
+            if not sep:
+                raise ValueError(f"Expected key=value in '{spec}', got '{item}'")
+            raw[key.strip()] = value.strip()
+
+    return operation, build_params(operation, raw)
+
+
+def request_fields(
+    operation: Operation,
+    image_id: str,
+    params: Dict[str, Any]
+) -> Tuple[Dict[str, Any], Dict[str, str]]:
+    """
+    Split resolved parameters into request fields and files to upload.
+
+    Args:
+        operation: Operation to run
+        image_id: ID of the image to process
+        params: Parameters keyed by full name (see build_params)
+
+    Returns:
+        tuple: (data fields keyed by request field, file paths keyed by field)
+    """
+    data = {"image_id": image_id}
+    file_paths = {}
+    for param in operation.params:
+        if param.name not in params:
+            continue
+        if param.is_file:
+            file_paths[param.field or param.name] = params[param.name]
+        else:
+            data[param.field or param.name] = params[param.name]
+    return data, file_paths
+
+
+def send_operation(
+    operation: Operation,
+    image_id: str,
+    params: Dict[str, Any],
+    client: PxForgeClient,
+    headers: Optional[Dict[str, str]] = None,
+    timeout: Optional[int] = None
+) -> Dict[str, Any]:
+    """
+    Send an operation request with already resolved parameters.
+
+    Args:
+        operation: Operation to run
+        image_id: ID of the image to process
+        params: Parameters keyed by full name (see build_params)
+        client: Client to use
+        headers: Extra request headers
+        timeout: Request timeout (defaults to the operation's timeout)
+
+    Returns:
+        dict: API response data
+
+    Raises:
+        requests.RequestException: If the request fails
+    """
+    data, file_paths = request_fields(operation, image_id, params)
+    files = {field: open(path, "rb") for field, path in file_paths.items()}
+    try:
+        return client.request(
+            operation.endpoint,
+            files=files or None,
+            data=data,
+            timeout=timeout or operation.timeout,
+            use_form_data=operation.use_form_data,
+            headers=headers
+        )
+    finally:
+        for handle in files.values():
+            handle.close()
+
+
+def record_operation(
+    operation: Operation,
+    image_id: str,
+    params: Dict[str, Any],
+    result: Dict[str, Any]
+):
+    """
+    Record a successful operation result in the image's lineage.
+
+    Args:
+        operation: Operation that ran
+        image_id: ID of the input image
+        params: Parameters keyed by full name
+        result: API response data
+    """
+    if result.get("success") and result.get("image_url"):
+        result_id = result.get("image_id")
+        if result_id:
+            add_image(result_id, url=result["image_url"])
+        record_result(image_id, operation.name, params, result["image_url"], result_id)
+
+
+def run_operation(
+    name: str,
+    image_id: str,
+    params: Optional[Dict[str, Any]] = None,
+    client: Optional[PxForgeClient] = None
+) -> Dict[str, Any]:
+    """
+    Run an operation on an image through the API.
+
+    Successful results are recorded in the image's lineage.
+
+    Args:
+        name: Operation name
+        image_id: ID of the image to process
+        params: Operation parameters keyed by name or short alias
+        client: Client to use (defaults to the shared client)
+
+    Returns:
+        dict: API response data
+
+    Raises:
+        ValueError: If the operation or parameters are invalid
+        requests.RequestException: If the request fails
+    """
+    operation = get_operation(name)
+    params = build_params(operation, params or {})
+    result = send_operation(operation, image_id, params, client or get_client())
+    record_operation(operation, image_id, params, result)
+    return result
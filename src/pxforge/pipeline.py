@@ -0,0 +1,213 @@
+"""
+Multi-step pipelines over the pxForge API.
+
+Runs a sequence of operations on one image in a single process and
+over a single pooled session, feeding each step's output image into
+the next step.
+"""
+
+import json
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Tuple
+from urllib.parse import urlparse
+from .api_client import PxForgeClient, get_client
+from .operations import Operation, build_params, get_operation, parse_step, run_operation
+from .utilities import find_result, link_result
+
+
+Step = Tuple[Operation, Dict[str, Any]]
+
+
+class StepResult(NamedTuple):
+    """
+    Outcome of one pipeline step.
+
+    image_id is the input the step ran on; handoff is the time spent
+    turning the step's output into the next step's input (zero for the
+    last step or when the server returned an image ID directly). reused
+    is True when the result was taken from the image's lineage instead
+    of being recomputed.
+    """
+
+    operation: Operation
+    params: Dict[str, Any]
+    image_id: str
+    image_url: str
+    elapsed: float
+    handoff: float
+    reused: bool = False
+
+
+class PipelineError(Exception):
+    """Raised when a pipeline step fails."""
+
+    def __init__(self, message: str, completed: List[StepResult]):
+        super().__init__(message)
+        self.completed = completed
+
+
+def format_step(operation: Operation, params: Dict[str, Any]) -> str:
+    """
+    Render a step back into its spec form, e.g. "resize:width=800,height=600".
+    """
+    if not params:
+        return operation.name
+    args = ",".join(f"{key}={value}" for key, value in params.items())
+    return f"{operation.name}:{args}"
+
+
+def load_recipe(path: str) -> List[Step]:
+    """
+    Load pipeline steps from a JSON or YAML recipe file.
+
+    The recipe is either a list of steps or a mapping with a "steps"
+    list. Each step is a spec string ("resize:w=800,h=600") or a
+    mapping with an "op" key and parameters ({"op": "resize", "w": 800}).
+
+    Args:
+        path: Path to the recipe file (.json, .yaml or .yml)
+
+    Returns:
+        list: Parsed (Operation, params) steps
+
+    Raises:
+        ValueError: If the recipe is malformed
+    """
+    recipe_path = Path(path)
+    text = recipe_path.read_text()
+
+    if recipe_path.suffix.lower() in (".yaml", ".yml"):
+        try:
+            import yaml
+        except ImportError:
+            raise ValueError("YAML recipes require PyYAML (pip install pyyaml)")
+        recipe = yaml.safe_load(text)
+    else:
+        try:
+            recipe = json.loads(text)
+        except json.JSONDecodeError as e:
+            raise ValueError(f"Invalid JSON recipe: {e}")
+
+    if isinstance(recipe, dict):
+        recipe = recipe.get("steps")
+    if not isinstance(recipe, list):
+        raise ValueError("Recipe must be a list of steps or contain a 'steps' list")
+
+    steps = []
+    for entry in recipe:
+        if isinstance(entry, str):
+            steps.append(parse_step(entry))
+        elif isinstance(entry, dict) and "op" in entry:
+            raw = dict(entry)
+            operation = get_operation(str(raw.pop("op")))
+            steps.append((operation, build_params(operation, raw)))
+        else:
+            raise ValueError(f"Invalid recipe step: {entry!r}")
+    return steps
+
+
+def promote_result(client: PxForgeClient, result: Dict[str, Any]) -> str:
+    """
+    Get an image ID for an operation's output so it can be processed further.
+
+    Uses the ID returned by the server when there is one; otherwise the
+    result is fetched and uploaded as a new image over the same session.
+
+    Args:
+        client: Client to use
+        result: Successful operation response
+
+    Returns:
+        str: Image ID of the output image
+    """
+    if result.get("image_id"):
+        return result["image_id"]
+
+    url = result.get("image_url")
+    content = client.fetch(url)
+    filename = Path(urlparse(url).path).name or "image.png"
+    uploaded = client.request("/upload", files={"image": (filename, content)})
+    image_id = uploaded.get("image_id")
+    if not image_id:
+        raise RuntimeError("Server did not return an image ID for the intermediate upload")
+    link_result(url, image_id)
+    return image_id
+
+
+def run_pipeline(
+    image_id: str,
+    steps: List[Step],
+    client: Optional[PxForgeClient] = None,
+    on_step: Optional[Callable[[int, StepResult], None]] = None,
+    reuse: bool = False
+) -> List[StepResult]:
+    """
+    Run steps in order, feeding each output into the next step.
+
+    Args:
+        image_id: ID of the input image
+        steps: (Operation, params) pairs to apply
+        client: Client to use (defaults to the shared client)
+        on_step: Called with (index, StepResult) after each step
+        reuse: Take results recorded in the lineage from earlier runs
+            instead of recomputing them
+
+    Returns:
+        list: One StepResult per step
+
+    Raises:
+        PipelineError: If a step fails; completed steps are attached
+    """
+    client = client or get_client()
+    results = []
+    current = image_id
+
+    for index, (operation, params) in enumerate(steps):
+        last = index == len(steps) - 1
+        if reuse:
+            previous = find_result(current, operation.name, params)
+            if previous and (last or previous["result_image_id"]):
+                step = StepResult(
+                    operation, params, current, previous["url"], 0.0, 0.0, reused=True
+                )
+                results.append(step)
+                if on_step:
+                    on_step(index, step)
+                current = previous["result_image_id"] or current
+                continue
+
+        start = time.perf_counter()
+        try:
+            result = run_operation(operation.name, current, params, client=client)
+        except Exception as e:
+            raise PipelineError(f"{operation.name} failed: {e}", results)
+        if not result.get("success"):
+            raise PipelineError(
+                f"{operation.name} failed: {result.get('error', 'Unknown error')}",
+                results
+            )
+        elapsed = time.perf_counter() - start
+
+        handoff = 0.0
+        next_id = current
+        if not last:
+            handoff_start = time.perf_counter()
+            try:
+                next_id = promote_result(client, result)
+            except Exception as e:
+                raise PipelineError(
+                    f"could not pass {operation.name} output to the next step: {e}",
+                    results
+                )
+            handoff = time.perf_counter() - handoff_start
+
+        step = StepResult(
+            operation, params, current, result.get("image_url"), elapsed, handoff
+        )
+        results.append(step)
+        if on_step:
+            on_step(index, step)
+        current = next_id
+
+    return results
@@ -0,0 +1,153 @@
+"""
+Client-side pre-processing of images before upload.
+
+Originals are often far larger than what the next step needs: a 24 MP
+photo resized to 800 pixels wide, or sent to an AI operation that
+downsamples anyway. Downscaling to a maximum edge and/or transcoding to
+WebP or JPEG on the client cuts the bytes sent, and with them egress
+bandwidth and upload time. Uses Pillow (pxforge[local]).
+"""
+
+import os
+import tempfile
+import time
+from pathlib import Path
+from typing import NamedTuple, Optional, Tuple
+from .config import get_config_dir
+from .local_ops import require_pillow
+
+
+UPLOAD_FORMATS = ("webp", "jpeg")
+DEFAULT_QUALITY = 90
+
+# Pillow format names and file suffixes for the formats images are
+# written in.
+_FORMATS = {"webp": ("WEBP", ".webp"), "jpeg": ("JPEG", ".jpg"), "png": ("PNG", ".png")}
+
+
+class PreparedImage(NamedTuple):
+    """
+    An image ready for upload, possibly smaller than the original.
+    """
+
+    path: Path
+    source: Path
+    original_size: int
+    size: int
+    original_dimensions: Tuple[int, int]
+    dimensions: Tuple[int, int]
+    format: str
+    elapsed: float
+
+    @property
+    def changed(self) -> bool:
+        """Whether a new file was written in place of the original."""
+        return self.path != self.source
+
+    @property
+    def bytes_saved(self) -> int:
+        return max(self.original_size - self.size, 0)
+
+
+def cover_edge(dimensions: Tuple[int, int], target: Tuple[int, int]) -> int:
+    """
+    Smallest max edge that still covers a target size.
+
+    A resize to target that follows a downscale to this edge gets the
+    same number of source pixels in each direction as it needs, so its
+    output is not blurrier than resizing the original.
+
+    Args:
+        dimensions: (width, height) of the original
+        target: (width, height) the image will be resized to
+
+    Returns:
+        int: Max edge in pixels (the original's if no downscale helps)
+    """
+    width, height = dimensions
+    scale = min(max(target[0] / width, target[1] / height), 1.0)
+    return max(round(max(width, height) * scale), 1)
+
+
+def _output_format(image, fmt: Optional[str]) -> str:
+    if fmt:
+        return fmt
+    # Keep the original format where it is one that can be re-encoded.
+    original = (image.format or "").lower()
+    if original == "mpo":
+        return "jpeg"
+    return original if original in _FORMATS else "png"
+
+
+def prepare_image(
+    path: str,
+    max_edge: Optional[int] = None,
+    fmt: Optional[str] = None,
+    quality: int = DEFAULT_QUALITY
+) -> PreparedImage:
+    """
+    Downscale and/or transcode an image for upload.
+
+    The image is scaled (keeping its aspect ratio) so its longer edge is
+    at most max_edge, then encoded in fmt. EXIF orientation is applied
+    first, as the pixels are rewritten anyway. If the result is not
+    smaller than the original, the original is used.
+
+    Args:
+        path: Image file to prepare
+        max_edge: Longest edge in pixels (None keeps the dimensions)
+        fmt: "webp" or "jpeg" (None keeps the original format)
+        quality: Encoder quality for WebP and JPEG, 1-100
+
+    Returns:
+        PreparedImage: path is a new file in the source cache, which the
+        caller moves or removes, or the original path if unchanged
+
+    Raises:
+        RuntimeError: If Pillow is not installed
+    """
+    Image = require_pillow()
+    from PIL import ImageOps
+
+    start = time.perf_counter()
+    original_size = os.path.getsize(path)
+    with Image.open(path) as source:
+        original_dimensions = source.size
+        fmt = _output_format(source, fmt)
+        unchanged = PreparedImage(
+            Path(path), Path(path), original_size, original_size, original_dimensions,
+            original_dimensions, (source.format or fmt).lower(), 0.0
+        )
+        if (max_edge is None or max(source.size) <= max_edge) and \
+                fmt == _output_format(source, None):
+            return unchanged
+
+        if max_edge is not None and source.format == "JPEG":
+            # Decode at a reduced DCT scale that still exceeds max_edge,
+            # which is far cheaper than decoding every pixel.
+            source.draft(source.mode, (max_edge, max_edge))
+        image = ImageOps.exif_transpose(source)
+        if max_edge is not None and max(image.size) > max_edge:
+            image.thumbnail((max_edge, max_edge), Image.LANCZOS)
+        if fmt == "jpeg" and image.mode not in ("RGB", "L"):
+            image = image.convert("RGB")
+
+        pil_format, suffix = _FORMATS[fmt]
+        directory = get_config_dir() / "sources"
+        directory.mkdir(parents=True, exist_ok=True)
+        fd, temp = tempfile.mkstemp(suffix=suffix, dir=directory, prefix=".prepared-")
+        with os.fdopen(fd, "wb") as out:
+            if fmt == "png":
+                image.save(out, pil_format, optimize=True)
+            else:
+                image.save(out, pil_format, quality=quality)
+        dimensions = image.size
+
+    size = os.path.getsize(temp)
+    if size >= original_size and dimensions == original_dimensions:
+        os.remove(temp)
+        return unchanged
+    return PreparedImage(
+        Path(temp), Path(path), original_size, size, original_dimensions, dimensions, fmt,
+        time.perf_counter() - start
+    )
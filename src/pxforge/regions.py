@@ -0,0 +1,418 @@
+"""
+Processing images in regions instead of as a whole.
+
+Inpainting only changes the pixels around the object being removed, so
+there is no need to send the whole image: the object's box plus a
+margin of context is cropped locally, only that tile is uploaded and
+processed, and the result is blended back into the original here.
+Upload size and server time shrink in proportion to the tile's area.
+
+Very large images, which time out as one request, are split into
+overlapping tiles that are processed concurrently and blended back
+together, with linear ramps across the overlaps hiding the seams.
+
+Uses Pillow (pxforge[local]).
+"""
+
+import io
+import os
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Tuple
+from .api_client import PxForgeClient, get_client
+from .config import get_config_dir
+from .local_ops import require_pillow, resolve_source, save_image
+from .operations import get_operation, send_operation
+
+
+# Context kept around the object box, in pixels.
+ROI_MARGIN = 64
+
+TILE_SIZE = 1024
+TILE_OVERLAP = 64
+TILE_WORKERS = 4
+
+Box = Tuple[int, int, int, int]
+
+
+class RegionReport(NamedTuple):
+    """
+    What a region-of-interest edit sent compared to the full image.
+    """
+
+    box: Box
+    image_size: Tuple[int, int]
+    tile_bytes: int
+    image_bytes: int
+
+    @property
+    def area_fraction(self) -> float:
+        left, top, right, bottom = self.box
+        width, height = self.image_size
+        return (right - left) * (bottom - top) / (width * height)
+
+
+def roi_box(
+    image_size: Tuple[int, int],
+    x: int,
+    y: int,
+    width: int,
+    height: int,
+    margin: int = ROI_MARGIN
+) -> Box:
+    """
+    Tile to crop for an object box centred on (x, y).
+
+    Args:
+        image_size: (width, height) of the image
+        x: X coordinate of the object centre
+        y: Y coordinate of the object centre
+        width: Object box width
+        height: Object box height
+        margin: Context to include on every side
+
+    Returns:
+        tuple: (left, top, right, bottom), clipped to the image
+
+    Raises:
+        ValueError: If the box lies outside the image
+    """
+    left = max(x - width // 2 - margin, 0)
+    top = max(y - height // 2 - margin, 0)
+    right = min(x - width // 2 + width + margin, image_size[0])
+    bottom = min(y - height // 2 + height + margin, image_size[1])
+    if right <= left or bottom <= top:
+        raise ValueError(f"Object box at ({x}, {y}) lies outside the image")
+    return left, top, right, bottom
+
+
+def feather_mask(tile_size: Tuple[int, int], inner: Box, feather: int):
+    """
+    Blend mask for pasting a processed tile back.
+
+    Fully opaque over the inner box, fading linearly to transparent over
+    `feather` pixels around it, so differences between the server's
+    rendering of the context and the original do not leave a seam.
+
+    Args:
+        tile_size: (width, height) of the tile
+        inner: Box, relative to the tile, that must be fully replaced
+        feather: Width of the fade in pixels
+
+    Returns:
+        PIL.Image.Image: Mode "L" mask
+    """
+    Image = require_pillow()
+    from PIL import ImageDraw
+
+    mask = Image.new("L", tile_size, 0)
+    draw = ImageDraw.Draw(mask)
+    left, top, right, bottom = inner
+    # Concentric rectangles, each a step more opaque than the last.
+    for step in range(feather, -1, -1):
+        level = 255 if feather == 0 else round(255 * (feather - step) / feather)
+        draw.rectangle(
+            (left - step, top - step, right - 1 + step, bottom - 1 + step), fill=level
+        )
+    return mask
+
+
+def process_tile(
+    tile,
+    operation: str,
+    params: Optional[Dict[str, Any]] = None,
+    client: Optional[PxForgeClient] = None
+):
+    """
+    Upload one tile, run an operation on it and fetch the result.
+
+    The tile is sent losslessly as PNG and is not added to the registry.
+
+    Args:
+        tile: PIL.Image.Image to process
+        operation: Operation name
+        params: Operation parameters keyed by full name
+        client: Client to use (defaults to the shared client)
+
+    Returns:
+        tuple: (processed PIL.Image.Image, bytes uploaded)
+
+    Raises:
+        RuntimeError: If the server fails to process the tile
+        requests.RequestException: If a request fails
+    """
+    Image = require_pillow()
+    client = client or get_client()
+
+    directory = get_config_dir() / "sources"
+    directory.mkdir(parents=True, exist_ok=True)
+    fd, tile_path = tempfile.mkstemp(suffix=".png", dir=directory, prefix=".tile-")
+    try:
+        with os.fdopen(fd, "wb") as out:
+            # Fast compression: the tile is sent once and thrown away.
+            tile.save(out, "PNG", compress_level=1)
+        tile_bytes = os.path.getsize(tile_path)
+        uploaded = client.upload_image(tile_path)
+    finally:
+        os.remove(tile_path)
+
+    result = send_operation(
+        get_operation(operation), uploaded["image_id"], params or {}, client
+    )
+    if not result.get("success"):
+        raise RuntimeError(result.get("error", "Unknown error"))
+
+    with Image.open(io.BytesIO(client.fetch(result["image_url"]))) as processed:
+        processed.load()
+    return processed, tile_bytes
+
+
+def remove_object_region(
+    image: str,
+    x: int,
+    y: int,
+    width: int,
+    height: int,
+    output_path: str,
+    margin: int = ROI_MARGIN,
+    client: Optional[PxForgeClient] = None
+) -> RegionReport:
+    """
+    Remove an object by inpainting only the tile around it.
+
+    Args:
+        image: Registered image ID or image file
+        x: X coordinate of the object centre
+        y: Y coordinate of the object centre
+        width: Object box width
+        height: Object box height
+        output_path: Where to write the composited image
+        margin: Context to send around the object box
+        client: Client to use (defaults to the shared client)
+
+    Returns:
+        RegionReport: The tile sent and how it compares to the image
+
+    Raises:
+        ValueError: If the box lies outside the image
+        RuntimeError: If the server fails to process the tile
+        requests.RequestException: If a request fails
+    """
+    Image = require_pillow()
+    client = client or get_client()
+    source_path = resolve_source(image)
+
+    with Image.open(source_path) as source:
+        source.load()
+        original = source if source.mode in ("RGB", "RGBA", "L") else source.convert("RGBA")
+    box = roi_box(original.size, x, y, width, height, margin)
+    left, top, right, bottom = box
+    tile = original.crop(box)
+
+    # The object box, in tile coordinates.
+    inner = (
+        x - width // 2 - left, y - height // 2 - top,
+        x - width // 2 + width - left, y - height // 2 + height - top,
+    )
+    params = {
+        "x": x - left, "y": y - top, "width": width, "height": height,
+    }
+    patch, tile_bytes = process_tile(tile, "remove-object", params, client)
+    patch = patch.convert(original.mode)
+    if patch.size != tile.size:
+        patch = patch.resize(tile.size, Image.LANCZOS)
+
+    original.paste(patch, (left, top), feather_mask(tile.size, inner, margin // 2))
+    save_image(original, output_path)
+    return RegionReport(box, original.size, tile_bytes, os.path.getsize(source_path))
+
+
+class TiledReport(NamedTuple):
+    """
+    Outcome of processing an image in tiles.
+    """
+
+    tiles: int
+    image_size: Tuple[int, int]
+    output_size: Tuple[int, int]
+    tile_bytes: int
+
+
+def _tile_spans(length: int, tile_size: int, overlap: int) -> List[Tuple[int, int]]:
+    if length <= tile_size:
+        return [(0, length)]
+    # Fewest tiles that cover the length, then sized evenly so every
+    # overlap is close to the minimum instead of one edge tile
+    # overlapping its neighbour almost entirely.
+    count = -(-(length - overlap) // (tile_size - overlap))
+    size = -(-(length + (count - 1) * overlap) // count)
+    starts = [round(i * (length - size) / (count - 1)) for i in range(count)]
+    return [(start, start + size) for start in starts]
+
+
+def tile_grid(
+    image_size: Tuple[int, int],
+    tile_size: int = TILE_SIZE,
+    overlap: int = TILE_OVERLAP
+) -> List[List[Box]]:
+    """
+    Split an image into overlapping tiles.
+
+    Args:
+        image_size: (width, height) of the image
+        tile_size: Maximum tile edge in pixels
+        overlap: Minimum overlap between neighbouring tiles
+
+    Returns:
+        list: Rows of (left, top, right, bottom) boxes
+
+    Raises:
+        ValueError: If the overlap is not smaller than the tile size
+    """
+    if not 0 <= overlap < tile_size:
+        raise ValueError("Tile overlap must be smaller than the tile size")
+    width, height = image_size
+    return [
+        [(left, top, right, bottom) for left, right in _tile_spans(width, tile_size, overlap)]
+        for top, bottom in _tile_spans(height, tile_size, overlap)
+    ]
+
+
+def _ramp(length: int, fade: int, axis: str):
+    # Mask rising linearly from transparent to opaque over `fade` pixels
+    # at the start of one axis, opaque elsewhere.
+    Image = require_pillow()
+    fade = min(fade, length)
+    values = [round(255 * (i + 1) / (fade + 1)) for i in range(fade)]
+    values += [255] * (length - fade)
+    size = (length, 1) if axis == "x" else (1, length)
+    line = Image.new("L", size)
+    line.putdata(values)
+    return line
+
+
+def seam_mask(size: Tuple[int, int], fade_left: int, fade_top: int):
+    """
+    Blend mask for a tile pasted over its left and top neighbours.
+
+    Args:
+        size: (width, height) of the tile
+        fade_left: Overlap with the tile to the left, 0 for none
+        fade_top: Overlap with the tile above, 0 for none
+
+    Returns:
+        PIL.Image.Image: Mode "L" mask, or None if nothing overlaps
+    """
+    if not fade_left and not fade_top:
+        return None
+    Image = require_pillow()
+    from PIL import ImageChops
+
+    width, height = size
+    horizontal = _ramp(width, fade_left, "x").resize(size, Image.NEAREST)
+    vertical = _ramp(height, fade_top, "y").resize(size, Image.NEAREST)
+    return ImageChops.multiply(horizontal, vertical)
+
+
+def process_tiled(
+    image: str,
+    operation: str,
+    output_path: str,
+    tile_size: int = TILE_SIZE,
+    overlap: int = TILE_OVERLAP,
+    concurrency: int = TILE_WORKERS,
+    client: Optional[PxForgeClient] = None,
+    on_tile: Optional[Callable[[int, int], None]] = None
+) -> TiledReport:
+    """
+    Run an operation over an image in overlapping tiles.
+
+    Tiles are processed concurrently and pasted into the output in grid
+    order, each cross-fading into the tiles to its left and above across
+    their overlap. Only a bounded window of tiles is in flight or waiting
+    to be pasted at once, so memory holds the source, the output and a
+    few tiles however large the image is. Operations that change the
+    image's scale, such as AI upscaling, are supported: the scale is
+    taken from the first processed tile.
+
+    Args:
+        image: Registered image ID or image file
+        operation: Operation name, e.g. "remove-noise"
+        output_path: Where to write the result
+        tile_size: Maximum tile edge in pixels
+        overlap: Minimum overlap between neighbouring tiles
+        concurrency: Tiles processed at once
+        client: Client to use (defaults to the shared client)
+        on_tile: Called with (tiles done, total) as tiles are pasted
+
+    Returns:
+        TiledReport: Tile count and image sizes
+
+    Raises:
+        ValueError: If the tiling parameters are invalid
+        RuntimeError: If the server fails to process a tile
+        requests.RequestException: If a request fails
+    """
+    Image = require_pillow()
+    client = client or get_client()
+
+    with Image.open(resolve_source(image)) as source:
+        source.load()
+        original = source if source.mode in ("RGB", "RGBA", "L") else source.convert("RGBA")
+    grid = tile_grid(original.size, tile_size, overlap)
+    boxes = [(row, col, box) for row, line in enumerate(grid) for col, box in enumerate(line)]
+
+    def _process(box):
+        return process_tile(original.crop(box), operation, client=client)
+
+    canvas = None
+    scale = (1.0, 1.0)
+    tile_bytes = 0
+
+    def _scaled(box):
+        left, top, right, bottom = box
+        return (
+            round(left * scale[0]), round(top * scale[1]),
+            round(right * scale[0]), round(bottom * scale[1]),
+        )
+
+    window = max(concurrency * 2, 1)
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        futures = {}
+        submitted = 0
+        for index, (row, col, box) in enumerate(boxes):
+            while submitted < len(boxes) and submitted < index + window:
+                futures[submitted] = pool.submit(_process, boxes[submitted][2])
+                submitted += 1
+            try:
+                tile, sent = futures.pop(index).result()
+            except BaseException:
+                for future in futures.values():
+                    future.cancel()
+                raise
+            tile_bytes += sent
+
+            if canvas is None:
+                scale = (
+                    tile.size[0] / (box[2] - box[0]), tile.size[1] / (box[3] - box[1])
+                )
+                mode = tile.mode if tile.mode in ("RGB", "RGBA", "L") else "RGBA"
+                canvas = Image.new(mode, (
+                    round(original.size[0] * scale[0]), round(original.size[1] * scale[1])
+                ))
+
+            target = _scaled(box)
+            size = (target[2] - target[0], target[3] - target[1])
+            if tile.mode != canvas.mode:
+                tile = tile.convert(canvas.mode)
+            if tile.size != size:
+                tile = tile.resize(size, Image.LANCZOS)
+
+            fade_left = _scaled(grid[row][col - 1])[2] - target[0] if col else 0
+            fade_top = _scaled(grid[row - 1][col])[3] - target[1] if row else 0
+            canvas.paste(tile, target[:2], seam_mask(size, fade_left, fade_top))
+            if on_tile:
+                on_tile(index + 1, len(boxes))
+
+    save_image(canvas, output_path)
+    return TiledReport(len(boxes), original.size, canvas.size, tile_bytes)
@@ -0,0 +1,550 @@
+"""
+Client-side request scheduling for the pxForge API.
+
+Keeps a fan-out of requests from overloading the backend while getting
+as much sustained throughput out of it as it allows:
+
+- Retries with jittered exponential backoff, honoring Retry-After on
+  429 and 503 responses. Requests that must not run twice (POSTs) are
+  only retried when they cannot have reached the backend.
+- An AIMD (additive increase, multiplicative decrease) concurrency
+  window: every request that completes without signs of congestion
+  widens the window a little, and throttling, timeouts or latency well
+  above the best observed latency halve it.
+- A circuit breaker that stops sending requests for a while after
+  repeated failures, so a backend that is down is not hammered.
+"""
+
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from typing import Awaitable, Callable, Dict, NamedTuple, Optional, Tuple, Type
+import requests
+from urllib3.exceptions import NewConnectionError
+
+
+# Responses that mean "try again later" rather than "this request is wrong".
+RETRY_STATUSES = (429, 502, 503, 504)
+
+# Of those, the ones that also mean the request was not processed, so a
+# request that must not run twice can be sent again. A gateway error
+# (502, 504) may come after the backend processed the request.
+UNPROCESSED_STATUSES = (429, 503)
+
+# Methods that can be sent twice with the same effect as once.
+IDEMPOTENT_METHODS = ("GET", "HEAD", "OPTIONS", "PUT", "DELETE")
+
+# Latencies below this are treated as equal, so jitter in very fast
+# requests is not mistaken for congestion.
+LATENCY_FLOOR = 0.05
+
+# Requests moving more bytes than this (sent plus received) are left out
+# of the latency signal: their time goes into the transfer, which says
+# nothing about how loaded the backend is.
+LATENCY_MAX_PAYLOAD = 1024 * 1024
+
+
+class CircuitOpenError(requests.ConnectionError):
+    """Raised instead of sending a request while the circuit is open."""
+
+
+class RetryPolicy(NamedTuple):
+    """
+    How often and how long to wait between attempts, in seconds.
+    """
+
+    max_attempts: int = 5
+    base_delay: float = 0.5
+    max_delay: float = 30.0
+    max_retry_after: float = 120.0
+
+    def delay(self, attempt: int, retry_after: Optional[float] = None) -> float:
+        """
+        Time to wait before retrying after the given failed attempt.
+
+        A server-provided Retry-After is honored (up to max_retry_after);
+        otherwise the delay is drawn uniformly from zero to an
+        exponentially growing cap ("full jitter"), which spreads retries
+        from many clients apart.
+
+        Args:
+            attempt: Zero-based number of the attempt that failed
+            retry_after: Seconds requested by the server, if any
+
+        Returns:
+            float: Seconds to sleep
+        """
+        if retry_after is not None:
+            return min(retry_after, self.max_retry_after)
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+
+def _unsent(error: Exception) -> bool:
+    """
+    Whether a failed requests attempt never reached the server.
+
+    Only connection setup failures qualify: a read timeout or a dropped
+    connection may come after the server received the whole request.
+    """
+    if isinstance(error, requests.ConnectTimeout):
+        return True
+    if isinstance(error, requests.Timeout):
+        return False
+    reason = getattr(error.args[0], "reason", None) if error.args else None
+    return isinstance(reason, NewConnectionError)
+
+
+def _content_length(headers) -> int:
+    """Response body size from its headers, or 0 if not given."""
+    try:
+        return int(headers.get("Content-Length") or 0)
+    except ValueError:
+        return 0
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """
+    Parse a Retry-After header given in seconds or as an HTTP date.
+
+    Returns:
+        float: Seconds to wait, or None if absent or malformed
+    """
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        return max(parsedate_to_datetime(value).timestamp() - time.time(), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+
+class AdaptiveLimiter:
+    """
+    AIMD concurrency window shared by all threads using a client.
+
+    Callers hold a slot for the duration of a request. Until the first
+    sign of congestion the window grows by one slot per success (slow
+    start); after that by about one slot per window's worth of
+    successes. Congestion halves it, at most once per smoothed round
+    trip so one burst of errors does not collapse it to the minimum.
+    Latency is compared per endpoint, as operations differ widely in
+    how long they take: congestion is when an endpoint's smoothed
+    latency exceeds latency_factor times its best. Large uploads and
+    downloads are not timed (see LATENCY_MAX_PAYLOAD), so they do not
+    shrink the window for small requests to the same endpoint.
+    """
+
+    def __init__(
+        self,
+        initial: float = 4,
+        minimum: float = 1,
+        maximum: float = 64,
+        backoff: float = 0.5,
+        latency_factor: float = 3.0
+    ):
+        """
+        Args:
+            initial: Starting window size
+            minimum: Smallest window size
+            maximum: Largest window size
+            backoff: Factor the window is multiplied by on congestion
+            latency_factor: Latency above this multiple of the best
+                observed latency counts as congestion
+        """
+        self.minimum = minimum
+        self.maximum = maximum
+        self.backoff = backoff
+        self.latency_factor = latency_factor
+        self.window = min(max(initial, minimum), maximum)
+        self.in_flight = 0
+        self.best_latency: Dict[str, float] = {}
+        self.endpoint_latency: Dict[str, float] = {}
+        self.smoothed_latency = None
+        self._slow_start = True
+        self._last_decrease = 0.0
+        self._condition = threading.Condition()
+        # Futures of coroutines waiting in acquire_async, with their loops.
+        self._async_waiters = []
+
+    def acquire(self):
+        """Wait for a free slot in the window."""
+        with self._condition:
+            while self.in_flight >= int(self.window):
+                self._condition.wait()
+            self.in_flight += 1
+
+    async def acquire_async(self):
+        """Wait for a free slot in the window without blocking the event loop."""
+        import asyncio
+
+        loop = asyncio.get_running_loop()
+        while True:
+            with self._condition:
+                if self.in_flight < int(self.window):
+                    self.in_flight += 1
+                    return
+                waiter = loop.create_future()
+                self._async_waiters.append((loop, waiter))
+            try:
+                await waiter
+            finally:
+                with self._condition:
+                    if (loop, waiter) in self._async_waiters:
+                        self._async_waiters.remove((loop, waiter))
+
+    def release(
+        self,
+        latency: Optional[float] = None,
+        congested: bool = False,
+        key: str = ""
+    ):
+        """
+        Free a slot and adjust the window.
+
+        Args:
+            latency: Request latency in seconds, if it completed
+            congested: The request was throttled or timed out
+            key: Endpoint the latency belongs to
+        """
+        with self._condition:
+            self.in_flight -= 1
+            if latency is not None:
+                best = min(self.best_latency.get(key, latency), latency)
+                self.best_latency[key] = best
+                smoothed = 0.8 * self.endpoint_latency.get(key, latency) + 0.2 * latency
+                self.endpoint_latency[key] = smoothed
+                self.smoothed_latency = latency if self.smoothed_latency is None \
+                    else 0.8 * self.smoothed_latency + 0.2 * latency
+                if smoothed > max(best, LATENCY_FLOOR) * self.latency_factor:
+                    congested = True
+
+            if congested:
+                now = time.monotonic()
+                self._slow_start = False
+                if now - self._last_decrease >= (self.smoothed_latency or 0.0):
+                    self.window = max(self.minimum, self.window * self.backoff)
+                    self._last_decrease = now
+            elif latency is not None:
+                step = 1 if self._slow_start else 1 / self.window
+                self.window = min(self.maximum, self.window + step)
+            self._condition.notify_all()
+            waiters, self._async_waiters = self._async_waiters, []
+        for loop, waiter in waiters:
+            loop.call_soon_threadsafe(_wake, waiter)
+
+
+def _wake(waiter):
+    if not waiter.done():
+        waiter.set_result(None)
+
+
+class CircuitBreaker:
+    """
+    Stops calls to a failing backend and probes it again after a pause.
+
+    closed: calls go through. After failure_threshold consecutive
+    failures the circuit opens and calls are rejected for reset_timeout
+    seconds. It then goes half-open and lets one probe call through; its
+    success closes the circuit and its failure opens it again. A probe
+    abandoned before it got an answer (interrupted or cancelled) lets
+    the next call probe instead.
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        # When the circuit first opened since the last success.
+        self.down_since = None
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def retry_in(self) -> float:
+        """Seconds until an open circuit lets a probe through."""
+        return max(self.opened_at + self.reset_timeout - time.monotonic(), 0.0)
+
+    def allow(self) -> bool:
+        """
+        Check whether a call may be sent now, claiming the probe if half-open.
+        """
+        with self._lock:
+            if self.state == "open" and self.retry_in() <= 0:
+                self.state = "half-open"
+                self._probing = False
+            if self.state == "closed":
+                return True
+            if self.state == "half-open" and not self._probing:
+                self._probing = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.state = "closed"
+            self.failures = 0
+            self.down_since = None
+            self._probing = False
+
+    def record_abandoned(self):
+        """Note that a call ended without an outcome, freeing the probe."""
+        with self._lock:
+            if self.state == "half-open":
+                self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == "half-open" or self.failures >= self.failure_threshold:
+                self.state = "open"
+                self.opened_at = time.monotonic()
+                if self.down_since is None:
+                    self.down_since = self.opened_at
+                self._probing = False
+
+
+class Scheduler:
+    """
+    Sends requests through the retry policy, concurrency window and breaker.
+    """
+
+    def __init__(
+        self,
+        policy: Optional[RetryPolicy] = None,
+        limiter: Optional[AdaptiveLimiter] = None,
+        breaker: Optional[CircuitBreaker] = None,
+        wait_when_open: float = 0.0
+    ):
+        """
+        Args:
+            policy: Retry policy (defaults to RetryPolicy())
+            limiter: Concurrency window (defaults to AdaptiveLimiter())
+            breaker: Circuit breaker (defaults to CircuitBreaker())
+            wait_when_open: Seconds calls wait for a backend that has
+                gone down to recover before failing; once it has been
+                down that long, calls fail immediately. Zero never waits
+        """
+        self.policy = policy or RetryPolicy()
+        self.limiter = limiter or AdaptiveLimiter()
+        self.breaker = breaker or CircuitBreaker()
+        self.wait_when_open = wait_when_open
+        self._lock = threading.Lock()
+        self.counters = {"requests": 0, "retries": 0, "throttled": 0, "rejected": 0}
+
+    def _count(self, name: str):
+        with self._lock:
+            self.counters[name] += 1
+
+    def _circuit_delay(self) -> Optional[float]:
+        """
+        Seconds to wait for the circuit to let a call through, or None
+        if it does now.
+        """
+        if self.breaker.allow():
+            return None
+        down_since = self.breaker.down_since or time.monotonic()
+        remaining = down_since + self.wait_when_open - time.monotonic()
+        if remaining <= 0:
+            self._count("rejected")
+            raise CircuitOpenError(
+                f"Backend unavailable after repeated failures; "
+                f"retrying in {self.breaker.retry_in():.0f}s"
+            )
+        return min(max(self.breaker.retry_in(), 0.5), remaining)
+
+    def _failed(self, attempt: int, retry: bool) -> Optional[float]:
+        """
+        Record an attempt that failed in transit.
+
+        Returns:
+            float: Seconds to wait before the next attempt, or None to
+            raise the failure
+        """
+        self.limiter.release(congested=True)
+        self.breaker.record_failure()
+        if not retry or attempt == self.policy.max_attempts - 1:
+            return None
+        self._count("retries")
+        return self.policy.delay(attempt)
+
+    def _answered(
+        self, attempt: int, status: int, headers, latency: float, key: str, idempotent: bool,
+        size: int
+    ) -> Optional[float]:
+        """
+        Record an attempt that got a response.
+
+        Returns:
+            float: Seconds to wait before retrying, or None to return the
+            response
+        """
+        if status in RETRY_STATUSES:
+            self.limiter.release(congested=True)
+            self.breaker.record_failure()
+            self._count("throttled")
+            if attempt == self.policy.max_attempts - 1:
+                return None
+            if not idempotent and status not in UNPROCESSED_STATUSES:
+                return None
+            self._count("retries")
+            return self.policy.delay(attempt, parse_retry_after(headers.get("Retry-After")))
+
+        if size + _content_length(headers) > LATENCY_MAX_PAYLOAD:
+            latency = None
+        self.limiter.release(latency=latency, key=key)
+        if status >= 500:
+            self.breaker.record_failure()
+        else:
+            self.breaker.record_success()
+        return None
+
+    def call(
+        self,
+        send: Callable[[], requests.Response],
+        key: str = "",
+        idempotent: bool = True,
+        size: int = 0
+    ) -> requests.Response:
+        """
+        Send a request, retrying transient failures.
+
+        A request that is not idempotent (a POST, say) is only sent again
+        when it cannot have been processed: its connection failed to open
+        or the server answered 429 or 503. A read timeout or a dropped
+        connection is raised, as the server may have acted on it.
+
+        Args:
+            send: Sends the request once and returns the response; it is
+                called again for each retry
+            key: Endpoint name used to compare latencies
+            idempotent: Whether the request may be sent more than once
+            size: Bytes in the request body
+
+        Returns:
+            requests.Response: The final response, which may still be an
+            error response once retries are exhausted
+
+        Raises:
+            CircuitOpenError: If the circuit is open
+            requests.RequestException: If the last attempt failed in transit
+        """
+        for attempt in range(self.policy.max_attempts):
+            delay = self._circuit_delay()
+            while delay is not None:
+                time.sleep(delay)
+                delay = self._circuit_delay()
+            self._count("requests")
+
+            try:
+                self.limiter.acquire()
+            except BaseException:
+                self.breaker.record_abandoned()
+                raise
+            start = time.monotonic()
+            try:
+                response = send()
+            except (requests.ConnectionError, requests.Timeout) as e:
+                delay = self._failed(attempt, idempotent or _unsent(e))
+                if delay is None:
+                    raise
+                time.sleep(delay)
+                continue
+            except BaseException:
+                self.limiter.release()
+                self.breaker.record_abandoned()
+                raise
+
+            delay = self._answered(
+                attempt, response.status_code, response.headers,
+                time.monotonic() - start, key, idempotent, size
+            )
+            if delay is None:
+                return response
+            response.close()
+            time.sleep(delay)
+
+        raise AssertionError("unreachable")
+
+    async def call_async(
+        self,
+        send: Callable[[], Awaitable],
+        errors: Tuple[Type[BaseException], ...],
+        unsent: Tuple[Type[BaseException], ...],
+        key: str = "",
+        idempotent: bool = True,
+        size: int = 0
+    ):
+        """
+        Coroutine version of call() for asyncio clients.
+
+        Args:
+            send: Coroutine function that sends the request once and
+                returns an aiohttp.ClientResponse; responses that are
+                retried are closed
+            errors: Exceptions that mean an attempt failed in transit
+            unsent: Those of errors raised before the request was sent
+            key: Endpoint name used to compare latencies
+            idempotent: Whether the request may be sent more than once
+            size: Bytes in the request body
+
+        Returns:
+            The final response, which may still be an error response
+            once retries are exhausted
+        """
+        import asyncio
+
+        for attempt in range(self.policy.max_attempts):
+            delay = self._circuit_delay()
+            while delay is not None:
+                await asyncio.sleep(delay)
+                delay = self._circuit_delay()
+            self._count("requests")
+
+            try:
+                await self.limiter.acquire_async()
+            except BaseException:
+                self.breaker.record_abandoned()
+                raise
+            start = time.monotonic()
+            try:
+                response = await send()
+            except errors as e:
+                delay = self._failed(attempt, idempotent or isinstance(e, unsent))
+                if delay is None:
+                    raise
+                await asyncio.sleep(delay)
+                continue
+            except BaseException:
+                self.limiter.release()
+                self.breaker.record_abandoned()
+                raise
+
+            delay = self._answered(
+                attempt, response.status, response.headers,
+                time.monotonic() - start, key, idempotent, size
+            )
+            if delay is None:
+                return response
+            response.close()
+            await asyncio.sleep(delay)
+
+        raise AssertionError("unreachable")
+
+    def reset_counters(self):
+        """Zero the request counters, keeping the window and circuit state."""
+        with self._lock:
+            self.counters = dict.fromkeys(self.counters, 0)
+
+    def summary(self) -> Dict[str, float]:
+        """
+        Request counters plus the current window and circuit state.
+        """
+        with self._lock:
+            summary = dict(self.counters)
+        summary["window"] = self.limiter.window
+        summary["circuit"] = self.breaker.state
+        return summary
@@ -0,0 +1,202 @@
+"""
+Single-flight coalescing of identical in-flight requests.
+
+Processing requests are deterministic for a given image and parameters
+(see cache.py), so when several callers ask for the same result at the
+same moment, one request is enough. Within a process, the first caller
+for a key runs the request and every caller that arrives while it is in
+flight waits for and shares its outcome, result or exception. Across
+processes, a lease file in ~/.pxforge/inflight is locked for as long as
+the request runs; other processes wait for the lock and then find the
+result in the shared result cache. The lock is released by the kernel
+if its holder dies, so a crashed process never leaves a stale lease.
+"""
+
+import copy
+import os
+import time
+from concurrent.futures import Future
+from threading import Lock
+from typing import Any, Callable, Dict, Hashable, Tuple
+from .config import get_config_dir
+
+try:
+    import fcntl
+except ImportError:  # Windows has no fcntl; leases are then per process only.
+    fcntl = None
+
+
+LEASE_POLL_INITIAL = 0.05
+LEASE_POLL_MAX = 0.5
+
+
+class _Abandoned(Exception):
+    """Set on a call whose runner was interrupted, so a waiter takes over."""
+
+
+class SingleFlight:
+    """
+    Runs at most one call per key at a time and shares its outcome.
+
+    Thread-safe. Exceptions raised by the call are re-raised in every
+    waiting thread; if the running thread is interrupted instead
+    (KeyboardInterrupt, SystemExit), one of the waiting threads runs the
+    call itself.
+    """
+
+    def __init__(self):
+        self._lock = Lock()
+        self._calls: Dict[Hashable, Future] = {}
+
+    def do(self, key: Hashable, function: Callable[[], Any]) -> Tuple[Any, bool]:
+        """
+        Run function, or wait for the identical call already running.
+
+        Args:
+            key: Identifies identical calls
+            function: Produces the result when no call is in flight
+
+        Returns:
+            tuple: (result, whether it was shared from another caller's
+            call, in which case it is a copy)
+        """
+        while True:
+            with self._lock:
+                future = self._calls.get(key)
+                leader = future is None
+                if leader:
+                    future = self._calls[key] = Future()
+            if leader:
+                break
+            try:
+                return copy.deepcopy(future.result()), True
+            except _Abandoned:
+                continue
+
+        try:
+            result = function()
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        except BaseException:
+            future.set_exception(_Abandoned())
+            raise
+        else:
+            future.set_result(result)
+            return result, False
+        finally:
+            with self._lock:
+                del self._calls[key]
+
+
+_flights = SingleFlight()
+
+
+def get_flights() -> SingleFlight:
+    """Get the process-wide SingleFlight used by the API clients."""
+    return _flights
+
+
+def get_lease_dir():
+    """Directory holding the cross-process lease files."""
+    return get_config_dir() / "inflight"
+
+
+def _acquire(path: str, timeout: float):
+    """
+    Lock the lease file at path, waiting up to timeout seconds.
+
+    Returns:
+        tuple: (file descriptor, or None if the wait timed out; whether
+        another process held the lease while we waited)
+    """
+    deadline = time.monotonic() + timeout
+    delay = LEASE_POLL_INITIAL
+    waited = False
+    while True:
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            while True:
+                try:
+                    fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    break
+                except BlockingIOError:
+                    waited = True
+                    if time.monotonic() >= deadline:
+                        os.close(fd)
+                        return None, waited
+                    time.sleep(delay)
+                    delay = min(delay * 2, LEASE_POLL_MAX)
+            # The previous holder removes the file before unlocking it;
+            # a lock on a removed file is no lease, so start over.
+            try:
+                current = os.stat(path).st_ino == os.fstat(fd).st_ino
+            except FileNotFoundError:
+                current = False
+        except BaseException:
+            os.close(fd)
+            raise
+        if current:
+            return fd, waited
+        os.close(fd)
+
+
+class Lease:
+    """
+    The cross-process lease for one request key.
+
+    Used as a context manager, or with acquire() and release() when they
+    run on different threads (flock locks belong to the open file, not
+    to a thread). If another process holds the lease, acquire() waits
+    until it is released or timeout seconds have passed, then returns
+    anyway. Without fcntl (on Windows) it returns at once.
+
+    Args:
+        key: Hex request key (see cache.cache_key)
+        timeout: Longest wait for another process, in seconds
+    """
+
+    def __init__(self, key: str, timeout: float):
+        self.path = str(get_lease_dir() / f"{key}.lock")
+        self.timeout = timeout
+        self._fd = None
+
+    def acquire(self) -> bool:
+        """
+        Take the lease.
+
+        Returns:
+            bool: Whether another process held it first, in which case
+            the result it produced may now be cached
+        """
+        if fcntl is None:
+            return False
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self._fd, waited = _acquire(self.path, self.timeout)
+        if self._fd is not None:
+            # Who holds the lease, for anyone inspecting the directory.
+            os.ftruncate(self._fd, 0)
+            os.write(self._fd, f"{os.getpid()} {time.time():.0f}\n".encode())
+        return waited
+
+    @property
+    def held(self) -> bool:
+        """Whether acquire() took the lease (always, without fcntl)."""
+        return fcntl is None or self._fd is not None
+
+    def release(self):
+        """Give the lease up, removing its file."""
+        if self._fd is None:
+            return
+        try:
+            os.unlink(self.path)
+        except FileNotFoundError:
+            pass
+        os.close(self._fd)
+        self._fd = None
+
+    def __enter__(self) -> bool:
+        return self.acquire()
+
+    def __exit__(self, *exc):
+        self.release()
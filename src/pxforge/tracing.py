@@ -0,0 +1,376 @@
+"""
+Timing spans, metrics export and profiling.
+
+A span times one piece of work: a command, an API call, one phase of an
+HTTP request (connect, tls, send, server, receive) or a registry query.
+Spans opened while another is open on the same thread or asyncio task
+become its children. The process-wide tracer keeps nothing unless it is
+recording (--trace, which prints a breakdown when the command ends) or
+collecting (the metrics export of long-running commands, which only
+keeps a count, sum and maximum per span name), so instrumented code
+costs one attribute check when neither is on.
+
+Only the standard library is used here, so the registry and CLI can
+import this module without slowing startup.
+"""
+
+import contextvars
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional
+
+
+class Span:
+    """One timed piece of work; duration is set when it ends."""
+
+    __slots__ = ("name", "parent", "duration")
+
+    def __init__(self, name: str, parent: Optional["Span"]):
+        self.name = name
+        self.parent = parent
+        self.duration = 0.0
+
+    @property
+    def path(self) -> tuple:
+        """Names from the outermost enclosing span down to this one."""
+        names = []
+        span = self
+        while span is not None:
+            names.append(span.name)
+            span = span.parent
+        return tuple(reversed(names))
+
+
+# Phases of an HTTP request. They are aggregated per request span
+# ("http POST /resize server"), not across all requests.
+PHASES = ("connect", "tls", "send", "server", "receive")
+
+# The innermost open span of the current thread or task.
+_current: contextvars.ContextVar = contextvars.ContextVar("pxforge_span", default=None)
+
+
+class Tracer:
+    """
+    Records spans and aggregates them per name.
+
+    Attributes:
+        recording: Keep every finished span (for --trace)
+        collecting: Keep per-name totals (for metrics export)
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.recording = False
+        self.collecting = False
+        self.started = time.perf_counter()
+        self.spans: List[Span] = []
+        self.metrics: Dict[str, List[float]] = {}
+
+    @property
+    def active(self) -> bool:
+        return self.recording or self.collecting
+
+    def start_recording(self):
+        """Keep spans from now on, dropping any kept before."""
+        with self._lock:
+            self.spans = []
+            self.started = time.perf_counter()
+            self.recording = True
+
+    def stop_recording(self) -> List[Span]:
+        """Stop keeping spans and return those kept."""
+        with self._lock:
+            spans, self.spans = self.spans, []
+            self.recording = False
+        return spans
+
+    def start_collecting(self):
+        """Aggregate spans per name from now on."""
+        self.collecting = True
+
+    @contextmanager
+    def span(self, name: str) -> Iterator[Optional[Span]]:
+        """
+        Time the enclosed block as a span.
+
+        Yields:
+            Span: The open span, or None when the tracer is inactive
+        """
+        if not self.active:
+            yield None
+            return
+        span = Span(name, _current.get())
+        token = _current.set(span)
+        start = time.perf_counter()
+        try:
+            yield span
+        finally:
+            span.duration = time.perf_counter() - start
+            _current.reset(token)
+            self._finish(span)
+
+    def add(self, name: str, duration: float):
+        """
+        Record an already measured span inside the current one.
+
+        Used for phases timed elsewhere, such as connection setup inside
+        urllib3.
+        """
+        if self.active:
+            span = Span(name, _current.get())
+            span.duration = duration
+            self._finish(span)
+
+    def _finish(self, span: Span):
+        with self._lock:
+            if self.recording:
+                self.spans.append(span)
+            if self.collecting:
+                name = span.name
+                if name in PHASES and span.parent is not None:
+                    name = f"{span.parent.name} {name}"
+                totals = self.metrics.get(name)
+                if totals is None:
+                    self.metrics[name] = [1, span.duration, span.duration]
+                else:
+                    totals[0] += 1
+                    totals[1] += span.duration
+                    totals[2] = max(totals[2], span.duration)
+
+    def snapshot(self) -> Dict[str, Dict[str, float]]:
+        """
+        Per-name totals collected so far.
+
+        Returns:
+            dict: Span name -> {"count", "seconds", "max"}
+        """
+        with self._lock:
+            return {
+                name: {"count": count, "seconds": seconds, "max": longest}
+                for name, (count, seconds, longest) in sorted(self.metrics.items())
+            }
+
+
+_tracer = Tracer()
+
+
+def get_tracer() -> Tracer:
+    """Get the process-wide tracer."""
+    return _tracer
+
+
+def traced(name: str):
+    """
+    Decorator that runs a function inside a span.
+
+    Args:
+        name: Span name
+    """
+    def decorate(function):
+        @wraps(function)
+        def wrapper(*args, **kwargs):
+            if not _tracer.active:
+                return function(*args, **kwargs)
+            with _tracer.span(name):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def breakdown(spans: List[Span], wall: float) -> List[str]:
+    """
+    Format spans as a tree of totals by span path.
+
+    Spans with the same name under the same parents are merged, with a
+    call count; "self" is the time not covered by child spans. Spans
+    from worker threads that were started without the caller's context
+    appear at the top level, so top-level totals may add up to more than
+    the wall time when work ran concurrently.
+
+    Args:
+        spans: Finished spans
+        wall: Wall time of the traced run in seconds
+
+    Returns:
+        list: Report lines
+    """
+    totals: Dict[tuple, List[float]] = {}
+    for span in spans:
+        path = span.path
+        entry = totals.setdefault(path, [0, 0.0, 0.0])
+        entry[0] += 1
+        entry[1] += span.duration
+        entry[2] = max(entry[2], span.duration)
+    children: Dict[tuple, float] = {}
+    for path, (_, seconds, _) in totals.items():
+        children[path[:-1]] = children.get(path[:-1], 0.0) + seconds
+
+    # Parents first, then children by time spent.
+    def _key(path):
+        return tuple(
+            (-totals.get(path[:i + 1], (0, 0.0))[1], name) for i, name in enumerate(path)
+        )
+
+    lines = [f"{'span':<40} {'calls':>6} {'total':>11} {'self':>11} {'max':>11}"]
+    for path in sorted(totals, key=_key):
+        count, seconds, longest = totals[path]
+        own = max(seconds - children.get(path, 0.0), 0.0)
+        label = "  " * (len(path) - 1) + path[-1]
+        lines.append(
+            f"{label:<40} {count:>6} {seconds * 1000:>8.1f} ms {own * 1000:>8.1f} ms "
+            f"{longest * 1000:>8.1f} ms"
+        )
+    outside = wall - children.get((), 0.0)
+    if outside >= 0.0005:
+        lines.append(f"{'(outside spans)':<40} {'':>6} {outside * 1000:>8.1f} ms")
+    lines.append(f"{'(wall)':<40} {'':>6} {wall * 1000:>8.1f} ms")
+    return lines
+
+
+def _prometheus_label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def prometheus_text(metrics: Dict[str, Dict[str, float]]) -> str:
+    """
+    Render span totals in the Prometheus text exposition format.
+    """
+    lines = [
+        "# HELP pxforge_span_seconds Time spent in pxforge spans.",
+        "# TYPE pxforge_span_seconds summary",
+    ]
+    for name, totals in metrics.items():
+        label = f'{{span="{_prometheus_label(name)}"}}'
+        lines.append(f"pxforge_span_seconds_sum{label} {totals['seconds']:.6f}")
+        lines.append(f"pxforge_span_seconds_count{label} {totals['count']}")
+    lines += [
+        "# HELP pxforge_span_max_seconds Longest single span.",
+        "# TYPE pxforge_span_max_seconds gauge",
+    ]
+    for name, totals in metrics.items():
+        lines.append(
+            f'pxforge_span_max_seconds{{span="{_prometheus_label(name)}"}} {totals["max"]:.6f}'
+        )
+    lines += [
+        "# HELP pxforge_metrics_timestamp_seconds When these metrics were written.",
+        "# TYPE pxforge_metrics_timestamp_seconds gauge",
+        f"pxforge_metrics_timestamp_seconds {time.time():.3f}",
+    ]
+    return "\n".join(lines) + "\n"
+
+
+class MetricsExporter:
+    """
+    Periodically write the tracer's span totals to a file.
+
+    A path ending in ".prom" is rewritten in the Prometheus text format
+    (for node_exporter's textfile collector); it is replaced atomically,
+    so scrapers never see a partial file. Any other path gets one JSON
+    line appended per interval: {"time", "pid", "uptime", "spans"},
+    with totals counted since the exporter started.
+    """
+
+    def __init__(self, path: str, interval: float = 15.0, tracer: Optional[Tracer] = None):
+        self.path = Path(path)
+        self.interval = interval
+        self.tracer = tracer or _tracer
+        self.prometheus = self.path.suffix == ".prom"
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="metrics", daemon=True)
+        self._started = time.time()
+
+    def start(self):
+        """Start collecting and writing in the background."""
+        self.tracer.start_collecting()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop the background writer and write a final snapshot."""
+        self._stop.set()
+        self._thread.join()
+        self.write()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.write()
+            except OSError:
+                # A full or unmounted disk should not stop the command.
+                pass
+
+    def write(self):
+        metrics = self.tracer.snapshot()
+        if self.prometheus:
+            temporary = self.path.with_name(f".{self.path.name}.{os.getpid()}")
+            temporary.write_text(prometheus_text(metrics))
+            os.replace(temporary, self.path)
+        else:
+            line = json.dumps({
+                "time": time.time(), "pid": os.getpid(),
+                "uptime": time.time() - self._started, "spans": metrics,
+            })
+            with open(self.path, "a") as f:
+                f.write(line + "\n")
+
+
+class Profiler:
+    """
+    cProfile and tracemalloc over one command run.
+
+    stop() writes "<prefix>.prof" (pstats format, for python -m pstats or
+    snakeviz) and "<prefix>.tracemalloc" (a tracemalloc snapshot, for
+    tracemalloc.Snapshot.load) and returns a short text summary.
+    """
+
+    FRAMES = 10
+
+    def __init__(self, prefix: str):
+        self.prefix = prefix
+        self._profile = None
+
+    def start(self):
+        import cProfile
+        import tracemalloc
+
+        tracemalloc.start(self.FRAMES)
+        self._profile = cProfile.Profile()
+        self._profile.enable()
+
+    def stop(self, top: int = 10) -> List[str]:
+        import tracemalloc
+
+        # Stop measuring before anything below imports or allocates.
+        self._profile.disable()
+        snapshot = tracemalloc.take_snapshot()
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        import io
+        import pstats
+
+        profile_path = f"{self.prefix}.prof"
+        memory_path = f"{self.prefix}.tracemalloc"
+        self._profile.dump_stats(profile_path)
+        snapshot.dump(memory_path)
+
+        text = io.StringIO()
+        pstats.Stats(self._profile, stream=text).sort_stats("cumulative").print_stats(top)
+        lines = [f"CPU profile: {profile_path}", f"Memory snapshot: {memory_path}"]
+        lines += [line for line in text.getvalue().splitlines() if line.strip()][-top - 1:]
+        lines.append(
+            f"Memory: {current / 1e6:.1f} MB still allocated, {peak / 1e6:.1f} MB peak; "
+            "top allocation sites:"
+        )
+        for stat in snapshot.statistics("lineno")[:top]:
+            frame = stat.traceback[0]
+            lines.append(
+                f"  {stat.size / 1e6:>8.2f} MB {stat.count:>8} blocks  "
+                f"{frame.filename}:{frame.lineno}"
+            )
+        return lines
@@ -0,0 +1,174 @@
+"""
+Streaming request bodies for large transfers.
+
+Request bodies are produced a fixed-size chunk at a time from the file
+on disk, so memory use stays flat however large the file is, and every
+chunk read is reported to an optional progress callback.
+"""
+
+import os
+import uuid
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Union
+
+
+CHUNK_SIZE = 1024 * 1024
+
+# Called with (bytes done, total bytes) as a transfer advances.
+ProgressCallback = Callable[[int, int], None]
+
+
+class FileSlice:
+    """
+    File-like view of a byte range of a file.
+
+    Reads go straight to the file, so a slice can be sent as a request
+    body without loading it.
+    """
+
+    def __init__(
+        self,
+        path: Union[str, Path],
+        offset: int = 0,
+        length: Optional[int] = None,
+        progress: Optional[ProgressCallback] = None,
+        progress_base: int = 0,
+        progress_total: Optional[int] = None
+    ):
+        """
+        Args:
+            path: File to read
+            offset: First byte of the slice
+            length: Number of bytes (defaults to the rest of the file)
+            progress: Called with (bytes done, total) after each read
+            progress_base: Bytes already done before this slice
+            progress_total: Total reported to progress (defaults to length)
+        """
+        self._file = open(path, "rb")
+        self._file.seek(offset)
+        self.offset = offset
+        size = os.fstat(self._file.fileno()).st_size
+        self.length = size - offset if length is None else min(length, size - offset)
+        self._remaining = self.length
+        self._progress = progress
+        self._progress_base = progress_base
+        self._progress_total = self.length if progress_total is None else progress_total
+
+    def __len__(self):
+        return self.length
+
+    def read(self, size: int = -1) -> bytes:
+        if size is None or size < 0 or size > CHUNK_SIZE:
+            size = CHUNK_SIZE
+        chunk = self._file.read(min(size, self._remaining))
+        self._remaining -= len(chunk)
+        if self._progress and chunk:
+            self._progress(
+                self._progress_base + self.length - self._remaining, self._progress_total
+            )
+        return chunk
+
+    def rewind(self):
+        """Start the slice over, so a failed request can be resent."""
+        self._file.seek(self.offset)
+        self._remaining = self.length
+
+    def close(self):
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class MultipartStream:
+    """
+    multipart/form-data body streamed from files on disk.
+
+    Only the part headers are held in memory; file content is read in
+    chunks as the body is sent. The total length is known up front, so
+    the request carries a Content-Length rather than being chunked.
+    """
+
+    def __init__(
+        self,
+        fields: Optional[Dict[str, str]] = None,
+        files: Optional[Dict[str, Union[str, Path]]] = None,
+        progress: Optional[ProgressCallback] = None
+    ):
+        """
+        Args:
+            fields: Form fields
+            files: File fields, mapping field name to file path
+            progress: Called with (bytes sent, total) as the body is read
+        """
+        self.boundary = uuid.uuid4().hex
+        self.content_type = f"multipart/form-data; boundary={self.boundary}"
+        self._progress = progress
+
+        self._parts: List[Union[bytes, Path]] = []
+        for name, value in (fields or {}).items():
+            self._parts.append(
+                f'--{self.boundary}\r\nContent-Disposition: form-data; name="{name}"'
+                f"\r\n\r\n{value}\r\n".encode()
+            )
+        for name, path in (files or {}).items():
+            path = Path(path)
+            self._parts.append(
+                f'--{self.boundary}\r\nContent-Disposition: form-data; name="{name}"; '
+                f'filename="{path.name}"\r\nContent-Type: application/octet-stream'
+                "\r\n\r\n".encode()
+            )
+            self._parts.append(path)
+            self._parts.append(b"\r\n")
+        self._parts.append(f"--{self.boundary}--\r\n".encode())
+
+        self.length = sum(
+            part.stat().st_size if isinstance(part, Path) else len(part)
+            for part in self._parts
+        )
+        self._sent = 0
+        self._index = 0
+        self._current = None
+
+    def __len__(self):
+        return self.length
+
+    def read(self, size: int = -1) -> bytes:
+        if size is None or size < 0 or size > CHUNK_SIZE:
+            size = CHUNK_SIZE
+
+        while self._index < len(self._parts):
+            part = self._parts[self._index]
+            if isinstance(part, Path):
+                if self._current is None:
+                    self._current = open(part, "rb")
+                chunk = self._current.read(size)
+                if not chunk:
+                    self._current.close()
+                    self._current = None
+                    self._index += 1
+                    continue
+            else:
+                # Part headers are small, so they are emitted whole.
+                chunk = part
+                self._index += 1
+
+            self._sent += len(chunk)
+            if self._progress:
+                self._progress(self._sent, self.length)
+            return chunk
+        return b""
+
+    def rewind(self):
+        """Start the body over, so a failed request can be resent."""
+        self.close()
+        self._sent = 0
+        self._index = 0
+
+    def close(self):
+        if self._current is not None:
+            self._current.close()
+            self._current = None
@@ -1,18 +1,50 @@
 """
 Utilities for managing local image registry.
 
-This module provides functions to load and save image IDs
-to a local JSON file for tracking uploaded images.
+This module provides functions to track uploaded images in a local
+SQLite database, along with where each image came from (local file
+path and server URL), its size, dimensions and content hash, and the
+lineage of operations run on it with their result URLs. ID lookups,
+inserts and deletes are indexed and incremental. Registries from older
+versions, kept in uploaded_images.json, are migrated on first use.
+
+Every change is a SQLite transaction on a WAL-mode database, so many
+pxforge processes can update the registry at once: writers queue on
+the database lock instead of overwriting each other, and readers never
+see a partially written registry.
 """
 
 import os
 import json
+import time
+import hashlib
+import sqlite3
+import threading
 from pathlib import Path
+from .tracing import traced
+
+
+HASH_CHUNK_SIZE = 1024 * 1024
+
+IMAGE_COLUMNS = ("id", "path", "url", "size", "width", "height", "sha256", "uploaded_at")
+SORT_COLUMNS = {
+    "uploaded": "uploaded_at",
+    "size": "size",
+    "width": "width",
+    "height": "height",
+    "id": "id",
+}
+
+# How long a writer waits for other processes to release the database
+# lock before giving up, in seconds.
+LOCK_TIMEOUT = 60
+
+_local = threading.local()
 
 
 def get_storage_file():
     """
-    Get the path to the storage file.
+    Get the path to the default legacy JSON storage file.
 
     Returns:
         Path: Path object pointing to uploaded_images.json
@@ -21,38 +53,380 @@ def get_storage_file():
     return base_dir / "uploaded_images.json"
 
 
+def get_registry_file():
+    """
+    Get the path to the registry database.
+
+    The PXFORGE_REGISTRY environment variable overrides the location.
+
+    Returns:
+        Path: Path object pointing to uploaded_images.db
+    """
+    override = os.environ.get("PXFORGE_REGISTRY")
+    if override:
+        return Path(override)
+    return get_storage_file().with_suffix(".db")
+
+
+def get_sources_file():
+    """
+    Get the path to the legacy image source file.
+
+    Returns:
+        Path: Path object pointing to image_sources.json
+    """
+    return get_registry_file().parent / "image_sources.json"
+
+
+def _read_json(path, default):
+    if not path.exists():
+        return default
+    try:
+        with open(path, "r") as f:
+            data = json.load(f)
+    except (json.JSONDecodeError, ValueError):
+        return default
+    return data if isinstance(data, type(default)) else default
+
+
+def _create_images(conn):
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS images (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            id TEXT NOT NULL UNIQUE,
+            path TEXT,
+            url TEXT
+        )
+    """)
+
+    legacy_file = get_registry_file().with_suffix(".json")
+    image_ids = [img for img in _read_json(legacy_file, []) if img is not None]
+    sources = _read_json(get_sources_file(), {})
+    conn.executemany(
+        "INSERT OR IGNORE INTO images (id, path, url) VALUES (?, ?, ?)",
+        [
+            (img, sources.get(img, {}).get("path"), sources.get(img, {}).get("url"))
+            for img in image_ids
+        ]
+    )
+
+
+def _add_metadata_and_lineage(conn):
+    for column in ("size INTEGER", "width INTEGER", "height INTEGER",
+                   "sha256 TEXT", "uploaded_at REAL"):
+        conn.execute(f"ALTER TABLE images ADD COLUMN {column}")
+    for column in ("sha256", "uploaded_at", "size", "width", "height"):
+        conn.execute(f"CREATE INDEX IF NOT EXISTS images_{column} ON images ({column})")
+
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS results (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            image_id TEXT NOT NULL,
+            operation TEXT NOT NULL,
+            params TEXT NOT NULL,
+            url TEXT NOT NULL,
+            result_image_id TEXT,
+            created_at REAL NOT NULL
+        )
+    """)
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS results_lookup ON results (image_id, operation, params)"
+    )
+    conn.execute("CREATE INDEX IF NOT EXISTS results_url ON results (url)")
+
+
+def _add_counters(conn):
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS counters (
+            name TEXT PRIMARY KEY,
+            value INTEGER NOT NULL
+        )
+    """)
+
+
+def _add_upload_sessions(conn):
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS upload_sessions (
+            sha256 TEXT NOT NULL,
+            base_url TEXT NOT NULL,
+            upload_id TEXT NOT NULL,
+            created_at REAL NOT NULL,
+            PRIMARY KEY (sha256, base_url)
+        )
+    """)
+
+
+def _add_jobs(conn):
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS jobs (
+            id TEXT PRIMARY KEY,
+            remote_id TEXT,
+            base_url TEXT NOT NULL,
+            operation TEXT NOT NULL,
+            image_id TEXT NOT NULL,
+            params TEXT NOT NULL,
+            status TEXT NOT NULL,
+            url TEXT,
+            result_image_id TEXT,
+            error TEXT,
+            polls INTEGER NOT NULL DEFAULT 0,
+            next_poll_at REAL NOT NULL,
+            submitted_at REAL NOT NULL,
+            updated_at REAL NOT NULL
+        )
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, next_poll_at)")
+
+
+def _add_watch_queue(conn):
+    # A file is identified by path, size and modification time, so a
+    # file replaced with new content is queued again.
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS watch_queue (
+            path TEXT NOT NULL,
+            size INTEGER NOT NULL,
+            mtime_ns INTEGER NOT NULL,
+            status TEXT NOT NULL,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            image_id TEXT,
+            url TEXT,
+            error TEXT,
+            next_attempt_at REAL NOT NULL,
+            queued_at REAL NOT NULL,
+            updated_at REAL NOT NULL,
+            PRIMARY KEY (path, size, mtime_ns)
+        )
+    """)
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS watch_queue_status "
+        "ON watch_queue (status, next_attempt_at)"
+    )
+
+
+def _add_watch_owner(conn):
+    # The lease key of the watcher processing a running file.
+    conn.execute("ALTER TABLE watch_queue ADD COLUMN owner TEXT")
+
+
+def _add_image_server(conn):
+    # Image IDs belong to the server an image was uploaded to, so
+    # content is only deduplicated against uploads to the same server.
+    conn.execute("ALTER TABLE images ADD COLUMN base_url TEXT")
+    conn.execute("CREATE INDEX IF NOT EXISTS images_sha256_server ON images (sha256, base_url)")
+
+
+# Schema upgrades, applied in order; the schema version is the number
+# of upgrades that have run.
+_MIGRATIONS = (
+    _create_images, _add_metadata_and_lineage, _add_counters, _add_upload_sessions,
+    _add_jobs, _add_watch_queue, _add_watch_owner, _add_image_server
+)
+SCHEMA_VERSION = len(_MIGRATIONS)
+
+
+def _migrate(conn):
+    """
+    Bring the schema up to date, importing the legacy JSON registry once.
+
+    Runs under an exclusive write lock and re-checks the schema version,
+    so concurrent first runs migrate exactly once.
+    """
+    conn.execute("BEGIN IMMEDIATE")
+    version = conn.execute("PRAGMA user_version").fetchone()[0]
+    for upgrade in _MIGRATIONS[version:]:
+        upgrade(conn)
+    conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+    conn.execute("COMMIT")
+
+
+def connect():
+    """
+    Get this thread's connection to the registry, creating it if needed.
+
+    Returns:
+        sqlite3.Connection: Open registry connection
+    """
+    registry_file = get_registry_file()
+    conn = getattr(_local, "conn", None)
+    if conn is not None and getattr(_local, "path", None) == registry_file:
+        return conn
+
+    conn = _open(registry_file)
+    _local.conn = conn
+    _local.path = registry_file
+    return conn
+
+
+@traced("registry open")
+def _open(registry_file):
+    registry_file.parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(str(registry_file), timeout=LOCK_TIMEOUT)
+    conn.execute("PRAGMA journal_mode = WAL")
+    conn.execute("PRAGMA synchronous = NORMAL")
+    version = conn.execute("PRAGMA user_version").fetchone()[0]
+    if version < SCHEMA_VERSION:
+        try:
+            _migrate(conn)
+        except BaseException:
+            conn.rollback()
+            raise
+    return conn
+
+
+@traced("registry load")
 def load():
     """
     Load image IDs from local storage.
 
     Returns:
-        list: List of image IDs, empty list if file doesn't exist
+        list: List of image IDs in upload order, empty list if none
     """
-    storage_file = get_storage_file()
-    if storage_file.exists():
-        try:
-            with open(storage_file, "r") as f:
-                data = json.load(f)
-                # Filter out None values
-                return [img for img in data if img is not None]
-        except (json.JSONDecodeError, ValueError):
-            return []
-    return []
+    rows = connect().execute("SELECT id FROM images ORDER BY seq")
+    return [row[0] for row in rows]
 
 
+@traced("registry save")
 def save(data):
     """
-    Save image IDs to local storage.
+    Replace the registry with the given image IDs.
+
+    Prefer add_image and remove_image, which do not rewrite the registry.
 
     Args:
         data (list): List of image IDs to save
     """
-    storage_file = get_storage_file()
-    storage_file.parent.mkdir(parents=True, exist_ok=True)
-    with open(storage_file, "w") as f:
-        json.dump(data, f, indent=2)
+    conn = connect()
+    image_ids = [img for img in data if img is not None]
+    with conn:
+        conn.execute("CREATE TEMP TABLE IF NOT EXISTS keep (id TEXT PRIMARY KEY)")
+        conn.execute("DELETE FROM keep")
+        conn.executemany("INSERT OR IGNORE INTO keep VALUES (?)", [(i,) for i in image_ids])
+        conn.execute("DELETE FROM images WHERE id NOT IN (SELECT id FROM keep)")
+        conn.executemany(
+            "INSERT OR IGNORE INTO images (id) VALUES (?)", [(i,) for i in image_ids]
+        )
+
+
+@traced("hash file")
+def hash_file(path):
+    """
+    Compute the SHA-256 of a file, reading it in fixed-size chunks.
+
+    Args:
+        path (str): File to hash
+
+    Returns:
+        str: Hex digest
+    """
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def image_dimensions(path):
+    """
+    Read an image's dimensions from its header.
+
+    Args:
+        path (str): Image file
+
+    Returns:
+        tuple: (width, height), or (None, None) if Pillow is not
+        installed or the file is not a readable image
+    """
+    try:
+        from PIL import Image
+    except ImportError:
+        return None, None
+    try:
+        with Image.open(path) as image:
+            return image.size
+    except Exception:
+        return None, None
+
+
+def file_metadata(path):
+    """
+    Collect registry metadata for a local image file.
+
+    Args:
+        path (str): Image file
+
+    Returns:
+        dict: size, width, height and sha256 of the file
+    """
+    width, height = image_dimensions(path)
+    return {
+        "size": Path(path).stat().st_size,
+        "width": width,
+        "height": height,
+        "sha256": hash_file(path),
+    }
+
+
+@traced("registry add_image")
+def add_image(image_id, path=None, url=None, metadata=None, base_url=None):
+    """
+    Add an image to the registry, or update its recorded details.
+
+    Args:
+        image_id (str): Image ID returned by the server
+        path (str): Local file the image was uploaded from
+        url (str): Server URL of the uploaded image
+        metadata (dict): size, width, height and sha256 of the image
+        base_url (str): API server the image was uploaded to
+
+    Returns:
+        bool: True if the image was newly added
+    """
+    if path:
+        path = str(Path(path).resolve())
+    metadata = metadata or {}
+    values = (
+        path, url, metadata.get("size"), metadata.get("width"),
+        metadata.get("height"), metadata.get("sha256"), base_url
+    )
+
+    conn = connect()
+    with conn:
+        cursor = conn.execute(
+            "INSERT OR IGNORE INTO images "
+            "(path, url, size, width, height, sha256, base_url, id, uploaded_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            values + (image_id, time.time())
+        )
+        if cursor.rowcount:
+            return True
+        conn.execute(
+            "UPDATE images SET path = COALESCE(?, path), url = COALESCE(?, url), "
+            "size = COALESCE(?, size), width = COALESCE(?, width), "
+            "height = COALESCE(?, height), sha256 = COALESCE(?, sha256), "
+            "base_url = COALESCE(?, base_url) WHERE id = ?",
+            values + (image_id,)
+        )
+    return False
+
+
+@traced("registry remove_image")
+def remove_image(image_id):
+    """
+    Remove an image from the registry.
+
+    Args:
+        image_id (str): Image ID to remove
+
+    Returns:
+        bool: True if the image was registered
+    """
+    conn = connect()
+    with conn:
+        cursor = conn.execute("DELETE FROM images WHERE id = ?", (image_id,))
+    return cursor.rowcount > 0
 
 
+@traced("registry validate_image_id")
 def validate_image_id(image_id):
     """
     Check if an image ID exists in local storage.
@@ -63,5 +437,615 @@ def validate_image_id(image_id):
     Returns:
         bool: True if image ID exists, False otherwise
     """
-    data = load()
-    return image_id in data
+    row = connect().execute(
+        "SELECT 1 FROM images WHERE id = ?", (image_id,)
+    ).fetchone()
+    return row is not None
+
+
+@traced("registry get_image_source")
+def get_image_source(image_id):
+    """
+    Get the recorded source of an image.
+
+    Args:
+        image_id (str): Image ID to look up
+
+    Returns:
+        dict: {"path": ..., "url": ...} entries that are known, or {}
+    """
+    row = connect().execute(
+        "SELECT path, url FROM images WHERE id = ?", (image_id,)
+    ).fetchone()
+    if row is None:
+        return {}
+    return {key: value for key, value in zip(("path", "url"), row) if value}
+
+
+@traced("registry find_image_by_hash")
+def find_image_by_hash(sha256, base_url):
+    """
+    Find an image with the given content hash uploaded to a server.
+
+    Images registered before the server was recorded never match, as
+    their IDs may belong to another server.
+
+    Args:
+        sha256 (str): Hex SHA-256 of the image file
+        base_url (str): API server the image must be on
+
+    Returns:
+        dict: Column values keyed by IMAGE_COLUMNS, or None if unknown
+    """
+    row = connect().execute(
+        f"SELECT {', '.join(IMAGE_COLUMNS)} FROM images WHERE sha256 = ? AND base_url = ? "
+        "ORDER BY seq LIMIT 1",
+        (sha256, base_url)
+    ).fetchone()
+    return dict(zip(IMAGE_COLUMNS, row)) if row else None
+
+
+@traced("registry increment_counter")
+def increment_counter(name, amount=1):
+    """
+    Add to a persistent counter.
+
+    Args:
+        name (str): Counter name
+        amount (int): Amount to add
+
+    Returns:
+        int: New counter value
+    """
+    conn = connect()
+    with conn:
+        conn.execute(
+            "INSERT INTO counters (name, value) VALUES (?, ?) "
+            "ON CONFLICT (name) DO UPDATE SET value = value + excluded.value",
+            (name, amount)
+        )
+        return conn.execute(
+            "SELECT value FROM counters WHERE name = ?", (name,)
+        ).fetchone()[0]
+
+
+@traced("registry set_counter")
+def set_counter(name, value):
+    """
+    Set a persistent counter.
+
+    Args:
+        name (str): Counter name
+        value (int): New value
+    """
+    conn = connect()
+    with conn:
+        conn.execute(
+            "INSERT INTO counters (name, value) VALUES (?, ?) "
+            "ON CONFLICT (name) DO UPDATE SET value = excluded.value",
+            (name, value)
+        )
+
+
+@traced("registry get_counter")
+def get_counter(name):
+    """
+    Read a persistent counter.
+
+    Args:
+        name (str): Counter name
+
+    Returns:
+        int: Counter value, 0 if never incremented
+    """
+    row = connect().execute(
+        "SELECT value FROM counters WHERE name = ?", (name,)
+    ).fetchone()
+    return row[0] if row else 0
+
+
+def save_upload_session(sha256, base_url, upload_id):
+    """
+    Remember an unfinished resumable upload so a later run can resume it.
+
+    Args:
+        sha256 (str): Hex SHA-256 of the file being uploaded
+        base_url (str): API the upload was started on
+        upload_id (str): Upload session ID issued by the server
+    """
+    conn = connect()
+    with conn:
+        conn.execute(
+            "INSERT OR REPLACE INTO upload_sessions (sha256, base_url, upload_id, created_at) "
+            "VALUES (?, ?, ?, ?)",
+            (sha256, base_url, upload_id, time.time())
+        )
+
+
+def find_upload_session(sha256, base_url):
+    """
+    Find an unfinished resumable upload of a file.
+
+    Args:
+        sha256 (str): Hex SHA-256 of the file
+        base_url (str): API the upload was started on
+
+    Returns:
+        str: Upload session ID, or None
+    """
+    row = connect().execute(
+        "SELECT upload_id FROM upload_sessions WHERE sha256 = ? AND base_url = ?",
+        (sha256, base_url)
+    ).fetchone()
+    return row[0] if row else None
+
+
+def remove_upload_session(upload_id):
+    """
+    Forget a resumable upload once it has finished or expired.
+
+    Args:
+        upload_id (str): Upload session ID
+    """
+    conn = connect()
+    with conn:
+        conn.execute("DELETE FROM upload_sessions WHERE upload_id = ?", (upload_id,))
+
+
+@traced("registry get_image")
+def get_image(image_id):
+    """
+    Get everything recorded about an image.
+
+    Args:
+        image_id (str): Image ID to look up
+
+    Returns:
+        dict: Column values keyed by IMAGE_COLUMNS, or None if unknown
+    """
+    row = connect().execute(
+        f"SELECT {', '.join(IMAGE_COLUMNS)} FROM images WHERE id = ?", (image_id,)
+    ).fetchone()
+    return dict(zip(IMAGE_COLUMNS, row)) if row else None
+
+
+@traced("registry query_images")
+def query_images(sort="uploaded", descending=False, min_width=None,
+                 min_height=None, limit=None):
+    """
+    List registered images with filtering and sorting done by SQLite.
+
+    Args:
+        sort (str): One of SORT_COLUMNS
+        descending (bool): Sort in descending order
+        min_width (int): Only images at least this wide
+        min_height (int): Only images at least this tall
+        limit (int): Maximum number of images to return
+
+    Returns:
+        list: One dict per image, keyed by IMAGE_COLUMNS
+    """
+    clauses, args = [], []
+    if min_width is not None:
+        clauses.append("width >= ?")
+        args.append(min_width)
+    if min_height is not None:
+        clauses.append("height >= ?")
+        args.append(min_height)
+
+    query = f"SELECT {', '.join(IMAGE_COLUMNS)} FROM images"
+    if clauses:
+        query += " WHERE " + " AND ".join(clauses)
+    direction = "DESC" if descending else "ASC"
+    query += f" ORDER BY {SORT_COLUMNS[sort]} {direction}, seq {direction}"
+    if limit is not None:
+        query += " LIMIT ?"
+        args.append(limit)
+
+    return [dict(zip(IMAGE_COLUMNS, row)) for row in connect().execute(query, args)]
+
+
+def canonical_params(params):
+    """
+    Serialize operation parameters so equal parameters compare equal.
+
+    Args:
+        params (dict): Operation parameters
+
+    Returns:
+        str: Compact JSON with sorted keys
+    """
+    return json.dumps(params or {}, sort_keys=True, separators=(",", ":"))
+
+
+@traced("registry record_result")
+def record_result(image_id, operation, params, url, result_image_id=None):
+    """
+    Record that an operation on an image produced a result.
+
+    Args:
+        image_id (str): Input image ID
+        operation (str): Operation name
+        params (dict): Operation parameters
+        url (str): Result URL returned by the server
+        result_image_id (str): Image ID of the result, if it has one
+    """
+    params = canonical_params(params)
+    conn = connect()
+    with conn:
+        # Results served from the result cache come back with the same
+        # URL; record them once.
+        conn.execute(
+            "INSERT INTO results "
+            "(image_id, operation, params, url, result_image_id, created_at) "
+            "SELECT ?, ?, ?, ?, ?, ? WHERE NOT EXISTS ("
+            "SELECT 1 FROM results WHERE image_id = ? AND operation = ? "
+            "AND params = ? AND url = ?)",
+            (image_id, operation, params, url, result_image_id, time.time(),
+             image_id, operation, params, url)
+        )
+
+
+@traced("registry link_result")
+def link_result(url, result_image_id):
+    """
+    Attach the image ID a result was later uploaded as.
+
+    Args:
+        url (str): Result URL
+        result_image_id (str): Image ID of the uploaded result
+    """
+    conn = connect()
+    with conn:
+        conn.execute(
+            "UPDATE results SET result_image_id = ? WHERE url = ?",
+            (result_image_id, url)
+        )
+
+
+@traced("registry find_result")
+def find_result(image_id, operation, params):
+    """
+    Find the most recent result of an operation on an image.
+
+    Args:
+        image_id (str): Input image ID
+        operation (str): Operation name
+        params (dict): Operation parameters
+
+    Returns:
+        dict: url, result_image_id and created_at, or None
+    """
+    row = connect().execute(
+        "SELECT url, result_image_id, created_at FROM results "
+        "WHERE image_id = ? AND operation = ? AND params = ? "
+        "ORDER BY seq DESC LIMIT 1",
+        (image_id, operation, canonical_params(params))
+    ).fetchone()
+    if row is None:
+        return None
+    return dict(zip(("url", "result_image_id", "created_at"), row))
+
+
+@traced("registry get_lineage")
+def get_lineage(image_id):
+    """
+    Get the operations run on an image, oldest first.
+
+    Args:
+        image_id (str): Input image ID
+
+    Returns:
+        list: dicts with operation, params (dict), url,
+        result_image_id and created_at
+    """
+    rows = connect().execute(
+        "SELECT operation, params, url, result_image_id, created_at FROM results "
+        "WHERE image_id = ? ORDER BY seq",
+        (image_id,)
+    )
+    return [
+        {
+            "operation": operation,
+            "params": json.loads(params),
+            "url": url,
+            "result_image_id": result_image_id,
+            "created_at": created_at,
+        }
+        for operation, params, url, result_image_id, created_at in rows
+    ]
+
+
+JOB_COLUMNS = (
+    "id", "remote_id", "base_url", "operation", "image_id", "params", "status", "url",
+    "result_image_id", "error", "polls", "next_poll_at", "submitted_at", "updated_at"
+)
+JOB_STATUSES = ("queued", "running", "succeeded", "failed")
+
+
+def _job_row(row):
+    job = dict(zip(JOB_COLUMNS, row))
+    job["params"] = json.loads(job["params"])
+    return job
+
+
+@traced("registry add_job")
+def add_job(job):
+    """
+    Record a submitted job.
+
+    Args:
+        job (dict): Job fields keyed by JOB_COLUMNS; params is a dict
+    """
+    values = dict(job, params=canonical_params(job.get("params")))
+    conn = connect()
+    with conn:
+        conn.execute(
+            f"INSERT INTO jobs ({', '.join(JOB_COLUMNS)}) "
+            f"VALUES ({', '.join('?' for _ in JOB_COLUMNS)})",
+            [values.get(column) for column in JOB_COLUMNS]
+        )
+
+
+@traced("registry update_job")
+def update_job(job_id, **fields):
+    """
+    Update fields of a job and its updated_at time.
+
+    Args:
+        job_id (str): Local job ID
+        **fields: Columns to set
+    """
+    fields["updated_at"] = time.time()
+    assignments = ", ".join(f"{column} = ?" for column in fields)
+    conn = connect()
+    with conn:
+        conn.execute(
+            f"UPDATE jobs SET {assignments} WHERE id = ?", [*fields.values(), job_id]
+        )
+
+
+@traced("registry get_job")
+def get_job(job_id):
+    """
+    Look up a job by its local ID or a unique prefix of it.
+
+    Args:
+        job_id (str): Local job ID or prefix
+
+    Returns:
+        dict: Job fields keyed by JOB_COLUMNS, or None if unknown or ambiguous
+    """
+    rows = connect().execute(
+        f"SELECT {', '.join(JOB_COLUMNS)} FROM jobs WHERE substr(id, 1, ?) = ? LIMIT 2",
+        (len(job_id), job_id)
+    ).fetchall()
+    return _job_row(rows[0]) if len(rows) == 1 else None
+
+
+@traced("registry query_jobs")
+def query_jobs(statuses=None, due_before=None, limit=None, local=False):
+    """
+    List jobs, oldest first.
+
+    Args:
+        statuses (iterable): Only jobs in these states
+        due_before (float): Only jobs whose next poll is due by this time
+        limit (int): Maximum number of jobs to return
+        local (bool): Only jobs the server has not given a job ID
+
+    Returns:
+        list: dicts keyed by JOB_COLUMNS
+    """
+    query = f"SELECT {', '.join(JOB_COLUMNS)} FROM jobs"
+    clauses, args = [], []
+    if local:
+        clauses.append("remote_id IS NULL")
+    if statuses:
+        statuses = list(statuses)
+        clauses.append(f"status IN ({', '.join('?' for _ in statuses)})")
+        args.extend(statuses)
+    if due_before is not None:
+        clauses.append("next_poll_at <= ?")
+        args.append(due_before)
+    if clauses:
+        query += " WHERE " + " AND ".join(clauses)
+    query += " ORDER BY submitted_at"
+    if limit is not None:
+        query += " LIMIT ?"
+        args.append(limit)
+    return [_job_row(row) for row in connect().execute(query, args)]
+
+
+@traced("registry remove_jobs")
+def remove_jobs(statuses):
+    """
+    Forget jobs in the given states.
+
+    Args:
+        statuses (iterable): States of the jobs to remove
+
+    Returns:
+        int: Number of jobs removed
+    """
+    statuses = list(statuses)
+    conn = connect()
+    with conn:
+        return conn.execute(
+            f"DELETE FROM jobs WHERE status IN ({', '.join('?' for _ in statuses)})",
+            statuses
+        ).rowcount
+
+
+WATCH_COLUMNS = (
+    "path", "size", "mtime_ns", "status", "attempts", "image_id", "url", "error",
+    "next_attempt_at", "queued_at", "updated_at"
+)
+WATCH_STATUSES = ("queued", "running", "done", "failed")
+
+
+def _under(directory):
+    # SQL condition matching paths inside a directory, and its arguments.
+    if directory is None:
+        return "1", []
+    prefix = os.path.join(directory, "")
+    return "substr(path, 1, ?) = ?", [len(prefix), prefix]
+
+
+@traced("registry enqueue_watch_file")
+def enqueue_watch_file(path, size, mtime_ns):
+    """
+    Add a file to the watch queue unless it was queued before.
+
+    Args:
+        path (str): Absolute file path
+        size (int): File size in bytes
+        mtime_ns (int): Modification time in nanoseconds
+
+    Returns:
+        bool: True if the file was newly queued
+    """
+    now = time.time()
+    conn = connect()
+    with conn:
+        return conn.execute(
+            "INSERT OR IGNORE INTO watch_queue "
+            "(path, size, mtime_ns, status, next_attempt_at, queued_at, updated_at) "
+            "VALUES (?, ?, ?, 'queued', ?, ?, ?)",
+            (path, size, mtime_ns, now, now, now)
+        ).rowcount == 1
+
+
+@traced("registry claim_watch_files")
+def claim_watch_files(limit, directory=None, now=None, owner=None):
+    """
+    Mark up to `limit` due files as running and return them, oldest first.
+
+    The claim is one write transaction, so several watchers sharing a
+    registry never claim the same file.
+
+    Args:
+        limit (int): Maximum number of files to claim
+        directory (str): Only files under this absolute directory
+        now (float): Current time (defaults to time.time())
+        owner (str): Recorded as the claiming watcher
+
+    Returns:
+        list: dicts keyed by WATCH_COLUMNS
+    """
+    now = time.time() if now is None else now
+    condition, args = _under(directory)
+    conn = connect()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        rows = conn.execute(
+            f"SELECT {', '.join(WATCH_COLUMNS)} FROM watch_queue "
+            f"WHERE status = 'queued' AND next_attempt_at <= ? AND {condition} "
+            "ORDER BY queued_at LIMIT ?",
+            [now, *args, limit]
+        ).fetchall()
+        conn.executemany(
+            "UPDATE watch_queue SET status = 'running', owner = ?, updated_at = ? "
+            "WHERE path = ? AND size = ? AND mtime_ns = ?",
+            [(owner, now, row[0], row[1], row[2]) for row in rows]
+        )
+        conn.execute("COMMIT")
+    except BaseException:
+        conn.rollback()
+        raise
+    return [dict(zip(WATCH_COLUMNS, row)) for row in rows]
+
+
+@traced("registry update_watch_file")
+def update_watch_file(entry, **fields):
+    """
+    Update fields of a queued file and its updated_at time.
+
+    Args:
+        entry (dict): Queue entry with path, size and mtime_ns
+        **fields: Columns to set
+    """
+    fields["updated_at"] = time.time()
+    assignments = ", ".join(f"{column} = ?" for column in fields)
+    conn = connect()
+    with conn:
+        conn.execute(
+            f"UPDATE watch_queue SET {assignments} "
+            "WHERE path = ? AND size = ? AND mtime_ns = ?",
+            [*fields.values(), entry["path"], entry["size"], entry["mtime_ns"]]
+        )
+
+
+@traced("registry requeue_watch_files")
+def requeue_watch_files(statuses=("running",), directory=None, owners=None):
+    """
+    Put files in the given states back in the queue.
+
+    Used at startup, when files left running were interrupted by a crash
+    or restart.
+
+    Args:
+        statuses (iterable): States to requeue
+        directory (str): Only files under this absolute directory
+        owners (iterable): Only files claimed by these owners (None for
+            files with no recorded owner); all files if not given
+
+    Returns:
+        int: Number of files requeued
+    """
+    statuses = list(statuses)
+    condition, args = _under(directory)
+    if owners is not None:
+        owners = list(owners)
+        named = [owner for owner in owners if owner is not None]
+        clauses = [f"owner IN ({', '.join('?' for _ in named)})"] if named else []
+        if None in owners:
+            clauses.append("owner IS NULL")
+        condition = f"{condition} AND ({' OR '.join(clauses) or '0'})"
+        args = [*args, *named]
+    now = time.time()
+    conn = connect()
+    with conn:
+        return conn.execute(
+            "UPDATE watch_queue SET status = 'queued', owner = NULL, next_attempt_at = ?, "
+            f"updated_at = ? WHERE status IN ({', '.join('?' for _ in statuses)}) "
+            f"AND {condition}",
+            [now, now, *statuses, *args]
+        ).rowcount
+
+
+@traced("registry watch_file_owners")
+def watch_file_owners(directory=None):
+    """
+    Owners of the files currently marked running.
+
+    Args:
+        directory (str): Only files under this absolute directory
+
+    Returns:
+        set: Owner keys, including None for files with no recorded owner
+    """
+    condition, args = _under(directory)
+    return {row[0] for row in connect().execute(
+        f"SELECT DISTINCT owner FROM watch_queue WHERE status = 'running' AND {condition}",
+        args
+    )}
+
+
+@traced("registry count_watch_files")
+def count_watch_files(directory=None):
+    """
+    Count queued files by state.
+
+    Args:
+        directory (str): Only files under this absolute directory
+
+    Returns:
+        dict: Number of files per state in WATCH_STATUSES
+    """
+    condition, args = _under(directory)
+    counts = dict.fromkeys(WATCH_STATUSES, 0)
+    counts.update(connect().execute(
+        f"SELECT status, COUNT(*) FROM watch_queue WHERE {condition} GROUP BY status", args
+    ).fetchall())
+    return counts
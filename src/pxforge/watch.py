@@ -0,0 +1,356 @@
+"""
+Continuous ingestion from a watched directory.
+
+New files are noticed through Linux inotify (via ctypes, with no extra
+dependency) or, where that is unavailable, by rescanning the directory
+every few seconds. A file is taken only once it has stopped changing
+for a settle period, so partially written or still-copying files are
+left alone. Finished files go into a queue kept in the registry and
+are handed to a worker pool from there. Queue entries are keyed by
+path, size and modification time: after a restart, files that were
+done are not processed again, files that were in flight are retried,
+and files that arrived while the watcher was down are picked up by the
+initial scan. Each watcher holds a lease while it runs and records it
+on the files it claims, so a watcher starting next to another one only
+retries files whose watcher has died.
+"""
+
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import threading
+import time
+import uuid
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
+from .singleflight import Lease
+from .utilities import (
+    claim_watch_files, enqueue_watch_file, requeue_watch_files, update_watch_file,
+    watch_file_owners
+)
+
+
+SETTLE_SECONDS = 2.0
+POLL_INTERVAL = 2.0
+MAX_ATTEMPTS = 5
+RETRY_DELAY = 30.0
+
+# Names written by downloaders and editors while a file is incomplete.
+IGNORED_SUFFIXES = (".part", ".partial", ".tmp", ".crdownload", ".download", ".swp", "~")
+
+# inotify constants from <sys/inotify.h>.
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_Q_OVERFLOW = 0x00004000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+_EVENT = struct.Struct("iIII")
+
+Entry = Dict[str, object]
+
+
+def is_candidate(name: str) -> bool:
+    """Whether a file name looks like a finished file to ingest."""
+    return not name.startswith(".") and not name.endswith(IGNORED_SUFFIXES)
+
+
+class InotifyWatcher:
+    """
+    Reports names changed in a directory using Linux inotify.
+
+    Files modified since they were last closed are tracked in `writing`,
+    so a writer that pauses for longer than the settle period does not
+    have its partial file taken.
+    """
+
+    def __init__(self, directory: str):
+        """
+        Raises:
+            OSError: If inotify is unavailable (not Linux, or out of watches)
+        """
+        self.writing: Set[str] = set()
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        if not hasattr(libc, "inotify_init1"):
+            raise OSError("inotify is not available")
+        self._fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        mask = IN_CREATE | IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_TO
+        if libc.inotify_add_watch(self._fd, os.fsencode(directory), mask) < 0:
+            error = ctypes.get_errno()
+            os.close(self._fd)
+            raise OSError(error, f"Cannot watch {directory}")
+
+    def poll(self, timeout: float) -> Optional[Set[str]]:
+        """
+        Wait up to timeout seconds for changes.
+
+        Returns:
+            set: Names that changed, or None if events were lost and the
+            directory must be rescanned
+        """
+        readable, _, _ = select.select([self._fd], [], [], timeout)
+        if not readable:
+            return set()
+        try:
+            data = os.read(self._fd, 64 * 1024)
+        except BlockingIOError:
+            return set()
+
+        names = set()
+        offset = 0
+        while offset + _EVENT.size <= len(data):
+            _, mask, _, length = _EVENT.unpack_from(data, offset)
+            offset += _EVENT.size
+            name = data[offset:offset + length].rstrip(b"\0")
+            offset += length
+            if mask & IN_Q_OVERFLOW:
+                return None
+            if not name:
+                continue
+            name = os.fsdecode(name)
+            names.add(name)
+            if mask & (IN_CLOSE_WRITE | IN_MOVED_TO):
+                self.writing.discard(name)
+            elif mask & (IN_CREATE | IN_MODIFY):
+                self.writing.add(name)
+        return names
+
+    def close(self):
+        os.close(self._fd)
+
+
+class PollingWatcher:
+    """
+    Fallback watcher that asks for a rescan every interval.
+    """
+
+    writing: Set[str] = frozenset()
+
+    def __init__(self, directory: str, interval: float = POLL_INTERVAL):
+        self.interval = interval
+        self._next = time.monotonic()
+
+    def poll(self, timeout: float) -> Optional[Set[str]]:
+        remaining = self._next - time.monotonic()
+        if remaining > timeout:
+            time.sleep(timeout)
+            return set()
+        time.sleep(max(remaining, 0))
+        self._next = time.monotonic() + self.interval
+        return None
+
+    def close(self):
+        pass
+
+
+class Debouncer:
+    """
+    Tracks changed files until they have stopped changing.
+
+    A file is ready once its last modification is at least `settle`
+    seconds old and its size and modification time are unchanged since
+    the previous check. Files already handed out with the same size and
+    modification time are not reported again.
+    """
+
+    def __init__(self, directory: str, settle: float = SETTLE_SECONDS):
+        self.directory = directory
+        self.settle = settle
+        self._pending: Dict[str, Optional[Tuple[int, int]]] = {}
+        self._reported: Dict[str, Tuple[int, int]] = {}
+
+    def __len__(self):
+        return len(self._pending)
+
+    def add(self, names: Iterable[str]):
+        for name in names:
+            if is_candidate(name):
+                self._pending.setdefault(os.path.join(self.directory, name), None)
+
+    def rescan(self):
+        """Consider every file in the directory."""
+        with os.scandir(self.directory) as entries:
+            self.add(entry.name for entry in entries if entry.is_file())
+
+    def ready(self, writing: Set[str] = frozenset()) -> List[Tuple[str, int, int]]:
+        """
+        Files that have settled since the last call.
+
+        Args:
+            writing: Names of files known to be open for writing, which
+                are never ready
+
+        Returns:
+            list: (path, size, mtime_ns) tuples
+        """
+        now = time.time()
+        ready = []
+        for path, previous in list(self._pending.items()):
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                del self._pending[path]
+                continue
+            current = (stat.st_size, stat.st_mtime_ns)
+            if os.path.basename(path) in writing:
+                self._pending[path] = current
+            elif self._reported.get(path) == current:
+                del self._pending[path]
+            elif current == previous and now - stat.st_mtime >= self.settle:
+                del self._pending[path]
+                self._reported[path] = current
+                ready.append((path, *current))
+            else:
+                self._pending[path] = current
+        return ready
+
+
+def open_watcher(directory: str, polling: bool = False, interval: float = POLL_INTERVAL):
+    """
+    Watch a directory with inotify, falling back to polling.
+
+    Returns:
+        InotifyWatcher or PollingWatcher
+    """
+    if not polling:
+        try:
+            return InotifyWatcher(directory)
+        except (OSError, AttributeError):
+            pass
+    return PollingWatcher(directory, interval)
+
+
+def _unchanged(entry: Entry) -> bool:
+    """Whether a queued file still has the size and mtime it was queued with."""
+    try:
+        stat = os.stat(entry["path"])
+    except OSError:
+        return False
+    return (stat.st_size, stat.st_mtime_ns) == (entry["size"], entry["mtime_ns"])
+
+
+def _owner_alive(owner: Optional[str]) -> bool:
+    """Whether the watcher that claimed a file still holds its lease."""
+    if owner is None:
+        return False
+    lease = Lease(owner, timeout=0)
+    lease.acquire()
+    if not lease.held:
+        return True
+    lease.release()
+    return False
+
+
+def retry_delay(attempts: int) -> float:
+    """Seconds before retrying a file that has failed `attempts` times."""
+    return RETRY_DELAY * 2 ** (attempts - 1)
+
+
+def watch_directory(
+    directory: str,
+    handle: Callable[[Entry], Tuple[str, str]],
+    workers: int = 4,
+    settle: float = SETTLE_SECONDS,
+    polling: bool = False,
+    interval: float = POLL_INTERVAL,
+    once: bool = False,
+    stop: Optional[threading.Event] = None,
+    on_done: Optional[Callable[[Entry, Optional[Exception]], None]] = None
+):
+    """
+    Ingest files from a directory until stopped.
+
+    Args:
+        directory: Directory to watch (not recursive)
+        handle: Processes one queue entry on a worker thread and returns
+            (image ID, result URL); raises to fail the attempt
+        workers: Files processed at once
+        settle: Seconds a file must be unchanged before it is taken
+        polling: Rescan instead of using inotify
+        interval: Rescan interval when polling
+        once: Stop when everything present has been processed
+        stop: Set to stop; files in flight are finished first
+        on_done: Called with (entry, error or None) after each attempt;
+            entry["status"] is "done", "queued" (will retry) or "failed"
+    """
+    directory = os.path.abspath(directory)
+    stop = stop or threading.Event()
+    # Files left running by watchers that are gone are retried; a live
+    # watcher's files are its own to finish.
+    dead = [key for key in watch_file_owners(directory) if not _owner_alive(key)]
+    if dead:
+        requeue_watch_files(("running",), directory, owners=dead)
+
+    owner = f"watch-{os.getpid()}-{uuid.uuid4().hex[:8]}"
+    with Lease(owner, timeout=0):
+        watcher = open_watcher(directory, polling, interval)
+        debouncer = Debouncer(directory, settle)
+        debouncer.rescan()
+        tick = min(max(settle / 4, 0.05), 0.5)
+
+        def _finish(entry, future):
+            error = future.exception()
+            attempts = entry["attempts"] + 1
+            if error is None:
+                image_id, url = future.result()
+                entry.update(status="done", attempts=attempts, image_id=image_id, url=url,
+                             error=None)
+            else:
+                retry = attempts < MAX_ATTEMPTS
+                entry.update(
+                    status="queued" if retry else "failed", attempts=attempts,
+                    error=str(error), next_attempt_at=time.time() + retry_delay(attempts)
+                )
+            update_watch_file(entry, **{
+                key: entry.get(key) for key in (
+                    "status", "attempts", "image_id", "url", "error", "next_attempt_at"
+                )
+            })
+            if on_done:
+                on_done(entry, error)
+
+        running = {}
+        try:
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                while not stop.is_set():
+                    changed = watcher.poll(tick if running or len(debouncer) else
+                                           (0 if once else tick * 4))
+                    if changed is None:
+                        debouncer.rescan()
+                    else:
+                        debouncer.add(changed)
+                    for path, size, mtime_ns in debouncer.ready(watcher.writing):
+                        enqueue_watch_file(path, size, mtime_ns)
+
+                    if running:
+                        done, _ = wait(running, timeout=0, return_when=FIRST_COMPLETED)
+                        for future in done:
+                            _finish(running.pop(future), future)
+
+                    claimed = []
+                    if len(running) < workers:
+                        claimed = claim_watch_files(workers - len(running), directory,
+                                                    owner=owner)
+                    for entry in claimed:
+                        if _unchanged(entry):
+                            running[pool.submit(handle, entry)] = entry
+                            continue
+                        # A changed file was queued again under its new size
+                        # and modification time.
+                        entry.update(status="failed", error="changed or removed before processing")
+                        update_watch_file(entry, status=entry["status"], error=entry["error"])
+                        if on_done:
+                            on_done(entry, FileNotFoundError(entry["error"]))
+
+                    if once and not running and not claimed and not len(debouncer):
+                        break
+
+                for future in list(running):
+                    _finish(running.pop(future), future)
+        finally:
+            watcher.close()